@@ -0,0 +1,82 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import time
+
+# Utils
+from utils.BoundedExecutor import BoundedExecutor
+from utils.TaskGraph import TaskGraph
+
+# Seconds of remote calls of dicomStudies bootstrap (SOAP, REST and DB stand-ins)
+LATENCIES = [
+    ("metadata", 0.30),
+    ("subjectsSoap", 0.25),
+    ("subjects", 0.005),
+    ("casebook", 0.27),
+    ("dicomAnnotations", 0.02),
+    ("crfItemValues", 0.08)
+]
+
+# Dependencies of tasks on results of other tasks
+DEPENDENCIES = {
+    "subjects": ["subjectsSoap", "metadata"],
+    "crfItemValues": ["dicomAnnotations"]
+}
+
+# Repetitions of each mode
+REPEAT = 5
+
+def remoteCall(name, latency):
+    """Stand-in of remote call returning its name after latency
+    """
+    def call(*args):
+        time.sleep(latency)
+        return name
+
+    return call
+
+def sequential():
+    """Calls one after another (the way the handler did before)
+    """
+    return dict((name, remoteCall(name, latency)()) for name, latency in LATENCIES)
+
+def graph(executor):
+    """Calls started as soon as their dependencies finished
+    """
+    bootstrap = TaskGraph(executor)
+    for name, latency in LATENCIES:
+        bootstrap.add(name, remoteCall(name, latency), DEPENDENCIES.get(name))
+
+    results = bootstrap.run()
+    path, duration = bootstrap.criticalPath()
+
+    return results, path
+
+def main():
+    """Compare sequential bootstrap of dicomStudies with dependency graph execution
+    """
+    executor = BoundedExecutor(8)
+    executor.start()
+
+    start = time.time()
+    for i in range(REPEAT):
+        expected = sequential()
+    print "%-12s %7.1f ms (sum of latencies %.1f ms)" % ("sequential", (time.time() - start) / REPEAT * 1000, sum(l for n, l in LATENCIES) * 1000)
+
+    start = time.time()
+    for i in range(REPEAT):
+        results, path = graph(executor)
+    print "%-12s %7.1f ms (critical path %s)" % ("task graph", (time.time() - start) / REPEAT * 1000, " > ".join(path))
+
+    print "Same results: " + str(results == expected)
+
+    executor.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import os, sys, shutil, socket, tempfile, threading, time
+
+# DICOM
+from dicom.dataset import Dataset, FileDataset
+
+# Services
+from services.DicomStoreService import DicomStoreService
+
+# Utils
+from utils.DicomUpperLayer import *
+
+# Instances sent in each mode
+FILES = 500
+
+# Image size of CT slice
+ROWS = 512
+COLUMNS = 512
+
+# Delay of association negotiation in PACS (seconds), e.g. AE lookup and logging
+NEGOTIATIONDELAY = 0.005
+
+CTIMAGESTORAGE = "1.2.840.10008.5.1.4.1.1.2"
+EXPLICITVRLITTLEENDIAN = "1.2.840.10008.1.2.1"
+
+def createFile(filename):
+    """Write CT slice DICOM file
+    """
+    fileMeta = Dataset()
+    fileMeta.MediaStorageSOPClassUID = CTIMAGESTORAGE
+    fileMeta.MediaStorageSOPInstanceUID = "1.2.3.4.5.6"
+    fileMeta.TransferSyntaxUID = EXPLICITVRLITTLEENDIAN
+    fileMeta.ImplementationClassUID = "1.2.3.4"
+
+    ds = FileDataset(filename, {}, file_meta=fileMeta, preamble="\0" * 128)
+    ds.PatientID = "BENCH"
+    ds.StudyInstanceUID = "1.2.3.4"
+    ds.SeriesInstanceUID = "1.2.3.4.5"
+    ds.SOPInstanceUID = "1.2.3.4.5.6"
+    ds.SOPClassUID = CTIMAGESTORAGE
+    ds.Modality = "CT"
+    ds.Rows = ROWS
+    ds.Columns = COLUMNS
+    ds.SamplesPerPixel = 1
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.PixelData = os.urandom(ROWS * COLUMNS * 2)
+    ds[0x7fe00010].VR = "OW"
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.save_as(filename)
+
+class StorageScp(object):
+    """Minimal Storage SCP stand-in accepting every presentation context
+
+    Datasets are received and discarded, every C-STORE is answered with success
+    """
+
+    def __init__(self):
+        """Constructor
+        """
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen(16)
+        self.port = self._server.getsockname()[1]
+
+        self.associations = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Accept associations in background
+        """
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        """Accept loop
+        """
+        while True:
+            connection, address = self._server.accept()
+            thread = threading.Thread(target=self._serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, connection):
+        """Serve one association
+        """
+        try:
+            pduType, value = receivePdu(connection)
+            associate = decodeAssociate(value)
+            time.sleep(NEGOTIATIONDELAY)
+
+            results = [(contextId, 0, transferSyntaxes[0]) for contextId, result, abstractSyntax, transferSyntaxes in associate["contexts"]]
+            connection.sendall(encodeAssociateAc(associate["callingAeTitle"], associate["calledAeTitle"], results))
+
+            with self._lock:
+                self.associations += 1
+
+            command = ""
+            elements = None
+            while True:
+                pduType, value = receivePdu(connection)
+                if pduType == RELEASERQ:
+                    connection.sendall(encodeReleaseRp())
+                    break
+                elif pduType != PDATATF:
+                    break
+
+                for contextId, control, data in decodePdvs(value):
+                    if control & COMMANDFRAGMENT:
+                        command += data
+                        if control & LASTFRAGMENT:
+                            elements = decodeCommand(command)
+                            command = ""
+                    elif control & LASTFRAGMENT and elements is not None:
+                        response = encodeCStoreRsp(commandUs(elements, MESSAGEID), commandUid(elements, AFFECTEDSOPCLASSUID), commandUid(elements, AFFECTEDSOPINSTANCEUID), 0x0000)
+                        connection.sendall(encodePdataHeader(contextId, COMMANDFRAGMENT | LASTFRAGMENT, len(response)) + response)
+                        elements = None
+                        with self._lock:
+                            self.stored += 1
+        except DicomNetworkError:
+            pass
+        finally:
+            connection.close()
+
+def associationPerFile(svcStore, port, filenames):
+    """Every file in its own association (the way storescu is started per file)
+    """
+    statuses = []
+    for filename in filenames:
+        instance = svcStore.readInstance(filename)
+        association = Association("RPB", "PACS", "127.0.0.1", port, [(instance[0], instance[2])])
+        association.open()
+        statuses.append(association.store(filename, *instance))
+        association.release()
+
+    return statuses
+
+def pooledAssociations(svcStore, port, filenames):
+    """Files sent over pooled associations
+    """
+    return svcStore.store("RPB", "PACS", "127.0.0.1", port, filenames)
+
+def main():
+    """Compare C-STORE with association per file and pooled associations
+    """
+    workdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(workdir, "slice.dcm")
+        createFile(filename)
+        filenames = [filename] * FILES
+        print "%d instances of %.1f kB" % (FILES, os.path.getsize(filename) / 1024.0)
+
+        scp = StorageScp()
+        scp.start()
+
+        svcStore = DicomStoreService()
+        for name, send in [("association per file", associationPerFile), ("pooled associations", pooledAssociations)]:
+            associations = scp.associations
+            start = time.time()
+            statuses = send(svcStore, scp.port, filenames)
+            elapsed = time.time() - start
+            print "%-22s %8.1f instances/s, %d associations, %d stored" % (name, FILES / elapsed, scp.associations - associations, len([status for status in statuses if isSuccess(status)]))
+
+        svcStore.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
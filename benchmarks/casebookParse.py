@@ -0,0 +1,85 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import json, time
+
+# Services
+from services.OCCasebook import OCCasebook
+
+# Study metadata
+EVENTDEFINITIONS = 30
+FORMSPEREVENT = 10
+
+# Events of subject (repeating events)
+EVENTS = 60
+
+# Repetitions of each mode
+REPEAT = 5
+
+def createCasebook():
+    """OpenClinica REST casebook (JSON) of one subject
+    """
+    eventDefs = []
+    formDefs = []
+    for e in range(EVENTDEFINITIONS):
+        formRefs = []
+        for f in range(FORMSPEREVENT):
+            formOid = "F_FORM_%d_%d" % (e, f)
+            formRefs.append({ "@FormOID": formOid, "@Mandatory": "No" })
+            formDefs.append({
+                "@OID": formOid,
+                "@Name": formOid,
+                "ItemGroupRef": [{ "@ItemGroupOID": "IG_%d_%d_%d" % (e, f, i) } for i in range(20)],
+                "OpenClinica:FormDetails": { "OpenClinica:PresentInEventDefinition": { "@StudyEventOID": "SE_%d" % e, "@IsDefaultVersion": "Yes" } }
+            })
+        eventDefs.append({ "@OID": "SE_%d" % e, "@Name": "Event %d" % e, "FormRef": formRefs })
+
+    events = []
+    for i in range(EVENTS):
+        e = i % EVENTDEFINITIONS
+        events.append({
+            "@StudyEventOID": "SE_%d" % e,
+            "@StudyEventRepeatKey": str(i / EVENTDEFINITIONS + 1),
+            "@OpenClinica:Status": "data entry started",
+            "@OpenClinica:StartDate": "01-Jan-2016",
+            "FormData": [{ "@FormOID": "F_FORM_%d_%d" % (e, f), "@OpenClinica:Version": "v1", "@OpenClinica:Status": "initial data entry" } for f in range(2)]
+        })
+
+    return json.dumps({
+        "Study": { "MetaDataVersion": { "StudyEventDef": eventDefs, "FormDef": formDefs } },
+        "ClinicalData": { "SubjectData": { "@SubjectKey": "SS_1", "@OpenClinica:StudySubjectID": "1", "StudyEventData": events } }
+    })
+
+def repeatedDecoding(body):
+    """Body decoded on every r.json() access of the former event parser (twice per event and four checks)
+    """
+    for i in range(2 * EVENTS + 4):
+        json.loads(body)
+
+def decodeOnce(body):
+    """Body decoded once and indexed
+    """
+    casebook = OCCasebook(json.loads(body))
+    return casebook.subjectEvents("SS_1")
+
+def main():
+    """Compare casebook decoding of subject with many events
+    """
+    body = createCasebook()
+    print "Casebook %.1f kB, %d events" % (len(body) / 1024.0, EVENTS)
+
+    for name, parse in [("repeated decoding", repeatedDecoding), ("decode once", decodeOnce)]:
+        start = time.time()
+        for i in range(REPEAT):
+            parse(body)
+        elapsed = (time.time() - start) / REPEAT
+        print "%-18s %9.2f ms per casebook" % (name, elapsed * 1000)
+
+if __name__ == '__main__':
+    main()
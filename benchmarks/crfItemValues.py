@@ -0,0 +1,155 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import sys, time
+
+# Database
+from sqlalchemy import text
+
+# Services
+from services.DataPersistanceService import DataPersistanceService
+
+# Subjects of study
+SUBJECTS = 200
+
+# Event definitions (every one with own CRF) and repetitions of every event
+EVENTDEFINITIONS = 6
+REPEATS = 2
+
+# Items of every CRF version, one of them is annotated as DICOM StudyInstanceUID
+ITEMS = 30
+
+# Synthetic subset of OpenClinica 3.x schema used by the eCRF item value queries
+SCHEMA = """
+drop table if exists item_data, item_form_metadata, response_set, item, event_crf, event_definition_crf,
+    crf_version, crf, study_event, study_event_definition, study_subject, subject, study cascade;
+
+create table study (study_id serial primary key, oc_oid varchar(40) unique);
+create table subject (subject_id serial primary key, date_of_birth date, gender char(1), unique_identifier varchar(255));
+create table study_subject (study_subject_id serial primary key, label varchar(30), subject_id int references subject, study_id int references study);
+create table study_event_definition (study_event_definition_id serial primary key, name varchar(2000), description varchar(2000), oc_oid varchar(40) unique, ordinal int);
+create table study_event (study_event_id serial primary key, study_subject_id int references study_subject, study_event_definition_id int references study_event_definition, sample_ordinal int);
+create table crf (crf_id serial primary key, name varchar(255));
+create table crf_version (crf_version_id serial primary key, crf_id int references crf, name varchar(255), oc_oid varchar(40) unique);
+create table event_crf (event_crf_id serial primary key, study_event_id int references study_event, crf_version_id int references crf_version);
+create table event_definition_crf (event_definition_crf_id serial primary key, crf_id int references crf, study_event_definition_id int references study_event_definition, ordinal int);
+create table item (item_id serial primary key, name varchar(255), description varchar(4000), oc_oid varchar(40) unique);
+create table response_set (response_set_id serial primary key, version_id int references crf_version, response_type_id int, label varchar(80), options_values varchar(4000), options_text varchar(4000));
+create table item_form_metadata (item_form_metadata_id serial primary key, crf_version_id int references crf_version, item_id int references item, show_item boolean, ordinal int, response_set_id int references response_set);
+create table item_data (item_data_id serial primary key, event_crf_id int references event_crf, item_id int references item, ordinal int, value varchar(4000));
+
+create index i_study_subject_study_id on study_subject (study_id);
+create index i_subject_unique_identifier on subject (unique_identifier);
+create index i_study_event_study_subject_id on study_event (study_subject_id);
+create index i_event_crf_study_event_id on event_crf (study_event_id);
+create index i_item_form_metadata_crf_version_id on item_form_metadata (crf_version_id);
+create index i_item_data_event_crf_id on item_data (event_crf_id);
+"""
+
+DATA = """
+insert into study (oc_oid) values ('S_TEST');
+
+insert into subject (date_of_birth, gender, unique_identifier)
+    select date '1970-01-01' + s, 'm', 'DD-' || s from generate_series(1, :subjects) s;
+insert into study_subject (label, subject_id, study_id)
+    select 'SS-' || subject_id, subject_id, 1 from subject;
+
+insert into study_event_definition (name, description, oc_oid, ordinal)
+    select 'Event ' || e, 'Event ' || e, 'SE_' || e, e from generate_series(1, :events) e;
+insert into crf (name) select 'CT ' || e from generate_series(1, :events) e;
+insert into crf_version (crf_id, name, oc_oid) select crf_id, 'v1', 'F_CT_' || crf_id || '_V1' from crf;
+insert into event_definition_crf (crf_id, study_event_definition_id, ordinal) select crf_id, crf_id, 1 from crf;
+
+insert into response_set (version_id, response_type_id, label, options_values, options_text)
+    select crf_version_id, 6, 'yesno', '1, 2, 3', 'yes, no, unknown' from crf_version;
+insert into item (name, description, oc_oid)
+    select 'ITEM_' || v || '_' || n, 'Item ' || n, 'I_CT_' || v || '_' || n
+    from generate_series(1, :events) v, generate_series(1, :items) n;
+insert into item_form_metadata (crf_version_id, item_id, show_item, ordinal, response_set_id)
+    select i.item_id / :items + case when i.item_id % :items = 0 then 0 else 1 end, i.item_id, true, i.item_id, rs.response_set_id
+    from item i inner join response_set rs on rs.version_id = i.item_id / :items + case when i.item_id % :items = 0 then 0 else 1 end;
+
+insert into study_event (study_subject_id, study_event_definition_id, sample_ordinal)
+    select ss.study_subject_id, sed.study_event_definition_id, r
+    from study_subject ss, study_event_definition sed, generate_series(1, :repeats) r;
+insert into event_crf (study_event_id, crf_version_id)
+    select se.study_event_id, se.study_event_definition_id from study_event se;
+insert into item_data (event_crf_id, item_id, ordinal, value)
+    select ec.event_crf_id, ifm.item_id, 1,
+        case when ifm.ordinal % :items = 1 then '1.2.826.0.1.3680043.8.1055.' || ec.event_crf_id else ((ec.event_crf_id + ifm.item_id) % 3 + 1)::text end
+    from event_crf ec inner join item_form_metadata ifm on ec.crf_version_id = ifm.crf_version_id;
+
+analyze;
+"""
+
+def createSchema(svcDb):
+    """Synthetic OpenClinica study with annotated StudyInstanceUID item in every CRF
+    """
+    conn = svcDb.ocengine.connect()
+    conn.execute(text(SCHEMA))
+    conn.execute(text(DATA), { "subjects": SUBJECTS, "events": EVENTDEFINITIONS, "repeats": REPEATS, "items": ITEMS })
+    conn.close()
+
+def annotations():
+    """(event OID, form OID, item OID) of DICOM annotations
+    """
+    return [("SE_%d" % e, "F_CT_%d_V1" % e, "I_CT_%d_1" % e) for e in range(1, EVENTDEFINITIONS + 1)]
+
+def perEvent(svcDb):
+    """One getCrfItemValueV2 call per subject, event and annotation (the way the handler did before)
+    """
+    values = {}
+    for s in range(1, SUBJECTS + 1):
+        for r in range(1, REPEATS + 1):
+            for eventOid, formOid, itemOid in annotations():
+                session = svcDb.ocSession()
+                key = ("DD-%d" % s, eventOid, str(r), formOid, itemOid)
+                values[key] = svcDb.getCrfItemValueV2(session, "S_TEST", *key)
+                session.close()
+
+    return values
+
+def wholeStudy(svcDb):
+    """One set based query for all subjects, events and annotations
+    """
+    session = svcDb.ocSession()
+    values = svcDb.getCrfItemValuesForStudy(session, "S_TEST", annotations())
+    session.close()
+
+    return values
+
+def main():
+    """Compare eCRF item value query per event with query per study
+
+    Needs local PostgreSQL database which can be overwritten, e.g. createdb ocbench
+    Arguments: [host] [port] [dbname] [username] [password]
+    """
+    defaults = ["localhost", "5432", "ocbench", "postgres", "postgres"]
+    host, port, dbname, username, password = sys.argv[1:6] + defaults[len(sys.argv[1:6]):]
+
+    svcDb = DataPersistanceService(username, password, dbname, host, port)
+    svcDb.createOcDbConnection(username, password, dbname, host, port)
+    svcDb.ocengine.echo = False
+
+    createSchema(svcDb)
+    print "%d subjects, %d events, %d annotations" % (SUBJECTS, EVENTDEFINITIONS * REPEATS, len(annotations()))
+
+    results = []
+    for name, query in [("query per event", perEvent), ("query per study", wholeStudy)]:
+        start = time.time()
+        values = query(svcDb)
+        elapsed = time.time() - start
+        print "%-16s %9.1f ms, %d values" % (name, elapsed * 1000, len(values))
+
+        results.append(values)
+
+    print "Same values: " + str(results[0] == results[1])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import os, sys, shutil, tempfile, time
+
+# DICOM
+import dicom
+from dicom.dataset import Dataset, FileDataset
+
+# Services
+from services.DicomService import DicomService
+
+# Multi-frame image size
+FRAMES = 200
+ROWS = 512
+COLUMNS = 512
+
+# Repetitions of each mode
+REPEAT = 5
+
+def createMultiFrameFile(filename):
+    """Write multi-frame (e.g. PET/CT volume) DICOM file
+    """
+    fileMeta = Dataset()
+    fileMeta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.128"
+    fileMeta.MediaStorageSOPInstanceUID = "1.2.3.4.5.6"
+    fileMeta.TransferSyntaxUID = "1.2.840.10008.1.2.1"
+    fileMeta.ImplementationClassUID = "1.2.3.4"
+
+    ds = FileDataset(filename, {}, file_meta=fileMeta, preamble="\0" * 128)
+    ds.PatientID = "BENCH"
+    ds.StudyInstanceUID = "1.2.3.4"
+    ds.SeriesInstanceUID = "1.2.3.4.5"
+    ds.SOPInstanceUID = "1.2.3.4.5.6"
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.128"
+    ds.Modality = "PT"
+    ds.NumberOfFrames = FRAMES
+    ds.Rows = ROWS
+    ds.Columns = COLUMNS
+    ds.SamplesPerPixel = 1
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.PixelData = os.urandom(FRAMES * ROWS * COLUMNS * 2)
+    ds[0x7fe00010].VR = "OW"
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.save_as(filename)
+
+def fourReads(svcDicom, filename):
+    """Identifiers read the way the upload handlers did before (four full parses)
+    """
+    return (svcDicom.getPatientID(filename), svcDicom.getStudyInstanceUID(filename),
+        svcDicom.getSeriesInstanceUID(filename), svcDicom.getSopInstanceUID(filename))
+
+def headerRead(svcDicom, filename):
+    """Identifiers read with one header only parse
+    """
+    return svcDicom.readIdentifiers(filename)
+
+def main():
+    """Compare identifier reading of large multi-frame file
+    """
+    workdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(workdir, "multiframe.dcm")
+        createMultiFrameFile(filename)
+        print "File size %.1f MB, %d frames" % (os.path.getsize(filename) / 1024.0 / 1024.0, FRAMES)
+
+        svcDicom = DicomService()
+        for name, read in [("four full reads", fourReads), ("header only", headerRead)]:
+            start = time.time()
+            for i in range(REPEAT):
+                read(svcDicom, filename)
+            elapsed = (time.time() - start) / REPEAT
+            print "%-16s %9.2f ms per file" % (name, elapsed * 1000)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import random, threading, time
+
+# Queue
+import Queue
+
+# Contexts
+from contexts.ConfigDetails import ConfigDetails
+
+# Services
+from services.DicomIngestionService import DicomIngestionService
+from services.ImportVerificationService import ImportVerificationService
+
+# Slices of uploaded series
+INSTANCES = 500
+
+# Concurrent upload handlers
+UPLOADERS = 8
+
+# Seconds PACS needs until a stored instance is visible (uniformly distributed)
+IMPORTDELAY = 0.5
+
+# Seconds one PACS web request takes
+REQUESTTIME = 0.002
+
+class FakePacs(object):
+    """PACS web interface where instances appear some time after they were stored
+    """
+
+    def __init__(self):
+        """Constructor
+        """
+        self.visible = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def stored(self, sopUid):
+        """Instance was sent to PACS
+        """
+        with self._lock:
+            self.visible[sopUid] = time.time() + random.uniform(0, IMPORTDELAY)
+
+    def fileExists(self, pacsBaseUrl, patientId, studyUid, seriesUid, sopUid):
+        """Instance query
+        """
+        with self._lock:
+            self.requests += 1
+        time.sleep(REQUESTTIME)
+
+        return self.visible.get(sopUid, float("inf")) <= time.time()
+
+    def seriesInstances(self, pacsBaseUrl, patientId, studyUid, seriesUid):
+        """Series query
+        """
+        with self._lock:
+            self.requests += 1
+        time.sleep(REQUESTTIME)
+
+        now = time.time()
+        return [sopUid for sopUid, visible in self.visible.items() if visible <= now]
+
+def upload(svcPacs, importVerifier):
+    """Store and verify series slice by slice from concurrent handlers
+
+    Returns (verified instances, latencies)
+    """
+    work = Queue.Queue()
+    for i in range(INSTANCES):
+        work.put("1.2.3.4." + str(i))
+
+    latencies = []
+    lock = threading.Lock()
+
+    def handler():
+        svcIngestion = DicomIngestionService(svcPacs, importVerifier=importVerifier)
+        while True:
+            try:
+                sopUid = work.get_nowait()
+            except Queue.Empty:
+                return
+
+            svcPacs.stored(sopUid)
+            start = time.time()
+            fileImportSucess = svcIngestion.verify("http://pacs/", "P1", "1.2.3", "1.2.3.1", sopUid)
+            with lock:
+                latencies.append((fileImportSucess, time.time() - start))
+
+    threads = [threading.Thread(target=handler) for i in range(UPLOADERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return len([latency for latency in latencies if latency[0]]), sorted(latency[1] for latency in latencies)
+
+def main():
+    """Compare per file polling with series batched verification
+    """
+    print "%d instances, %d concurrent uploads, import delay up to %d ms" % (INSTANCES, UPLOADERS, IMPORTDELAY * 1000)
+
+    for name in ["per file polling", "series batched"]:
+        svcPacs = FakePacs()
+        importVerifier = None
+        if name == "series batched":
+            importVerifier = ImportVerificationService(svcPacs, ConfigDetails().dicomVerifyTimeout, ConfigDetails().dicomVerifyInterval, ConfigDetails().dicomVerifyMaxInterval, seriesQuery=True)
+            importVerifier.start()
+
+        verified, latencies = upload(svcPacs, importVerifier)
+
+        if importVerifier is not None:
+            importVerifier.stop()
+
+        print "%-18s %4d verified, %6d PACS requests, latency p50 %4d ms, p99 %4d ms" % (name, verified, svcPacs.requests,
+            latencies[len(latencies) / 2] * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000)
+
+if __name__ == '__main__':
+    main()
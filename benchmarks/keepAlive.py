@@ -0,0 +1,76 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import sys, ssl, time
+
+# HTTP
+import httplib
+
+# Requests per measurement
+REQUESTS = 500
+
+def request(connection, path, headers):
+    """Perform GET request and read whole response
+    """
+    connection.request("GET", path, headers=headers)
+    response = connection.getresponse()
+    data = response.read()
+
+    return response, len(data)
+
+def run(host, port, path, headers, persistent):
+    """Time REQUESTS requests over new or one persistent TLS connection
+    """
+    context = ssl._create_unverified_context()
+
+    connection = httplib.HTTPSConnection(host, port, context=context)
+    connections = 1
+    transferred = 0
+
+    start = time.time()
+    for i in range(REQUESTS):
+        if not persistent:
+            connection.close()
+            connection = httplib.HTTPSConnection(host, port, context=context)
+            connections += 1
+
+        response, length = request(connection, path, headers)
+        transferred += length
+
+        # Server reached its per connection request limit
+        if response.getheader("Connection", "").lower() == "close":
+            connection.close()
+            connection = httplib.HTTPSConnection(host, port, context=context)
+            connections += 1
+
+    elapsed = time.time() - start
+    connection.close()
+
+    return elapsed, connections, transferred
+
+def main():
+    """Compare request rate with and without persistent connections against running server
+
+    Usage: python -m benchmarks.keepAlive host port username password [path]
+    e.g. path of one unzipped DICOM file /api/v1/patients/{pid}/dicomStudies/{uid}/dcm/{filename}
+    """
+    if len(sys.argv) < 5:
+        print main.__doc__
+        return
+
+    host, port, username, password = sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4]
+    path = sys.argv[5] if len(sys.argv) > 5 else "/api/v1/getServerStatistics"
+    headers = { "Username": username, "Password": password }
+
+    for name, persistent in [("new connection", False), ("keep-alive", True)]:
+        elapsed, connections, transferred = run(host, port, path, headers, persistent)
+        print "%-15s %8.1f req/s   %6d connections   %12d bytes" % (name, REQUESTS / elapsed, connections, transferred)
+
+if __name__ == '__main__':
+    main()
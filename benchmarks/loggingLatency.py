@@ -0,0 +1,96 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import os, sys, shutil, tempfile, threading, time
+
+# Logging
+import logging
+import logging.config
+
+# Utils
+from utils import LoggingBootstrap
+
+# Concurrent load
+THREADS = 16
+REQUESTS = 50
+
+# Before: handler setup() and services constructed per request configured logging
+CONFIGURATIONSPERREQUEST = 4
+MESSAGESPERREQUEST = 10
+
+def legacyRequest(logger):
+    """Request configuring logging the way handler and services did
+    """
+    for i in range(CONFIGURATIONSPERREQUEST):
+        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
+    for i in range(MESSAGESPERREQUEST):
+        logger.info("Request message " + str(i))
+
+def bootstrappedRequest(logger):
+    """Request with logging configured once per process
+    """
+    for i in range(MESSAGESPERREQUEST):
+        logger.info("Request message " + str(i))
+
+def run(request):
+    """Latencies [ms] of all requests executed by concurrent threads
+    """
+    logger = logging.getLogger(__name__)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        for i in range(REQUESTS):
+            start = time.time()
+            request(logger)
+            with lock:
+                latencies.append((time.time() - start) * 1000)
+
+    threads = [threading.Thread(target=worker) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return sorted(latencies)
+
+def report(name, latencies, out):
+    """Print latency percentiles
+    """
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    out.write("%-14s mean %8.3f ms   p50 %8.3f ms   p99 %8.3f ms\n" % (name, sum(latencies) / len(latencies), percentile(0.5), percentile(0.99)))
+
+def main():
+    """Compare request latency before and after logging bootstrap under concurrent load
+    """
+    out = sys.stdout
+    repository = os.getcwd()
+
+    # Log file and console output go to scratch locations
+    workdir = tempfile.mkdtemp()
+    shutil.copy(os.path.join(repository, "logging.ini"), workdir)
+    os.chdir(workdir)
+    sys.stdout = open(os.devnull, "w")
+
+    try:
+        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
+        report("fileConfig", run(legacyRequest), out)
+
+        LoggingBootstrap.configure("logging.ini")
+        report("bootstrap", run(bootstrappedRequest), out)
+        LoggingBootstrap.stop()
+    finally:
+        sys.stdout = out
+        os.chdir(repository)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import shutil, tempfile, threading, time
+
+# Logging
+import logging
+
+# Services
+from services.OdmFileDataService import OdmFileDataService
+from services.StudyMetadataCache import StudyMetadataCache
+
+# Utils
+from utils.BoundedExecutor import BoundedExecutor
+
+# Size of synthetic study ODM
+FORMS = 40
+ITEMS = 100
+
+# Seconds of getMetadata SOAP call stand-in
+LATENCY = 0.25
+
+# dicomStudies requests and loadCrfItem lookups of each request
+REQUESTS = 20
+LOOKUPS = 5
+
+KEY = ("http://localhost/OpenClinica-ws/", "S_BENCH")
+
+def odm(version=1):
+    """Synthetic ODM metadata with FORMS x ITEMS ItemDefs
+    """
+    itemDefs = []
+    for f in range(FORMS):
+        for i in range(ITEMS):
+            itemDefs.append(
+                '<ItemDef OID="I_F%d_%d" Name="ITEM_%d_%d" Comment="Item %d of form %d v%d" DataType="text" OpenClinica:FormOIDs="F_%d">'
+                '<OpenClinica:ItemDetails><OpenClinica:ItemPresentInForm FormOID="F_%d">'
+                '<OpenClinica:LeftItemText>Label %d</OpenClinica:LeftItemText>'
+                '</OpenClinica:ItemPresentInForm></OpenClinica:ItemDetails></ItemDef>' % (f, i, f, i, i, f, version, f, f, i)
+            )
+
+    return (
+        '<ODM xmlns="http://www.cdisc.org/ns/odm/v1.3" xmlns:OpenClinica="http://www.openclinica.org/ns/odm_ext_v130/v3.1">'
+        '<Study OID="S_BENCH"><MetaDataVersion OID="v1.0.0">' + "".join(itemDefs) + '</MetaDataVersion></Study></ODM>'
+    )
+
+class Loader(object):
+    """getMetadata stand-in with latency and call counter
+    """
+
+    def __init__(self, document):
+        """Constructor
+        """
+        self.document = document
+        self.calls = 0
+
+    def __call__(self):
+        """Download ODM
+        """
+        time.sleep(LATENCY)
+        self.calls += 1
+        return self.document
+
+def lookups(svcOdm, metadata):
+    """loadCrfItem calls of one request
+    """
+    return [svcOdm.loadCrfItem("F_%d" % f, "I_F%d_%d" % (f, f), metadata).label for f in range(LOOKUPS)]
+
+def main():
+    """Compare metadata download per request with study metadata cache
+    """
+    logging.disable(logging.ERROR)
+
+    svcOdm = OdmFileDataService()
+    document = odm()
+    print "ODM size: %.1f MB" % (len(document) / 1024.0 / 1024.0)
+
+    # Download and parse per request (the way dicomStudies did before)
+    loader = Loader(document)
+    start = time.time()
+    for r in range(REQUESTS):
+        expected = lookups(svcOdm, svcOdm.indexMetadata(loader()))
+    print "%-16s %7.1f ms/request, %d downloads" % ("per request", (time.time() - start) / REQUESTS * 1000, loader.calls)
+
+    # Cached raw ODM and parsed index
+    executor = BoundedExecutor(2)
+    executor.start()
+    directory = tempfile.mkdtemp()
+
+    cache = StudyMetadataCache(ttl=300, directory=directory, executor=executor, indexFunction=svcOdm.indexMetadata)
+    loader = Loader(document)
+    start = time.time()
+    for r in range(REQUESTS):
+        results = lookups(svcOdm, cache.get(KEY, loader).index())
+    print "%-16s %7.1f ms/request, %d downloads, same results: %s" % ("cache", (time.time() - start) / REQUESTS * 1000, loader.calls, results == expected)
+
+    # Concurrent misses of one study share single download
+    cache.invalidate(KEY)
+    loader = Loader(document)
+    threads = [threading.Thread(target=cache.get, args=(KEY, loader)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print "%-16s 8 concurrent misses, %d download" % ("single flight", loader.calls)
+
+    # Stale entry is served immediately while it is refreshed in background
+    cache.ttl = 0
+    changed = Loader(odm(2))
+    start = time.time()
+    entry = cache.get(KEY, changed)
+    served = (time.time() - start) * 1000
+    time.sleep(LATENCY * 2)
+    print "%-16s stale served in %.2f ms (version %d), refreshed to version %d" % ("revalidate", served, entry.version, cache.get(KEY, changed).version)
+    cache.ttl = 300
+
+    # Disk tier survives restart of server
+    restarted = StudyMetadataCache(ttl=300, directory=directory, indexFunction=svcOdm.indexMetadata)
+    loader = Loader(document)
+    start = time.time()
+    entry = restarted.get(KEY, loader)
+    print "%-16s %7.1f ms first request after restart, %d downloads" % ("disk tier", (time.time() - start) * 1000, loader.calls)
+
+    print cache.statistics()
+
+    executor.stop()
+    shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import json, threading, time, uuid
+
+# HTTP
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+# Services
+from services.OCRestfulService import OCRestfulService
+from services.OCSessionCache import OCSessionCache
+
+# Subjects of study (one casebook call per subject)
+SUBJECTS = 300
+
+# Seconds OC spends in Spring security login (password hashing, session setup)
+LOGINTIME = 0.01
+
+# OC web session expires after this number of requests (forces re-login)
+SESSIONREQUESTS = 100
+
+class FakeOpenClinicaHandler(BaseHTTPRequestHandler):
+    """OpenClinica stand-in with Spring security login and REST casebook
+    """
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+
+    def do_POST(self):
+        """j_spring_security_check
+        """
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(LOGINTIME)
+
+        sessionId = uuid.uuid4().hex
+        self.server.sessions[sessionId] = 0
+        self.server.logins += 1
+        self.respond(302, { "Location": "/OpenClinica/MainMenu", "Set-Cookie": "JSESSIONID=" + sessionId + "; Path=/OpenClinica" })
+
+    def do_GET(self):
+        """Casebook, main menu and login page
+        """
+        self.server.requests += 1
+        if self.path.startswith("/OpenClinica/pages/login/login") or self.path.startswith("/OpenClinica/MainMenu"):
+            self.respond(200, {}, "<html></html>")
+            return
+
+        cookie = self.headers.get("Cookie", "")
+        sessionId = cookie.split("JSESSIONID=")[-1].split(";")[0] if "JSESSIONID=" in cookie else None
+        if sessionId not in self.server.sessions or self.server.sessions[sessionId] >= SESSIONREQUESTS:
+            self.respond(302, { "Location": "/OpenClinica/pages/login/login" })
+            return
+
+        self.server.sessions[sessionId] += 1
+        self.respond(200, { "Content-Type": "application/json" }, self.casebook())
+
+    def casebook(self):
+        """Casebook JSON of requested path
+        """
+        return json.dumps({ "ClinicalData": { "SubjectData": { "@SubjectKey": "SS_1" } } })
+
+    def respond(self, code, headers, body=""):
+        """Send response with body
+        """
+        self.send_response(code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Quiet
+        """
+        pass
+
+class FakeOpenClinica(ThreadingMixIn, HTTPServer):
+    """Threaded stand-in server with login and request counters
+    """
+    daemon_threads = True
+
+    def __init__(self, *args):
+        """Constructor
+        """
+        HTTPServer.__init__(self, *args)
+        self.sessions = {}
+        self.logins = 0
+        self.requests = 0
+
+def main():
+    """Compare casebook calls with login per call and cached sessions
+    """
+    server = FakeOpenClinica(("127.0.0.1", 0), FakeOpenClinicaHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    ocBaseUrl = "http://127.0.0.1:" + str(server.server_address[1]) + "/OpenClinica/"
+
+    for name, sessionCache in [("login per call", None), ("cached sessions", OCSessionCache())]:
+        svcOcRestful = OCRestfulService("user", "secret", sessionCache)
+        logins = server.logins
+        requests = server.requests
+        start = time.time()
+        for i in range(SUBJECTS):
+            svcOcRestful.getStudyCasebookEvents([ocBaseUrl, "S_TEST", "SS_" + str(i)])
+        elapsed = time.time() - start
+        print "%-16s %7.1f calls/s, %4d logins, %4d GET requests" % (name, SUBJECTS / elapsed, server.logins - logins, server.requests - requests)
+        if sessionCache is not None:
+            print "%-16s %s" % ("", sessionCache.statistics())
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import time
+
+# Logging
+import logging
+
+# Services
+from services.OdmFileDataService import OdmFileDataService, nsmaps, ET
+
+# Size of synthetic study ODM
+EVENTS = 10
+FORMS = 40
+GROUPS = 4
+ITEMS = 25
+
+# loadCrfItem calls (subjects x events x annotations of dicomStudies request)
+LOOKUPS = 2000
+
+def odm():
+    """Synthetic ODM metadata with event, form, item group and item definitions
+    """
+    xml = [
+        '<ODM xmlns="http://www.cdisc.org/ns/odm/v1.3" xmlns:OpenClinica="http://www.openclinica.org/ns/odm_ext_v130/v3.1">'
+        '<Study OID="S_BENCH"><MetaDataVersion OID="v1.0.0">'
+    ]
+
+    for e in range(EVENTS):
+        xml.append('<StudyEventDef OID="SE_%d">' % e)
+        xml.extend('<FormRef FormOID="F_%d"/>' % f for f in range(e * FORMS / EVENTS, (e + 1) * FORMS / EVENTS))
+        xml.append('</StudyEventDef>')
+
+    for f in range(FORMS):
+        xml.append('<FormDef OID="F_%d">' % f)
+        xml.extend('<ItemGroupRef ItemGroupOID="IG_%d_%d"/>' % (f, g) for g in range(GROUPS))
+        xml.append('</FormDef>')
+
+    for f in range(FORMS):
+        for g in range(GROUPS):
+            xml.append('<ItemGroupDef OID="IG_%d_%d">' % (f, g))
+            xml.extend('<ItemRef ItemOID="I_%d_%d_%d"/>' % (f, g, i) for i in range(ITEMS))
+            xml.append('</ItemGroupDef>')
+
+    for f in range(FORMS):
+        for g in range(GROUPS):
+            for i in range(ITEMS):
+                xml.append(
+                    '<ItemDef OID="I_%d_%d_%d" Name="ITEM_%d_%d" Comment="Item %d" DataType="text" OpenClinica:FormOIDs="F_%d">'
+                    '<OpenClinica:ItemDetails><OpenClinica:ItemPresentInForm FormOID="F_%d">'
+                    '<OpenClinica:LeftItemText>Label %d %d %d</OpenClinica:LeftItemText>'
+                    '</OpenClinica:ItemPresentInForm></OpenClinica:ItemDetails></ItemDef>' % (f, g, i, g, i, i, f, f, f, g, i)
+                )
+
+    xml.append('</MetaDataVersion></Study></ODM>')
+    return "".join(xml)
+
+def xpathItem(formOid, itemOid, documentTree):
+    """loadCrfItem the way it was implemented before (XPath scan of parsed document)
+    """
+    label = None
+    for itemElement in documentTree.iterfind('.//odm:ItemDef[@OID="' + itemOid + '"]', namespaces=nsmaps):
+        if itemElement.attrib["{http://www.openclinica.org/ns/odm_ext_v130/v3.1}FormOIDs"].find(formOid) != -1:
+            for text in itemElement.iter("{http://www.openclinica.org/ns/odm_ext_v130/v3.1}LeftItemText"):
+                label = text.text
+
+    return label
+
+def xpathItemOid(formOid, itemName, documentTree):
+    """getItemOidFromMetadata the way it was implemented before
+    """
+    itemOids = [item.attrib["OID"] for item in documentTree.iterfind('.//odm:ItemDef[@OpenClinica:FormOIDs="' + formOid + '"]' + '[@Name="' + itemName + '"]', namespaces=nsmaps)]
+    if len(itemOids) == 1:
+        return itemOids[0]
+
+def xpathItemGroupOid(itemOid, documentTree):
+    """getItemGroupOidFromMetadata the way it was implemented before
+    """
+    for group in documentTree.iterfind('.//odm:ItemGroupDef', namespaces=nsmaps):
+        for element in group:
+            if element.attrib.get("ItemOID") == itemOid:
+                return group.attrib["OID"]
+
+def main():
+    """Compare XPath lookups in ODM metadata with lookups in OdmMetadataIndex
+    """
+    logging.disable(logging.ERROR)
+
+    svcOdm = OdmFileDataService()
+    metadata = odm()
+    print "ODM size: %.1f MB, %d ItemDefs, %d lookups" % (len(metadata) / 1024.0 / 1024.0, FORMS * GROUPS * ITEMS, LOOKUPS)
+
+    keys = [("F_%d" % (n % FORMS), "I_%d_%d_%d" % (n % FORMS, n % GROUPS, n % ITEMS)) for n in range(LOOKUPS)]
+
+    start = time.time()
+    documentTree = ET.ElementTree(ET.fromstring(metadata))
+    parsed = time.time() - start
+    expected = [xpathItem(formOid, itemOid, documentTree) for formOid, itemOid in keys]
+    print "%-20s %8.1f ms (parse %.1f ms)" % ("XPath per lookup", (time.time() - start) * 1000, parsed * 1000)
+
+    start = time.time()
+    index = svcOdm.indexMetadata(metadata)
+    indexed = time.time() - start
+    results = [svcOdm.loadCrfItem(formOid, itemOid, index).label for formOid, itemOid in keys]
+    print "%-20s %8.1f ms (index %.1f ms)" % ("OdmMetadataIndex", (time.time() - start) * 1000, indexed * 1000)
+
+    print "Same labels: " + str(results == expected)
+
+    # Lookups of ODM import generation
+    names = [("F_%d" % f, "ITEM_%d_%d" % (g, i)) for f in range(0, FORMS, 7) for g in range(GROUPS) for i in range(0, ITEMS, 6)]
+    same = all(svcOdm.getItemOidFromMetadata(index, f, n) == xpathItemOid(f, n, documentTree) for f, n in names)
+    same = same and all(svcOdm.getItemGroupOidFromMetadata(index, o) == xpathItemGroupOid(o, documentTree) for f, o in keys[:100])
+    print "Same item and item group OIDs: " + str(same)
+
+    print "Forms of SE_0: " + ", ".join(index.eventForms["SE_0"]) + ", items of F_0: %d" % len(index.formItems("F_0"))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import json, threading, time
+
+# HTTP
+import requests
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+# Services
+from services.ConquestService import ConquestService
+
+# Verification requests in each mode
+REQUESTS = 1000
+
+class FakeConquestHandler(BaseHTTPRequestHandler):
+    """Conquest web server stand-in answering rpbfileexists with keep-alive
+    """
+    protocol_version = "HTTP/1.1"
+
+    # Response is written in one segment (no delayed ACK stall on kept connection)
+    wbufsize = -1
+
+    def do_GET(self):
+        """File exists query
+        """
+        body = json.dumps({ "FoundFilesCount": "1" })
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Quiet
+        """
+        pass
+
+class FakeConquest(ThreadingMixIn, HTTPServer):
+    """Threaded stand-in server counting accepted connections
+    """
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        """Count connection
+        """
+        self.connections += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+def sessionPerRequest(pacsBaseUrl):
+    """New session per call (the way PACS was called before)
+    """
+    for i in range(REQUESTS):
+        session = requests.Session()
+        session.headers.update({ "Content-Type": "application/json", "Content-Length": "0" })
+        response = session.get(pacsBaseUrl + "?mode=rpbfileexists&SopUID=" + str(i), verify=False)
+        int(response.json()["FoundFilesCount"])
+
+def pooledSessions(pacsBaseUrl):
+    """Shared keep-alive session pool of ConquestService
+    """
+    svcPacs = ConquestService()
+    for i in range(REQUESTS):
+        svcPacs.fileExists(pacsBaseUrl, "P1", "1.2.3", "1.2.3.1", str(i))
+
+    return svcPacs.statistics()
+
+def main():
+    """Compare PACS requests with new session per call and pooled sessions
+    """
+    server = FakeConquest(("127.0.0.1", 0), FakeConquestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    pacsBaseUrl = "http://127.0.0.1:" + str(server.server_address[1]) + "/cgi-bin/dgate"
+
+    for name, call in [("session per request", sessionPerRequest), ("pooled sessions", pooledSessions)]:
+        connections = server.connections
+        start = time.time()
+        statistics = call(pacsBaseUrl)
+        elapsed = time.time() - start
+        print "%-20s %8.1f requests/s, %4d connections" % (name, REQUESTS / elapsed, server.connections - connections)
+        if statistics is not None:
+            print "%-20s %s" % ("", statistics)
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import sys, ssl, time
+
+# HTTP
+import httplib
+
+# Client processes (client side must not be limited by one core either)
+import multiprocessing
+
+# Seconds of load per client
+DURATION = 20
+
+def client(arguments):
+    """Send requests over one persistent connection for DURATION seconds
+
+    Returns number of successful requests
+    """
+    host, port, path, headers = arguments
+    context = ssl._create_unverified_context()
+    connection = httplib.HTTPSConnection(host, port, context=context)
+
+    count = 0
+    deadline = time.time() + DURATION
+    while time.time() < deadline:
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+
+        if response.status == 200:
+            count += 1
+
+        if response.getheader("Connection", "").lower() == "close":
+            connection.close()
+            connection = httplib.HTTPSConnection(host, port, context=context)
+
+    connection.close()
+
+    return count
+
+def main():
+    """Measure GET throughput of running server with concurrent clients
+
+    Usage: python -m benchmarks.requestThroughput host port username password clients [path]
+    Run against the server started with processes = 1 and processes = number of cores
+    e.g. metadata endpoint /api/v1/getAllPartnerSites
+    """
+    if len(sys.argv) < 6:
+        print main.__doc__
+        return
+
+    host, port, username, password = sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4]
+    clients = int(sys.argv[5])
+    path = sys.argv[6] if len(sys.argv) > 6 else "/api/v1/getAllPartnerSites"
+    headers = { "Username": username, "Password": password }
+
+    pool = multiprocessing.Pool(clients)
+    counts = pool.map(client, [(host, port, path, headers)] * clients)
+    pool.close()
+
+    total = sum(counts)
+    print "%d clients   %d requests   %.1f req/s" % (clients, total, total / float(DURATION))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import re, timeit
+
+# Server
+from httpsServer import ROUTES, SecureHTTPRequestHandler
+
+# Legacy if/elif chain of do_GET and do_POST (in order of evaluation)
+LEGACY = {
+    "POST": [
+        "/api/v1/uploadDicomData/",
+        "/api/v1/addPullDataRequest/",
+    ],
+    "GET": [
+        "/api/v1/authenticateUser/*",
+        "/api/v1/getMyDefaultAccount/*",
+        "/api/v1/getStudyByOcIdentifier/*",
+        "/api/v1/getAllRTStructs/*",
+        "/api/v1/getCrfFieldsAnnotationForStudy/*",
+        "/api/v1/getDicomStudyCrfAnnotationsForStudy/*",
+        "/api/v1/getDicomPatientCrfAnnotationsForStudy/*",
+        "/api/v1/getDicomReportCrfAnnotationsForStudy/*",
+        "/api/v1/getAllPartnerSites/*",
+        "/api/v1/getAllPartnerExceptName/*",
+        "/api/v1/getPartnerSiteByName/*",
+        "/api/v1/getMySite/*",
+        "/api/v1/getLatestSoftware/*",
+        "/api/v1/getAllDicomStudies/*",
+        "/api/v1/getDicomStudiesByPatientId/*",
+        ".*/api/v1/patients/.*/dicomStudies/.*/dcm/.*",
+        ".*/api/v1/patients/.*/dicomStudies/.*/clean",
+        ".*/api/v1/patients/.*/dicomStudies/.*/unzip",
+        ".*/api/v1/studies/.*/dicomStudies",
+        "/api/v1/getCrfItemValue/*",
+        "/api/v2/getCrfItemValue/*",
+        "/api/v1/getOCAccoutPasswordHash/*",
+        "/api/v1/getOCStudyByIdentifier/*",
+        "/api/v1/getUserActiveStudy/*",
+        "/api/v1/changeUserActiveStudy/*",
+    ]
+}
+
+def samplePath(template):
+    """Fill path template parameters with sample values
+    """
+    segments = []
+    for segment in template.split("/"):
+        if segment.startswith("{"):
+            segment = "1" if segment.endswith(":int}") else "S_" + segment[1:-1].split(":")[0].upper()
+        segments.append(segment)
+
+    return "/".join(segments)
+
+def legacyDispatch(method, path):
+    """Dispatch the way the if/elif chain did (first matching pattern)
+    """
+    for pattern in LEGACY[method]:
+        if None != re.search(pattern, path):
+            return pattern
+
+def main():
+    """Report per request dispatch time of every route
+    """
+    number = 20000
+    router = SecureHTTPRequestHandler.router
+
+    print "%-6s %-100s %12s %12s" % ("METHOD", "PATH", "ROUTER [us]", "LEGACY [us]")
+
+    for method, template, handler in ROUTES:
+        path = samplePath(template)
+
+        matched, params = router.match(method, path)
+        assert matched is handler, path
+
+        routerTime = timeit.timeit(lambda: router.match(method, path), number=number)
+        legacyTime = timeit.timeit(lambda: legacyDispatch(method, path), number=number)
+
+        print "%-6s %-100s %12.2f %12.2f" % (method, path, routerTime / number * 1e6, legacyTime / number * 1e6)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import re, threading, time
+
+# Logging
+import logging
+
+# HTTP
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+# SOAP
+from pysimplesoap.transport import get_http_wrapper
+
+# Services
+from services.OCConnectInfo import OCConnectInfo
+from services.OCWebServices import OCWebServices
+from services.OCWebServicesRegistry import OCWebServicesRegistry
+
+# Users sending requests concurrently (one thread per user)
+USERS = ["alice", "bob", "carol", "dave"]
+
+# Requests of every user
+REQUESTS = 50
+
+# listAll response, study name reports WSSE user of the request
+LISTALLRESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/">
+<SOAP-ENV:Body>
+<listAllResponse xmlns="http://openclinica.org/ws/study/v1">
+<result>Success</result>
+<studies><study><identifier>S_TEST</identifier><oid>S_TEST</oid><name>%s</name><sites/></study></studies>
+</listAllResponse>
+</SOAP-ENV:Body>
+</SOAP-ENV:Envelope>"""
+
+class FakeSoapHandler(BaseHTTPRequestHandler):
+    """OpenClinica SOAP stand-in answering listAll with keep-alive
+    """
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+
+    def setup(self):
+        """Count accepted connections
+        """
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        """listAllRequest
+        """
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        username = re.search("Username>([^<]*)<", body).group(1)
+
+        response = LISTALLRESPONSE % username
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        """Quiet
+        """
+        pass
+
+class FakeSoapServer(ThreadingMixIn, HTTPServer):
+    """Threaded stand-in server with connection counter
+    """
+    daemon_threads = True
+
+    def __init__(self, *args):
+        """Constructor
+        """
+        HTTPServer.__init__(self, *args)
+        self.lock = threading.Lock()
+        self.connections = 0
+
+def requests(baseUrl, registry, username, mismatches):
+    """Requests of one user, each lists studies with SOAP client created or acquired for the request
+    """
+    for i in range(REQUESTS):
+        ocConnectInfo = OCConnectInfo(baseUrl, username, "hash-" + username)
+        if registry is not None:
+            svcOcWebServices = registry.acquire(ocConnectInfo)
+        else:
+            svcOcWebServices = OCWebServices(ocConnectInfo)
+
+        success, studies = svcOcWebServices.listAllStudies()
+        if studies[0].name() != username:
+            mismatches.append(username)
+
+        if registry is not None:
+            registry.release(ocConnectInfo, svcOcWebServices)
+        else:
+            svcOcWebServices.close()
+
+def main():
+    """Compare SOAP client per request with registry of clients per user
+    """
+    logging.disable(logging.INFO)
+
+    server = FakeSoapServer(("127.0.0.1", 0), FakeSoapHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    baseUrl = "http://127.0.0.1:" + str(server.server_address[1]) + "/OpenClinica-ws/"
+    print "SOAP transport: " + get_http_wrapper()._wrapper_version
+
+    for name, registry in [("client per request", None), ("client registry", OCWebServicesRegistry())]:
+        connections = server.connections
+        mismatches = []
+        threads = [threading.Thread(target=requests, args=(baseUrl, registry, username, mismatches)) for username in USERS]
+
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.time() - start
+
+        print "%-18s %7.1f requests/s, %4d connections, %d responses of other user" % (name, len(USERS) * REQUESTS / elapsed, server.connections - connections, len(mismatches))
+        if registry is not None:
+            print "%-18s %s" % ("", registry.statistics())
+            registry.close()
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
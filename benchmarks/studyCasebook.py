@@ -0,0 +1,106 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import json, threading, time
+
+# Services
+from services.OCRestfulService import OCRestfulService
+from services.OCSessionCache import OCSessionCache
+
+# Benchmarks
+from benchmarks.ocSessions import FakeOpenClinica, FakeOpenClinicaHandler
+
+# Subjects of study
+SUBJECTS = 300
+
+# Events of every subject
+EVENTS = 6
+
+# Seconds OC spends in building casebook, fixed part and part per subject
+CASEBOOKTIME = 0.005
+SUBJECTTIME = 0.0002
+
+def subjectData(s):
+    """Casebook JSON of one subject
+    """
+    return {
+        "@SubjectKey": "SS_%d" % s,
+        "@OpenClinica:StudySubjectID": "%d" % s,
+        "StudyEventData": [{
+            "@StudyEventOID": "SE_%d" % e,
+            "@StudyEventRepeatKey": "1",
+            "@OpenClinica:Status": "scheduled",
+            "@OpenClinica:StartDate": "01-Jan-2016",
+            "FormData": { "@FormOID": "F_CT_%d" % e, "@OpenClinica:Version": "v1", "@OpenClinica:Status": "initial data entry" }
+        } for e in range(EVENTS)]
+    }
+
+class StudyCasebookHandler(FakeOpenClinicaHandler):
+    """OpenClinica stand-in answering casebooks of one subject or of whole study
+    """
+
+    def casebook(self):
+        """Casebook JSON of requested path
+        """
+        subjectOid = self.path.split("/view/")[1].split("/")[1]
+        if subjectOid == "*":
+            subjects = [subjectData(s) for s in range(SUBJECTS)]
+        else:
+            subjects = subjectData(int(subjectOid[3:]))
+
+        time.sleep(CASEBOOKTIME + SUBJECTTIME * (SUBJECTS if subjectOid == "*" else 1))
+
+        return json.dumps({
+            "Study": { "MetaDataVersion": { "StudyEventDef": [{ "@OID": "SE_%d" % e, "FormRef": { "@FormOID": "F_CT_%d" % e } } for e in range(EVENTS)] } },
+            "ClinicalData": { "SubjectData": subjects }
+        })
+
+def perSubject(svcOcRestful, ocBaseUrl):
+    """Subjects casebook and casebook of every subject (the way the handler did before)
+    """
+    events = {}
+    for subject in svcOcRestful.getStudyCasebookSubjects([ocBaseUrl, "S_TEST"]):
+        events[subject.oid] = svcOcRestful.getStudyCasebookEvents([ocBaseUrl, "S_TEST", subject.oid])
+
+    return events
+
+def wholeStudy(svcOcRestful, ocBaseUrl):
+    """Study casebook fetched once and fanned out to subjects
+    """
+    casebook = svcOcRestful.getStudyCasebook(ocBaseUrl, "S_TEST")
+
+    return dict((subject.oid, casebook.subjectEvents(subject.oid)) for subject in casebook.subjectList())
+
+def main():
+    """Compare casebook requests per subject with whole study casebook
+    """
+    server = FakeOpenClinica(("127.0.0.1", 0), StudyCasebookHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    ocBaseUrl = "http://127.0.0.1:" + str(server.server_address[1]) + "/OpenClinica/"
+    svcOcRestful = OCRestfulService("user", "secret", OCSessionCache())
+
+    results = []
+    for name, fetch in [("casebook per subject", perSubject), ("whole study casebook", wholeStudy)]:
+        requests = server.requests
+        start = time.time()
+        events = fetch(svcOcRestful, ocBaseUrl)
+        elapsed = time.time() - start
+        print "%-22s %8.1f ms, %4d GET requests, %d subjects" % (name, elapsed * 1000, server.requests - requests, len(events))
+
+        results.append(dict((oid, [(e.eventDefinitionOID, e.studyEventRepeatKey, e.status, [(f.oid, f.version, f.status) for f in e.forms]) for e in subjectEvents]) for oid, subjectEvents in events.items()))
+
+    print "Same events and forms: " + str(results[0] == results[1])
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
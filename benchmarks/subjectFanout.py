@@ -0,0 +1,99 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import threading, time
+
+# Services
+from services.OCRestfulService import OCRestfulService
+from services.OCSessionCache import OCSessionCache
+
+# Utils
+from utils.BoundedExecutor import BoundedExecutor, Cancelled
+
+# Benchmarks
+from benchmarks.ocSessions import FakeOpenClinica
+from benchmarks.studyCasebook import StudyCasebookHandler
+
+# Subjects of study
+SUBJECTS = 120
+
+# Seconds OC REST answers casebook of one subject
+LATENCY = 0.02
+
+# Concurrent per-subject tasks of one request
+CONCURRENCY = [1, 4, 8]
+
+# Client disconnects after this number of seconds (cancellation run)
+DISCONNECTAFTER = 0.3
+
+class LatencyHandler(StudyCasebookHandler):
+    """OpenClinica stand-in answering subject casebooks with fixed latency
+    """
+
+    def casebook(self):
+        """Casebook JSON of requested subject after latency
+        """
+        time.sleep(LATENCY)
+        return StudyCasebookHandler.casebook(self)
+
+def subjectJson(svcOcRestful, ocBaseUrl):
+    """Per-subject work of dicomStudies: REST events of subject serialised to patient JSON
+    """
+    def enrich(subjectOid):
+        events = svcOcRestful.getStudyCasebookEvents([ocBaseUrl, "S_TEST", subjectOid])
+        return '{ "SubjectKey": "' + subjectOid + '", "Events": [' + ", ".join('"' + e.eventDefinitionOID + '"' for e in events) + '] }'
+
+    return enrich
+
+def main():
+    """Compare sequential and bounded concurrent per-subject enrichment, then cancel a request
+    """
+    server = FakeOpenClinica(("127.0.0.1", 0), LatencyHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    ocBaseUrl = "http://127.0.0.1:" + str(server.server_address[1]) + "/OpenClinica/"
+    svcOcRestful = OCRestfulService("user", "secret", OCSessionCache())
+    enrich = subjectJson(svcOcRestful, ocBaseUrl)
+    subjects = ["SS_%d" % s for s in range(SUBJECTS)]
+
+    # Login once, so that all runs use cached session
+    enrich(subjects[0])
+
+    executor = BoundedExecutor(16)
+    executor.start()
+
+    results = []
+    for concurrency in CONCURRENCY:
+        start = time.time()
+        patients = executor.map(enrich, subjects, concurrency)
+        elapsed = time.time() - start
+        print "concurrency %2d %8.1f ms, %d subjects" % (concurrency, elapsed * 1000, len(patients))
+
+        results.append(patients)
+
+    print "Same output in subject order: " + str(all(r == results[0] for r in results))
+
+    # Client disconnects during the request
+    requests = server.requests
+    disconnected = time.time() + DISCONNECTAFTER
+    start = time.time()
+    try:
+        executor.map(enrich, subjects, CONCURRENCY[-1], lambda: time.time() > disconnected)
+    except Cancelled, err:
+        print "cancelled after %.1f ms, %d of %d subjects requested (%s)" % ((time.time() - start) * 1000, server.requests - requests, SUBJECTS, err)
+
+    print executor.statistics()
+
+    executor.stop()
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
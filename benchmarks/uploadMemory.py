@@ -0,0 +1,83 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import os, sys, resource, shutil, subprocess, tempfile, time
+
+# Python serialisation/deserialisation
+import cPickle as pickle
+
+# Services
+from services.DicomService import DicomService
+
+# Size of uploaded file
+FILESIZE = 200 * 1024 * 1024
+
+def pickleUpload(body, workdir):
+    """Upload the way uploadDicomData handles it
+    """
+    length = os.path.getsize(body)
+    with open(body, "rb") as rfile:
+        data = rfile.read(length)
+    data = pickle.loads(data)
+    DicomService().saveFile(workdir, data)
+
+def streamUpload(body, workdir):
+    """Upload the way uploadDicomFile handles it
+    """
+    length = os.path.getsize(body)
+    with open(body, "rb") as rfile:
+        DicomService().saveStream(workdir, "file.dcm", rfile, length)
+
+def measure(mode, body, workdir):
+    """Run one upload in this process and print its time and peak memory
+    """
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.time()
+    if mode == "pickle":
+        pickleUpload(body, workdir)
+    else:
+        streamUpload(body, workdir)
+    elapsed = time.time() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print "%-8s %8.2f s   peak memory +%8.1f MB" % (mode, elapsed, (peak - baseline) / 1024.0)
+
+def main():
+    """Compare peak memory of pickled and streamed upload of one large file
+
+    Every mode runs in its own process (peak memory cannot be reset)
+    """
+    if len(sys.argv) == 4:
+        measure(sys.argv[1], sys.argv[2], sys.argv[3])
+        return
+
+    workdir = tempfile.mkdtemp()
+    try:
+        content = os.urandom(FILESIZE)
+
+        # Request bodies as sent by the clients
+        pickled = os.path.join(workdir, "pickled.body")
+        with open(pickled, "wb") as f:
+            f.write(pickle.dumps({ "file.dcm": content, "FINISH": True }, 2))
+
+        raw = os.path.join(workdir, "raw.body")
+        with open(raw, "wb") as f:
+            f.write(content)
+
+        del content
+
+        print "File size %d MB" % (FILESIZE / 1024 / 1024)
+        for mode, body in [("pickle", pickled), ("stream", raw)]:
+            subprocess.check_call([sys.executable, "-m", "benchmarks.uploadMemory", mode, body, workdir])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
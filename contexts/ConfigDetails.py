@@ -42,6 +42,14 @@ class ConfigDetails(object):
         self.rpbCorrectedDir = "corrected"
         self.rpbDownloadDir = "downloaded"
         self.rpbUnzipDir = "unzipped"
+        self.rpbKeepAliveTimeout = 30 # seconds of idle persistent connection
+        self.rpbKeepAliveMaxRequests = 1000 # requests per connection
+        self.rpbWorkers = 16 # request handling threads
+        self.rpbQueueSize = 64 # accepted connections waiting for worker
+        self.rpbRetryAfter = 5 # seconds reported with 503 when the queue is full
+        self.rpbProcesses = 1 # pre-forked server processes
+        self.rpbFanoutWorkers = 16 # threads for concurrent per-subject work of study requests (0 = sequential)
+        self.rpbFanoutConcurrency = 4 # concurrent per-subject tasks of one request
 
         # RPB DB
         self.rpbDbEnabled = True
@@ -51,6 +59,17 @@ class ConfigDetails(object):
         self.rpbDbHost = ""
         self.rpbDbPort = 5432
 
+        # Authentication cache
+        self.authCacheEnabled = True
+        self.authCacheTtl = 60 # seconds
+        self.authCacheSize = 1024 # accounts
+        self.ocSessionCacheEnabled = True
+        self.ocSessionTtl = 1200 # seconds unused OC login session is kept (below OC session timeout)
+        self.ocSessionCacheSize = 256 # logged in sessions
+        self.ocSoapClientCacheEnabled = True
+        self.ocSoapClientTtl = 600 # seconds idle SOAP client of user is kept
+        self.ocSoapClientCacheSize = 32 # idle SOAP clients
+
         # OC DB
         self.ocDbEnabled = True
         self.ocDbUsername = ""
@@ -59,12 +78,40 @@ class ConfigDetails(object):
         self.ocDbHost = ""
         self.ocDbPort = 5432
 
+        # Study metadata cache
+        self.metadataCacheEnabled = True
+        self.metadataCacheTtl = 300 # seconds metadata is used without refresh
+        self.metadataCacheMaxStale = 3600 # seconds older metadata is used while it is refreshed in background
+        self.metadataCacheSize = 64 # MB of raw ODM and parsed indexes
+        self.metadataCacheDir = "" # directory keeping ODM across restarts, empty keeps it in memory only
+
         # DICOM
         self.dicomCorrect = True
+        self.dicomCorrectWorkers = 2 # warm correction processes, 0 starts correction tool per file
+        self.dicomCorrectTimeout = 300 # seconds per file before correction process is killed
+        self.dicomCorrectMaxJobs = 500 # files corrected by one process before it is replaced
+        self.dicomCorrectFastPath = True # clean files skip correction tools
 
         # PACS
         self.dicomVerifyimport = True
         self.dicomVerifyimportRepeat = 25
+        self.dicomVerifyTimeout = 20 # seconds imported instance is waited for
+        self.dicomVerifyInterval = 0.25 # seconds between series queries while import progresses
+        self.dicomVerifyMaxInterval = 5 # seconds between series queries after backoff
+        self.dicomVerifyWorkers = 2 # threads querying PACS
+        self.dicomVerifySeries = False # one query per series, needs Conquest web mode rpbseriesinstances
+        self.pacsPoolSize = 10 # kept connections per PACS web server
+        self.pacsConnectTimeout = 5 # seconds
+        self.pacsReadTimeout = 60 # seconds
+        self.pacsRetries = 2 # retries of failed connection attempts
+
+        # Asynchronous ingestion jobs
+        self.ingestJobsEnabled = True
+        self.ingestJobDir = "jobs"
+        self.ingestCorrectWorkers = 2 # correction processes (CPU)
+        self.ingestStoreWorkers = 2 # concurrent C-STORE / PACS import folder copies
+        self.ingestVerifyWorkers = 4 # concurrent PACS verifications
+        self.ingestJobRetention = 86400 # seconds finished jobs can be polled
 
         # storescu
         self.storescuEnabled = True
@@ -72,6 +119,10 @@ class ConfigDetails(object):
         self.call = ""
         self.peer = ""
         self.port = 5678
+        self.storescuNative = True # pooled C-STORE associations instead of storescu process per call
+        self.storescuTimeout = 60 # seconds socket timeout of C-STORE association
+        self.storescuIdleTimeout = 30 # seconds idle association is kept open
+        self.storescuMaxAssociations = 4 # concurrent associations to PACS
 
         # PID
         self.rpbPartnerPrefixSeparator = "-" # Subjects PIDs are prefixed with partner site identificator with prefix separator
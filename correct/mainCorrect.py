@@ -7,7 +7,7 @@
 #### ##     ## ##         #######  ##     ##    ##     ######
 
 # Standard
-import sys, os, platform
+import sys, os, platform, shutil, subprocess, tempfile
 
 # Logging
 import logging
@@ -19,72 +19,151 @@ from PyQt4 import QtCore
 # DICOM
 import dicom
 
-class Correct(QtCore.QObject):
+# Philips Gemini PET/CT scanner (compressed files with private syntax UID)
+PHILIPSRLESYNTAX = "1.3.46.670589.33.1.4.1"
 
-    def __init__(self):
-        """Default Constructor
-        """
-        super(Correct, self).__init__()
+# Transfer syntaxes which dcmconv writes unchanged (implicit/explicit VR little endian, deflated, big endian)
+STANDARDSYNTAXES = ["1.2.840.10008.1.2", "1.2.840.10008.1.2.1", "1.2.840.10008.1.2.1.99", "1.2.840.10008.1.2.2"]
 
-        logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
+# File meta information elements dcmconv creates or fixes
+REQUIREDMETA = ["MediaStorageSOPClassUID", "MediaStorageSOPInstanceUID", "TransferSyntaxUID", "ImplementationClassUID"]
 
-        # Fist argument is filename
-        inputfile = str(QtCore.QCoreApplication.arguments()[1])
-        logger.debug("Input file for correction: " + inputfile)
+# Correction classes
+CLEAN = "clean"
+DCMCONV = "dcmconv"
+RLE2IMG = "rle2img"
 
-        outputfile = str(QtCore.QCoreApplication.arguments()[2])
-        logger.debug("Output corrected file: " + outputfile)
+# Exit codes of command line correction per correction class, 0 (tool which does not report class) is not used
+EXITCODES = { CLEAN: 10, DCMCONV: 11, RLE2IMG: 12 }
+EXITFAILED = 1
 
-        # Open DICOM file
-        ds = dicom.read_file(inputfile, force=True)
+# Command line option disabling fast path (clean files are converted with dcmconv as well)
+NOFASTPATHOPTION = "--nofastpath"
 
-        if "TransferSyntaxUID" in ds.file_meta:
-            # Philips Gemini PET/CT scanner (compressed files with private syntax UID)
-            if ds.file_meta.TransferSyntaxUID == "1.3.46.670589.33.1.4.1":
-                if platform.system() == "Linux":
+def classifyFile(ds):
+    """Correction which DICOM file (header) needs
 
-                    command = ""
-                    if os.path.isfile("./rle2img"):
-                        command = "./rle2img"
-                    elif os.path.isfile("./correct/rle2img"):
-                        command = "./correct/rle2img"
-                    else:
-                        logger.error("Cannot find rle2img utility.")
-                        
-                    if command != "":
-                        #logger.debug("Starting correction rle2img: " + command + " " + inputfile)
+    File is clean when it is DICOM Part 10 file with complete file meta information
+    which agrees with the dataset and has standard transfer syntax
+    """
+    fileMeta = getattr(ds, "file_meta", None)
+    if fileMeta is None:
+        return DCMCONV
+
+    if fileMeta.get("TransferSyntaxUID") == PHILIPSRLESYNTAX:
+        return RLE2IMG
+
+    if getattr(ds, "preamble", None) is None:
+        return DCMCONV
+
+    for keyword in REQUIREDMETA:
+        if not fileMeta.get(keyword):
+            return DCMCONV
+
+    if fileMeta.TransferSyntaxUID not in STANDARDSYNTAXES:
+        return DCMCONV
+
+    if fileMeta.MediaStorageSOPClassUID != ds.get("SOPClassUID") or fileMeta.MediaStorageSOPInstanceUID != ds.get("SOPInstanceUID"):
+        return DCMCONV
+
+    return CLEAN
+
+def correctFile(inputfile, outputfile, fastPath=True):
+    """Correct DICOM file (rle2img for Philips private syntax, dcmconv to fix common errors)
+
+    Callable from long-lived correction worker processes as well as from command line,
+    with fastPath clean files are linked (copied) to the output without external tools
+    Returns correction class when the corrected output was generated, otherwise None
+    """
+    logger = logging.getLogger(__name__)
+
+    logger.debug("Input file for correction: " + inputfile)
+    logger.debug("Output corrected file: " + outputfile)
+
+    # Open DICOM file
+    ds = dicom.read_file(inputfile, stop_before_pixels=True, force=True)
+
+    correction = classifyFile(ds)
+    if correction == CLEAN and not fastPath:
+        correction = DCMCONV
+
+    if correction == CLEAN:
+        logger.debug("File does not need correction: " + inputfile)
 
-                        # Output default is outrle.dcm
-                        process = QtCore.QProcess()
-                        process.start(command + " " + inputfile)
-                        # Wait until it is really finished
-                        process.waitForFinished(-1)
+        # Output is removed independently of input, link is enough
+        try:
+            os.link(inputfile, outputfile)
+        except OSError:
+            shutil.copyfile(inputfile, outputfile)
 
-                        #logger.debug("Correction rle2img finished.")
+        return correction
 
-                        if os.path.isfile("outrle.dcm"):
-                            inputfile = "outrle.dcm"
-                        else:
-                            logger.error("Correction rle2img did not generate the output: outrle.dcm")    
+    # Intermediate rle2img output is written into per-job scratch folder (concurrent jobs do not collide)
+    scratchDir = None
+    try:
+        if correction == RLE2IMG:
+            if platform.system() == "Linux":
+
+                command = ""
+                if os.path.isfile("./rle2img"):
+                    command = os.path.abspath("./rle2img")
+                elif os.path.isfile("./correct/rle2img"):
+                    command = os.path.abspath("./correct/rle2img")
+                else:
+                    logger.error("Cannot find rle2img utility.")
+
+                if command != "":
+                    scratchDir = tempfile.mkdtemp(prefix="rle2img-")
+                    rleOutput = os.path.join(scratchDir, "outrle.dcm")
+
+                    # Explicit output path (default is outrle.dcm in working directory)
+                    subprocess.call([command, os.path.abspath(inputfile), rleOutput], cwd=scratchDir)
+
+                    if os.path.isfile(rleOutput):
+                        inputfile = rleOutput
+                    else:
+                        logger.error("Correction rle2img did not generate the output: " + rleOutput)
 
         # Use DICOM offise toolkit convert to fix common errors
         if platform.system() == "Linux":
+            logger.debug("Starting correction dcmconv: " + inputfile + " " + outputfile)
 
-            command = "dcmconv \"" + inputfile + "\" \"" + outputfile + "\""
-            logger.debug("Starting correction dcmconv: " + command)
-
-            process = QtCore.QProcess()
-            process.start(command)
-            # Wait until it is really finished
-            process.waitForFinished(-1)
+            try:
+                subprocess.call(["dcmconv", inputfile, outputfile])
+            except OSError, err:
+                logger.error("Cannot start dcmconv: " + str(err))
 
             if not os.path.isfile(outputfile):
                 logger.error("Correction dcmconv did not generate the output: " + outputfile)
+                return None
+
+            return correction
+    finally:
+        # Cleanup intermediate file (if created)
+        if scratchDir is not None:
+            shutil.rmtree(scratchDir, ignore_errors=True)
+
+    return None
+
+class Correct(QtCore.QObject):
 
-            # Cleanup intermediate file (if created)
-            if inputfile == "outrle.dcm":
-                os.remove("outrle.dcm")
+    def __init__(self):
+        """Default Constructor
+        """
+        super(Correct, self).__init__()
+
+        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
+
+        arguments = [str(argument) for argument in QtCore.QCoreApplication.arguments()[1:]]
+        fastPath = NOFASTPATHOPTION not in arguments
+        if not fastPath:
+            arguments.remove(NOFASTPATHOPTION)
+
+        # Fist argument is input filename, second is output filename
+        inputfile = arguments[0]
+        outputfile = arguments[1]
+
+        self.correction = correctFile(inputfile, outputfile, fastPath)
 
 ##     ##    ###    #### ##    ##
 ###   ###   ## ##    ##  ###   ##
@@ -101,6 +180,9 @@ def main():
     correct = Correct()
     app.quit()
 
+    # Server counts corrected file in its correction class according to exit code
+    sys.exit(EXITCODES.get(correct.correction, EXITFAILED))
+
 if __name__ == '__main__':
     main()
     
\ No newline at end of file
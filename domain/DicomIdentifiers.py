@@ -0,0 +1,25 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Immutable record
+from collections import namedtuple
+
+class DicomIdentifiers(namedtuple("DicomIdentifiers", [
+        "patientId",
+        "studyInstanceUid",
+        "seriesInstanceUid",
+        "sopInstanceUid",
+        "sopClassUid",
+        "transferSyntaxUid",
+        "modality"
+    ])):
+    """Identifiers of DICOM instance read from its header
+
+    Missing attributes are None
+    """
+    __slots__ = ()
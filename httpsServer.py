@@ -7,7 +7,7 @@
 #### ##     ## ##         #######  ##     ##    ##     ######
 
 # Standard
-import sys, time, os, platform, shutil, socket
+import sys, time, os, platform, shutil, socket, select, signal, threading, base64, binascii, uuid
 
 # HTTP
 from BaseHTTPServer import HTTPServer
@@ -23,10 +23,6 @@ import json
 
 # Logging
 import logging
-import logging.config
-
-# Regular expressions
-import re
 
 from OpenSSL import SSL
 
@@ -36,8 +32,8 @@ import cPickle as pickle
 # PyQt
 from PyQt4 import QtCore
 
-# Zip
-import zipfile
+# Archives
+import tarfile, zipfile
 
 # Networking
 import requests
@@ -46,12 +42,24 @@ from requests.auth import HTTPDigestAuth
 
 # Utils
 from utils import first
+from utils.Router import Router
+from utils import LoggingBootstrap
+from utils.WorkerPool import WorkerPoolMixIn
+from utils.PreforkSupervisor import PreforkSupervisor
+from utils.RequestBody import RequestBody
+from utils.ProcessPool import ProcessPool
+from utils.Counters import Counters
+from utils.BoundedExecutor import BoundedExecutor, Cancelled
+from utils.TaskGraph import TaskGraph
 
 # Contexts
 from contexts.ConfigDetails import ConfigDetails
 
 # Services
 from services.DicomService import DicomService
+from services.DicomIngestionService import DicomIngestionService
+from services.DicomStoreService import DicomStoreService
+from services.ImportVerificationService import ImportVerificationService
 from services.ConquestService import ConquestService
 from services.AppConfigurationService import AppConfigurationService
 from services.DataPersistanceService import DataPersistanceService
@@ -59,8 +67,16 @@ from services.DataPersistanceService import DataPersistanceService
 # OC services
 from services.OCConnectInfo import OCConnectInfo
 from services.OCWebServices import OCWebServices
+from services.OCWebServicesRegistry import OCWebServicesRegistry
+from services.StudyMetadataCache import StudyMetadataCache
 from services.OCRestfulService import OCRestfulService
+from services.OCSessionCache import OCSessionCache
 from services.OdmFileDataService import OdmFileDataService
+from services.AuthenticationCache import AuthenticationCache
+from services.IngestionJobService import IngestionJobService
+
+# Correction
+from correct.mainCorrect import correctFile, CLEAN, DCMCONV, RLE2IMG
 
 # Domain
 from services.DataPersistanceService import PartnerSite
@@ -86,31 +102,55 @@ from services.DataPersistanceService import PullDataRequestSerializer
 ##    ## ##       ##    ##    ## ##   ##       ##    ##
  ######  ######## ##     ##    ###    ######## ##     ##
 
+def createSslSocket(addressFamily=socket.AF_INET, socketType=socket.SOCK_STREAM):
+    """Create server SSL socket
+    """
+    # Location of server.pem's => containing the server private key and the server certificate
+    fpem = "server.pem"
+
+    ctx = SSL.Context(SSL.SSLv23_METHOD)
+    ctx.use_privatekey_file(fpem)
+    ctx.use_certificate_file(fpem)
+
+    return SSL.Connection(ctx, socket.socket(addressFamily, socketType))
+
+def bindSslSocket(serverAddress):
+    """Bind listening SSL socket shared by pre-forked server processes
+    """
+    listeningSocket = createSslSocket()
+    listeningSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listeningSocket.bind(serverAddress)
+    listeningSocket.listen(SecureHTTPServer.request_queue_size)
+
+    # Processes compete for connections, the ones which lost must not block in accept
+    listeningSocket.setblocking(0)
+
+    return listeningSocket
+
 class SecureHTTPServer(HTTPServer):
     """SecureHTTPServer
     """
 
-    def __init__(self, serverAddress, HandlerClass):
+    def __init__(self, serverAddress, HandlerClass, listeningSocket=None):
         """SecureHttpServer constructor
 
         serverAddress is touple from ip address and port
         HandlerClass is server request handler
+        listeningSocket is already bound socket (pre-fork mode)
         """
         self.logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         BaseServer.__init__(self, serverAddress, HandlerClass)
 
-        # Location of server.pem's => containing the server private key and the server certificate
-        fpem = "server.pem"
-
-        ctx = SSL.Context(SSL.SSLv23_METHOD)
-        ctx.use_privatekey_file(fpem)
-        ctx.use_certificate_file(fpem)
-
-        self.socket = SSL.Connection(ctx, socket.socket(self.address_family, self.socket_type))
-        self.server_bind()
-        self.server_activate()
+        if listeningSocket is None:
+            self.socket = createSslSocket(self.address_family, self.socket_type)
+            self.server_bind()
+            self.server_activate()
+        else:
+            self.socket = listeningSocket
+            host, port = self.socket.getsockname()[:2]
+            self.server_name = socket.getfqdn(host)
+            self.server_port = port
 
         self.appConfig = AppConfigurationService()
 
@@ -122,6 +162,26 @@ class SecureHTTPServer(HTTPServer):
                 ConfigDetails().rpbIncoming = self.appConfig.get(section)["server"]
                 self.logger.info("RadPlanBio https server: " + ConfigDetails().rpbIncoming)
 
+            # Persistent connections
+            if self.appConfig.hasOption(section, "keepalivetimeout"):
+                ConfigDetails().rpbKeepAliveTimeout = int(self.appConfig.get(section)["keepalivetimeout"])
+            if self.appConfig.hasOption(section, "keepalivemaxrequests"):
+                ConfigDetails().rpbKeepAliveMaxRequests = int(self.appConfig.get(section)["keepalivemaxrequests"])
+
+            # Request handling worker pool
+            if self.appConfig.hasOption(section, "workers"):
+                ConfigDetails().rpbWorkers = int(self.appConfig.get(section)["workers"])
+            if self.appConfig.hasOption(section, "queuesize"):
+                ConfigDetails().rpbQueueSize = int(self.appConfig.get(section)["queuesize"])
+            if self.appConfig.hasOption(section, "retryafter"):
+                ConfigDetails().rpbRetryAfter = int(self.appConfig.get(section)["retryafter"])
+
+            # Concurrent per-subject work of study requests
+            if self.appConfig.hasOption(section, "fanoutworkers"):
+                ConfigDetails().rpbFanoutWorkers = int(self.appConfig.get(section)["fanoutworkers"])
+            if self.appConfig.hasOption(section, "fanoutconcurrency"):
+                ConfigDetails().rpbFanoutConcurrency = int(self.appConfig.get(section)["fanoutconcurrency"])
+
             # RadPlanBio DB connection
             section = "RadPlanBioDB"
             username = self.appConfig.get(section)["username"]
@@ -150,6 +210,14 @@ class SecureHTTPServer(HTTPServer):
             if self.appConfig.hasOption(section, "correct"):
                 ConfigDetails().dicomCorrect = self.appConfig.getboolean(section, "correct")
                 self.logger.info("DICOM data correction enabled.")
+            if self.appConfig.hasOption(section, "correctworkers"):
+                ConfigDetails().dicomCorrectWorkers = int(self.appConfig.get(section)["correctworkers"])
+            if self.appConfig.hasOption(section, "correcttimeout"):
+                ConfigDetails().dicomCorrectTimeout = int(self.appConfig.get(section)["correcttimeout"])
+            if self.appConfig.hasOption(section, "correctmaxjobs"):
+                ConfigDetails().dicomCorrectMaxJobs = int(self.appConfig.get(section)["correctmaxjobs"])
+            if self.appConfig.hasOption(section, "fastpath"):
+                ConfigDetails().dicomCorrectFastPath = self.appConfig.getboolean(section, "fastpath")
 
         # Connecting to PACS
         section = "PACS"
@@ -157,6 +225,24 @@ class SecureHTTPServer(HTTPServer):
             if self.appConfig.hasOption(section, "verifyimport"):
                 ConfigDetails().dicomVerifyimport = self.appConfig.getboolean(section, "verifyimport")
                 self.logger.info("PACS file import verification enabled.")
+            if self.appConfig.hasOption(section, "verifytimeout"):
+                ConfigDetails().dicomVerifyTimeout = float(self.appConfig.get(section)["verifytimeout"])
+            if self.appConfig.hasOption(section, "verifyinterval"):
+                ConfigDetails().dicomVerifyInterval = float(self.appConfig.get(section)["verifyinterval"])
+            if self.appConfig.hasOption(section, "verifymaxinterval"):
+                ConfigDetails().dicomVerifyMaxInterval = float(self.appConfig.get(section)["verifymaxinterval"])
+            if self.appConfig.hasOption(section, "verifyworkers"):
+                ConfigDetails().dicomVerifyWorkers = int(self.appConfig.get(section)["verifyworkers"])
+            if self.appConfig.hasOption(section, "verifyseries"):
+                ConfigDetails().dicomVerifySeries = self.appConfig.getboolean(section, "verifyseries")
+            if self.appConfig.hasOption(section, "poolsize"):
+                ConfigDetails().pacsPoolSize = int(self.appConfig.get(section)["poolsize"])
+            if self.appConfig.hasOption(section, "connecttimeout"):
+                ConfigDetails().pacsConnectTimeout = float(self.appConfig.get(section)["connecttimeout"])
+            if self.appConfig.hasOption(section, "readtimeout"):
+                ConfigDetails().pacsReadTimeout = float(self.appConfig.get(section)["readtimeout"])
+            if self.appConfig.hasOption(section, "retries"):
+                ConfigDetails().pacsRetries = int(self.appConfig.get(section)["retries"])
 
         # Import with DICOM store feature
         section = "storescu"
@@ -172,6 +258,81 @@ class SecureHTTPServer(HTTPServer):
                 ConfigDetails().peer = self.appConfig.get(section)["peer"]
             if self.appConfig.hasOption(section, "port"):
                 ConfigDetails().port = int(self.appConfig.get(section)["port"])
+            if self.appConfig.hasOption(section, "native"):
+                ConfigDetails().storescuNative = self.appConfig.getboolean(section, "native")
+            if self.appConfig.hasOption(section, "timeout"):
+                ConfigDetails().storescuTimeout = int(self.appConfig.get(section)["timeout"])
+            if self.appConfig.hasOption(section, "idletimeout"):
+                ConfigDetails().storescuIdleTimeout = int(self.appConfig.get(section)["idletimeout"])
+            if self.appConfig.hasOption(section, "maxassociations"):
+                ConfigDetails().storescuMaxAssociations = int(self.appConfig.get(section)["maxassociations"])
+
+        # Cache of authenticated request credentials
+        section = "Authentication"
+        if self.appConfig.hasSection(section):
+            if self.appConfig.hasOption(section, "cache"):
+                ConfigDetails().authCacheEnabled = self.appConfig.getboolean(section, "cache")
+            if self.appConfig.hasOption(section, "cachettl"):
+                ConfigDetails().authCacheTtl = int(self.appConfig.get(section)["cachettl"])
+            if self.appConfig.hasOption(section, "cachesize"):
+                ConfigDetails().authCacheSize = int(self.appConfig.get(section)["cachesize"])
+            if self.appConfig.hasOption(section, "ocsessioncache"):
+                ConfigDetails().ocSessionCacheEnabled = self.appConfig.getboolean(section, "ocsessioncache")
+            if self.appConfig.hasOption(section, "ocsessionttl"):
+                ConfigDetails().ocSessionTtl = int(self.appConfig.get(section)["ocsessionttl"])
+            if self.appConfig.hasOption(section, "ocsessioncachesize"):
+                ConfigDetails().ocSessionCacheSize = int(self.appConfig.get(section)["ocsessioncachesize"])
+            if self.appConfig.hasOption(section, "soapclientcache"):
+                ConfigDetails().ocSoapClientCacheEnabled = self.appConfig.getboolean(section, "soapclientcache")
+            if self.appConfig.hasOption(section, "soapclientttl"):
+                ConfigDetails().ocSoapClientTtl = int(self.appConfig.get(section)["soapclientttl"])
+            if self.appConfig.hasOption(section, "soapclientcachesize"):
+                ConfigDetails().ocSoapClientCacheSize = int(self.appConfig.get(section)["soapclientcachesize"])
+
+        self.authCache = None
+        if ConfigDetails().authCacheEnabled:
+            self.authCache = AuthenticationCache(ConfigDetails().authCacheTtl, ConfigDetails().authCacheSize)
+            self.logger.info("Authentication cache enabled, TTL: " + str(ConfigDetails().authCacheTtl) + "s, size: " + str(ConfigDetails().authCacheSize))
+
+        # Logged in OpenClinica REST sessions
+        self.ocSessions = None
+        if ConfigDetails().ocSessionCacheEnabled:
+            self.ocSessions = OCSessionCache(ConfigDetails().ocSessionTtl, ConfigDetails().ocSessionCacheSize)
+
+        # OpenClinica SOAP clients of users reused between requests
+        self.ocWebServices = None
+        if ConfigDetails().ocSoapClientCacheEnabled:
+            self.ocWebServices = OCWebServicesRegistry(ConfigDetails().ocSoapClientTtl, ConfigDetails().ocSoapClientCacheSize)
+
+        # Asynchronous ingestion of received DICOM files
+        section = "Ingestion"
+        if self.appConfig.hasSection(section):
+            if self.appConfig.hasOption(section, "enabled"):
+                ConfigDetails().ingestJobsEnabled = self.appConfig.getboolean(section, "enabled")
+            if self.appConfig.hasOption(section, "jobdir"):
+                ConfigDetails().ingestJobDir = self.appConfig.get(section)["jobdir"]
+            if self.appConfig.hasOption(section, "correctworkers"):
+                ConfigDetails().ingestCorrectWorkers = int(self.appConfig.get(section)["correctworkers"])
+            if self.appConfig.hasOption(section, "storeworkers"):
+                ConfigDetails().ingestStoreWorkers = int(self.appConfig.get(section)["storeworkers"])
+            if self.appConfig.hasOption(section, "verifyworkers"):
+                ConfigDetails().ingestVerifyWorkers = int(self.appConfig.get(section)["verifyworkers"])
+            if self.appConfig.hasOption(section, "jobretention"):
+                ConfigDetails().ingestJobRetention = int(self.appConfig.get(section)["jobretention"])
+
+        # Cache of study ODM metadata
+        section = "StudyMetadata"
+        if self.appConfig.hasSection(section):
+            if self.appConfig.hasOption(section, "enabled"):
+                ConfigDetails().metadataCacheEnabled = self.appConfig.getboolean(section, "enabled")
+            if self.appConfig.hasOption(section, "ttl"):
+                ConfigDetails().metadataCacheTtl = int(self.appConfig.get(section)["ttl"])
+            if self.appConfig.hasOption(section, "maxstale"):
+                ConfigDetails().metadataCacheMaxStale = int(self.appConfig.get(section)["maxstale"])
+            if self.appConfig.hasOption(section, "maxsize"):
+                ConfigDetails().metadataCacheSize = int(self.appConfig.get(section)["maxsize"])
+            if self.appConfig.hasOption(section, "dir"):
+                ConfigDetails().metadataCacheDir = self.appConfig.get(section)["dir"]
 
         # Init services
         self._svcPacs = ConquestService()
@@ -179,11 +340,83 @@ class SecureHTTPServer(HTTPServer):
         self._svcOcRestfulService = None
         self._svcOdmMetaData = OdmFileDataService()
 
+        # Warm DICOM correction processes (fork is not available on Windows)
+        self.correctionPool = None
+        if ConfigDetails().dicomCorrect and ConfigDetails().dicomCorrectWorkers > 0 and hasattr(os, "fork"):
+            self.correctionPool = ProcessPool(
+                correctFile,
+                ConfigDetails().dicomCorrectWorkers,
+                ConfigDetails().dicomCorrectTimeout,
+                ConfigDetails().dicomCorrectMaxJobs,
+                "Correction"
+            )
+            self.correctionPool.start()
+
+        # Corrected files per correction class (how much correction work is skipped)
+        self.correctionCounters = Counters([CLEAN, DCMCONV, RLE2IMG, "failed"])
+
+        # Long-lived C-STORE associations shared by request handlers
+        self.storePool = None
+        if ConfigDetails().storescuEnabled and ConfigDetails().storescuNative:
+            self.storePool = DicomStoreService(
+                ConfigDetails().storescuTimeout,
+                ConfigDetails().storescuIdleTimeout,
+                ConfigDetails().storescuMaxAssociations
+            )
+
+        # Verification of PACS import shared by request handlers (batched per series)
+        self.importVerifier = None
+        if ConfigDetails().dicomVerifyimport:
+            self.importVerifier = ImportVerificationService(
+                self._svcPacs,
+                ConfigDetails().dicomVerifyTimeout,
+                ConfigDetails().dicomVerifyInterval,
+                ConfigDetails().dicomVerifyMaxInterval,
+                ConfigDetails().dicomVerifyWorkers,
+                ConfigDetails().dicomVerifySeries
+            )
+            self.importVerifier.start()
+
+        # Threads shared by request handlers for concurrent per-subject work (bounded per request)
+        self.fanout = BoundedExecutor(ConfigDetails().rpbFanoutWorkers, "Fanout")
+        self.fanout.start()
+
+        # Study ODM metadata shared by request handlers (refreshed in background by fanout threads)
+        self.studyMetadata = None
+        if ConfigDetails().metadataCacheEnabled:
+            self.studyMetadata = StudyMetadataCache(
+                ConfigDetails().metadataCacheTtl,
+                ConfigDetails().metadataCacheMaxStale,
+                ConfigDetails().metadataCacheSize * 1024 * 1024,
+                ConfigDetails().metadataCacheDir or None,
+                self.fanout,
+                self._svcOdmMetaData.indexMetadata
+            )
+
+        self.ingestionJobs = None
+        if ConfigDetails().ingestJobsEnabled:
+            self.ingestionJobs = IngestionJobService(
+                DicomIngestionService(self._svcPacs, ConfigDetails().rpbTempDir, ConfigDetails().rpbCorrectedDir, self.correctionPool, self.correctionCounters, self.storePool, self.importVerifier),
+                ConfigDetails().rpbTempDir,
+                ConfigDetails().rpbCorrectedDir,
+                ConfigDetails().ingestJobDir,
+                ConfigDetails().ingestCorrectWorkers,
+                ConfigDetails().ingestStoreWorkers,
+                ConfigDetails().ingestVerifyWorkers,
+                ConfigDetails().ingestJobRetention
+            )
+            self.ingestionJobs.start()
+
     def shutdown_request(self, request):
         """Server shutdown request
         """
         request.shutdown()
 
+    def isSaturated(self):
+        """Requests are waiting for free request handler
+        """
+        return False
+
 class ThreadingHTTPSServer(ThreadingMixIn, SecureHTTPServer):
     """Threading HTTPSServer
 
@@ -191,32 +424,51 @@ class ThreadingHTTPSServer(ThreadingMixIn, SecureHTTPServer):
     """
     pass
 
+class PooledHTTPSServer(WorkerPoolMixIn, SecureHTTPServer):
+    """HTTPSServer with fixed pool of request handling threads
+
+    This class is derived from WorkerPoolMixIn and SecureHTTPServer
+    """
+
+    def __init__(self, serverAddress, HandlerClass, listeningSocket=None):
+        """PooledHTTPSServer constructor
+        """
+        SecureHTTPServer.__init__(self, serverAddress, HandlerClass, listeningSocket)
+
+        self.startWorkers(ConfigDetails().rpbWorkers, ConfigDetails().rpbQueueSize, ConfigDetails().rpbRetryAfter)
+
 class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
     """Main server request handler class
     """
 
+    # Persistent connections (keep-alive), every response has to report its Content-Length
+    protocol_version = "HTTP/1.1"
+
     def setup(self):
         """ Setup the HTTP request handler, every time the request is made
 
         POST and GET methods
         """
         self.logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         # Configuration
         self.appConfig = AppConfigurationService()
 
         self.connection = self.request
+
+        # Headers and body are written separately, do not delay small responses on persistent connection
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
         self.rfile = socket._fileobject(self.request, "rb", self.rbufsize)
         self.wfile = socket._fileobject(self.request, "wb", self.wbufsize)
 
         # Link services from http server
         self.svcDb = self.server.svcDb
+        self.authCache = self.server.authCache
+        self.ingestionJobs = self.server.ingestionJobs
 
-        # Connectin to PACS
-        if self.appConfig.hasSection("PACS"):
-            if self.appConfig.getboolean("PACS", "verifyimport"):
-                self._svcPacs = self.server._svcPacs
+        # Connectin to PACS (shared keep-alive connections)
+        self._svcPacs = self.server._svcPacs
 
         self._svcOcWebServices = self.server._svcOcWebServices
         self._svcOcRestfulService = self.server._svcOcRestfulService
@@ -226,6 +478,95 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
         self._tempDir = "temp"
         self._correctedDir = "corrected"
 
+        # Received DICOM files pipeline
+        self._svcIngestion = DicomIngestionService(self.server._svcPacs, self._tempDir, self._correctedDir, self.server.correctionPool, self.server.correctionCounters, self.server.storePool, self.server.importVerifier)
+
+        # Persistent connection
+        self.requestCount = 0
+        self.responseSent = False
+
+    # Persistent connections
+
+    def handle(self):
+        """Handle requests of persistent connection until it is closed
+        """
+        try:
+            SimpleHTTPRequestHandler.handle(self)
+        except (SSL.ZeroReturnError, SSL.SysCallError), err:
+            # Client closed the connection between or during requests
+            self.logger.debug("Connection closed by client: " + str(err))
+
+    def handle_one_request(self):
+        """Handle next request of persistent connection, close idle connection
+        """
+        if self.requestCount > 0 and not self.waitForRequest(ConfigDetails().rpbKeepAliveTimeout):
+            self.logger.debug("Idle connection closed.")
+            self.close_connection = 1
+            return
+
+        self.requestCount += 1
+        self.responseSent = False
+
+        SimpleHTTPRequestHandler.handle_one_request(self)
+
+    def waitForRequest(self, timeout):
+        """Wait until next request data are available
+
+        pyOpenSSL connection does not support socket timeouts, so idle time is checked before reading
+        """
+        # Data already received and buffered (decrypted in SSL or in request file object)
+        if self.request.pending() > 0 or self.rfile._rbuf.tell() > 0:
+            return True
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            readable, writable, exceptional = select.select([self.request], [], [], min(deadline - time.time(), 1))
+            if len(readable) > 0:
+                return True
+
+            # Idle connection releases its handler thread for waiting requests
+            if self.server.isSaturated():
+                return False
+
+        return False
+
+    def clientDisconnected(self):
+        """Client closed the connection while its request is processed
+
+        Readable connection is peeked on its raw descriptor (pyOpenSSL 0.14 ignores MSG_PEEK and
+        would consume a byte of pipelined next request), end of stream means the client is gone
+        """
+        try:
+            if self.request.pending() > 0:
+                return False
+
+            readable, writable, exceptional = select.select([self.request], [], [], 0)
+            if len(readable) == 0:
+                return False
+
+            raw = socket.fromfd(self.request.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                return len(raw.recv(1, socket.MSG_PEEK)) == 0
+            finally:
+                # Duplicated descriptor only, the connection stays open
+                raw.close()
+        except (SSL.Error, socket.error, select.error):
+            return True
+
+    def send_response(self, code, message=None):
+        """Send response status line and mark the request as answered
+        """
+        SimpleHTTPRequestHandler.send_response(self, code, message)
+        self.responseSent = True
+
+    def end_headers(self):
+        """Finish response headers, announce close when the connection reached its request limit
+        """
+        if self.requestCount >= ConfigDetails().rpbKeepAliveMaxRequests and not self.close_connection:
+            self.send_header("Connection", "close")
+
+        SimpleHTTPRequestHandler.end_headers(self)
+
     # Helper methods
 
     def getPartnerSiteIdentifier(self, patientPseudonym):
@@ -247,24 +588,45 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
             ConfigDetails().rpbPartnerPrefixSeparator
         )
 
-########   #######   ######  ########
-##     ## ##     ## ##    ##    ##
-##     ## ##     ## ##          ##
-########  ##     ##  ######     ##
-##        ##     ##       ##    ##
-##        ##     ## ##    ##    ##
-##         #######   ######     ##
+    # Request dispatch
 
-    def do_POST(self):
-        """Insert the data posted into the server (DICOM, JSON)
+    def routePath(self):
+        """Request path starting from the API root
+
+        Public URLs can be prefixed with serverie application (request routing)
+        e.g. https://radplanbio.uniklinikum-dresden.de/serverieDD/api/v1/...
         """
-        # Authentication data
-        username = self.headers.getheader("Username")
-        password = self.headers.getheader("Password")
-        length = int(self.headers.getheader("content-length"))
+        index = self.path.find("/api/")
+        if index != -1:
+            return self.path[index:]
+
+        return self.path
+
+    def authenticate(self, username, password):
+        """Authenticate user from request headers
+
+        Returns DefaultAccount of authenticated user or None
+        """
+        # Recently verified credentials
+        if self.authCache is not None:
+            account = self.authCache.get(username, password)
+            if account is not None:
+                return account
+
+        account = self.verifyCredentials(username, password)
 
+        if account is not None and self.authCache is not None:
+            session = self.svcDb.Session()
+            self.authCache.put(username, password, self.svcDb.detachDefaultAccount(session, account))
+
+        return account
+
+    def verifyCredentials(self, username, password):
+        """Verify credentials against portal password and OC password hash
+
+        Returns DefaultAccount of authenticated user or None
+        """
         # Query the DB to authenticate the user
-        authenticated = False
         session = self.svcDb.Session()
         account = self.svcDb.getDefaultAccountByUsername(session, username)
 
@@ -272,7 +634,7 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
         if account is not None:
             # First try portal password
             if account.password == password:
-                authenticated = True
+                return account
             # Than open clinica password
             else:
                 self.logger.info("Authentication: trying OC user")
@@ -283,11 +645,68 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
                     ocpassword = self.svcDb.getAccountPasswordHash(ocsession, username)
 
                 if ocpassword != "" and ocpassword == password:
-                    authenticated = True
+                    self.logger.info("Authentication: oc authentication success")
+                    return account
+
+        return None
+
+    def dispatch(self, method):
+        """Authenticate the request and pass it to the handler registered in route table
+        """
+        # Authentication data
+        username = self.headers.getheader("Username")
+        password = self.headers.getheader("Password")
+
+        account = self.authenticate(username, password)
+
+        self.logger.info(method + " method: " + self.path)
+
+        if account is not None:
+            handler, params = self.router.match(method, self.routePath())
+            if handler is not None:
+                handler(self, account, **params)
+
+                # Handler did not report anything (e.g. record does not exist)
+                if not self.responseSent:
+                    self.sendEmptyResponse(404, closeConnection=(method == "POST"))
+            else:
+                self.logger.info(method + " - page not found.")
+                self.sendEmptyResponse(404, closeConnection=(method == "POST"))
+        else:
+            self.logger.info(method + " - not authenticated.")
+            self.sendEmptyResponse(403, closeConnection=(method == "POST"))
+
+        self.svcDb.Session.remove()
+
+    def sendEmptyResponse(self, code, message=None, closeConnection=False):
+        """Send response without body
+
+        Connection has to be closed when request body was not read (e.g. rejected POST)
+        """
+        self.send_response(code, message)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "0")
+        if closeConnection:
+            self.send_header("Connection", "close")
+        self.end_headers()
 
-        self.logger.info("POST method: " + self.path)
+    def do_POST(self):
+        """Insert the data posted into the server (DICOM, JSON)
+        """
+        self.dispatch("POST")
+
+    def do_GET(self):
+        """Query local RadPlanBio DB and report the results in JSON format
+        """
+        self.dispatch("GET")
 
-        if authenticated:
+########   #######   ######  ########
+##     ## ##     ## ##    ##    ##
+##     ## ##     ## ##          ##
+########  ##     ##  ######     ##
+##        ##     ##       ##    ##
+##        ##     ## ##    ##    ##
+##         #######   ######     ##
 
 ########  ####  ######   #######  ##     ##
 ##     ##  ##  ##    ## ##     ## ###   ###
@@ -297,196 +716,327 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
 ##     ##  ##  ##    ## ##     ## ##     ##
 ########  ####  ######   #######  ##     ##
 
-            if None != re.search("/api/v1/uploadDicomData/", self.path):
-                
-                # self.rfile contains the body sent from the client
-                data = self.rfile.read(length)
-                self.logger.info("POST-CHECK:" + str(len(data)) + str(length))
-
-                # if length from data and length from headers do not agree: break
-                if len(data) != length:
-                    self.logger.error("Received DICOM file data length does not agree.")
-
-                    result = pickle.dumps("datalength")
-                    self.send_response(200)
-                    self.send_header("Content-Language", "English")
-                    self.send_header("Content-Type", "application/octet-stream")
-                    self.send_header("Content-Length", str(len(result)))
-                    self.end_headers()
-                    self.wfile.write(result)
-
-                    return None
-
-                # Load received data with pickle (as it was saved with pickle on the client)
-                data = pickle.loads(data)
-
-                # Extract filename
-                dicomFileName = None
-                for filename in data:
-                    if filename != "FINISH":
-                        dicomFileName = filename
-
-                svcDicom = DicomService()
-                # Temp save for DICOM correction utility
-                resultTempSave = svcDicom.saveFile(self._tempDir, data)
-
-                patientId = svcDicom.getPatientID(self._tempDir + os.sep + dicomFileName)
-                studyUid = svcDicom.getStudyInstanceUID(self._tempDir + os.sep + dicomFileName)
-                seriesUid = svcDicom.getSeriesInstanceUID(self._tempDir + os.sep + dicomFileName)
-                sopUid = svcDicom.getSopInstanceUID(self._tempDir + os.sep + dicomFileName)
-
-                saveSucessfull = False
-                result = None
-                # Apply DICOM correction before importing to PACS
-                if ConfigDetails().dicomCorrect:
-                    
-                    # Start DICOM correction (RadPlanBio-correct)
-                    process = QtCore.QProcess()
-
-                    # Input (from temp) output (to corrected)
-                    args = "\"" + self._tempDir + os.sep + dicomFileName + "\" \"" + self._correctedDir  + os.sep + dicomFileName + "\""
-                    #self.logger.info("Starting DICOM correction tool (with args): " + args)
-
-                    if platform.system() == "Linux":
-                        if os.path.isfile("./correct/RadPlanBio-correct"):
-                            process.start("./correct/RadPlanBio-correct " + args)
-                        elif os.path.isfile("./correct/mainCorrect.py"):
-                            process.start("python ./correct/mainCorrect.py " + args)
-                    elif os.path.isfile("./correct/mainCorrect.py"):
-                        process.start("python ./correct/mainCorrect.py " + args)
-
-                    # Wait until it is really finished
-                    process.waitForFinished(-1)
-                    #self.logger.info("DICOM correction tool finished, back to main server.")
-
-                    # DICOM C-STORE
-                    if ConfigDetails().storescuEnabled:
-                        # Sent to PACS
-                        saveSucessfull = svcDicom.storescuFile(ConfigDetails().aetitle, ConfigDetails().call, ConfigDetails().peer, ConfigDetails().port, self._correctedDir  + os.sep + dicomFileName)                        
-                        result = pickle.dumps(saveSucessfull)
-
-                    # Copy to PACS import folder
-                    else:
-                        saveSucessfull = svcDicom.importFile(self._correctedDir  + os.sep + dicomFileName, ConfigDetails().rpbIncoming + os.sep + dicomFileName)
-                        #self.logger.info("File copied to PACS import folder (after correct) with result: " + str(resultSave))
-
-                        # Remove the corrected file after import
-                        if saveSucessfull:
-                            os.remove(self._correctedDir + os.sep + dicomFileName)
-
-                        result = pickle.dumps(saveSucessfull)
-                # Direct import to PACS - without correction
-                else:
-                    # DICOM C-STORE
-                    if ConfigDetails().storescuEnabled:
-                        saveSucessfull = svcDicom.storescuFile(ConfigDetails().aetitle, ConfigDetails().call, ConfigDetails().peer, ConfigDetails().port, self._tempDir + os.sep + dicomFileName)
-                        result = pickle.dumps(saveSucessfull)
-                    # Copy to PACS import folder
-                    else:
-                        saveSucessfull = svcDicom.importFile(self._tempDir + os.sep + dicomFileName, ConfigDetails().rpbIncoming + os.sep + dicomFileName)
-                        #self.logger.info("File copied to PACS import folder (directly without correct) with result: " + str(resultSave))
-                        result = pickle.dumps(saveSucessfull)
-
-                if saveSucessfull:
-                    # Remove the temp file
-                    os.remove(self._tempDir + os.sep + dicomFileName)
-
-                    # Verify the existence of file withing PACS
-                    if ConfigDetails().dicomVerifyimport:
-                        i = 0
-                        fileImportSucess = False
-                        for i in range(0, ConfigDetails().dicomVerifyimportRepeat):
-                            fileImportSucess = self._svcPacs.fileExists(account.partnersite.pacs.pacsbaseurl, patientId, studyUid, seriesUid, sopUid)
-                            self.logger.info("[" + str(i) + "] Verify file import into PACS with result: " + str(fileImportSucess))
-                            if fileImportSucess: 
-                                break
-
-                        if fileImportSucess:
-                            # Remove from corrected after sucessfull import
-                            if ConfigDetails().dicomCorrect:                                
-                                os.remove(self._correctedDir + os.sep + dicomFileName)
-
-                            result = pickle.dumps(fileImportSucess)
-                        else:
-                            # In case of DICOM C-STORE
-                            if ConfigDetails().storescuEnabled:
-                                # Sent to PACS with second set of options
-                                saveSucessfull = svcDicom.storescuFile(ConfigDetails().aetitle, ConfigDetails().call, ConfigDetails().peer, ConfigDetails().port, self._correctedDir  + os.sep + dicomFileName, False, True)
-
-                                if saveSucessfull:
-                                    if ConfigDetails().dicomVerifyimport:
-                                        i = 0
-                                        fileImportSucess = False
-                                        for i in range(0, ConfigDetails().dicomVerifyimportRepeat):
-                                            fileImportSucess = self._svcPacs.fileExists(account.partnersite.pacs.pacsbaseurl, patientId, studyUid, seriesUid, sopUid)
-                                            self.logger.info("[" + str(i) + "] Verify file import into PACS with result: " + str(fileImportSucess))
-                                            if fileImportSucess: 
-                                                break
-
-                                        if fileImportSucess:
-                                            # Remove from corrected after sucessfull import
-                                            if ConfigDetails().dicomCorrect:                                
-                                                os.remove(self._correctedDir + os.sep + dicomFileName)
-
-                                            result = pickle.dumps(fileImportSucess)
-                                        else:
-                                            result = pickle.dumps("PACS")
-                                            self.logger.error("DICOM file was not imported.")
-
-                    else:
-                        # Remove from corrected if no verification
-                        if ConfigDetails().dicomCorrect:
-                            os.remove(self._correctedDir + os.sep + dicomFileName)                            
+    def uploadDicomData(self, account):
+        """Receive pickled DICOM file and import it into PACS
+        """
+        length = int(self.headers.getheader("content-length"))
 
-                self.send_response(200)
-                self.send_header("Content-Language", "English")
-                self.send_header("Content-Type", "application/octet-stream")
-                self.send_header("Content-Length", str(len(result)))
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/addPullDataRequest/", self.path):
-                ctype, pdict = cgi.parse_header(self.headers.getheader('content-type'))
-                if ctype == "application/json":
-                    length = int(self.headers.getheader("content-length"))
+        # self.rfile contains the body sent from the client
+        data = self.rfile.read(length)
+        self.logger.info("POST-CHECK:" + str(len(data)) + str(length))
 
-                    #data = cgi.parse_qs(self.rfile.read(length), keep_blank_values=1)
+        # if length from data and length from headers do not agree: break
+        if len(data) != length:
+            self.logger.error("Received DICOM file data length does not agree.")
 
-                    dic = json.loads(self.rfile.read(length))
-                    serializer = PullDataRequestSerializer()
-                    obj = serializer.deserialize(dic)
+            result = pickle.dumps("datalength")
+            self.send_response(200)
+            self.send_header("Content-Language", "English")
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(result)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(result)
 
-                    # create pullDataRequest object in DB
-                    session = self.svcDb.Session()
+            return None
 
-                    ourSite = self.svcDb.getPartnerSiteByName(session, obj.sentToSite.sitename)
-                    fromSite = self.svcDb.getPartnerSiteByName(session, obj.sentFromSite.sitename)
+        # Load received data with pickle (as it was saved with pickle on the client)
+        data = pickle.loads(data)
 
-                    pullDataRequest = PullDataRequest()
-                    pullDataRequest.subject = obj.subject
-                    pullDataRequest.message = obj.message
-                    pullDataRequest.created = obj.created
-                    pullDataRequest.senttositeid = ourSite.siteid
-                    pullDataRequest.sentfromsiteid = fromSite.siteid
+        # Extract filename
+        dicomFileName = None
+        for filename in data:
+            if filename != "FINISH":
+                dicomFileName = filename
 
-                    session.add(pullDataRequest)
-                    session.commit()
+        svcDicom = DicomService()
+        # Temp save for DICOM correction utility
+        resultTempSave = svcDicom.saveFile(self._tempDir, data)
 
-                self.send_response(200)
-                self.end_headers()
+        # Correct, import into PACS and verify
+        result = pickle.dumps(self._svcIngestion.ingest(dicomFileName, account.partnersite.pacs.pacsbaseurl))
+
+        self.send_response(200)
+        self.send_header("Content-Language", "English")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def uploadDicomFile(self, account, filename):
+        """Receive raw DICOM file (request body streamed to disk) and import it into PACS
+
+        Optional Content-MD5 header (base64 MD5 of the body) is verified before the import
+        """
+        received = self.receiveDicomFile(os.path.basename(filename))
+        if received is None:
+            return
+
+        dicomFileName, size, md5 = received
+
+        # Correct, import into PACS and verify
+        imported = self._svcIngestion.ingest(dicomFileName, account.partnersite.pacs.pacsbaseurl)
+
+        dic = { "filename": dicomFileName, "size": size, "md5": md5, "result": imported }
+        result = json.dumps(dic)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def receiveDicomFile(self, dicomFileName):
+        """Stream raw DICOM file from request body into temp folder
+
+        Returns tuple (dicomFileName, size, md5) or None when the error response was sent
+        """
+        ctype, pdict = cgi.parse_header(self.headers.getheader("content-type", ""))
+        if ctype not in ["application/dicom", "application/octet-stream"]:
+            self.sendEmptyResponse(415, closeConnection=True)
+            return None
+
+        if self.headers.getheader("content-length") is None:
+            self.sendEmptyResponse(411, closeConnection=True)
+            return None
+
+        # Client decides the file name, it must not point outside of temp folder
+        if dicomFileName in ["", ".", ".."]:
+            self.sendEmptyResponse(400, closeConnection=True)
+            return None
+
+        try:
+            length = int(self.headers.getheader("content-length"))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.sendEmptyResponse(400, "Bad Request: invalid Content-Length", closeConnection=True)
+            return None
+
+        svcDicom = DicomService()
+        try:
+            size, md5 = svcDicom.saveStream(self._tempDir, dicomFileName, self.rfile, length)
+        except IOError, err:
+            self.logger.error(str(err))
+            self.sendEmptyResponse(400, "Bad Request: incomplete DICOM file data", closeConnection=True)
+            return None
+
+        contentMd5 = self.headers.getheader("content-md5")
+        if contentMd5 is not None:
+            try:
+                expectedMd5 = base64.b64decode(contentMd5).encode("hex")
+            except (TypeError, binascii.Error):
+                self.logger.error("Malformed Content-MD5 of received DICOM file: " + dicomFileName)
+                os.remove(self._tempDir + os.sep + dicomFileName)
+                self.sendEmptyResponse(400, "Bad Request: malformed Content-MD5")
+                return None
+
+            if expectedMd5 != md5:
+                self.logger.error("Received DICOM file checksum does not agree: " + dicomFileName)
+                os.remove(self._tempDir + os.sep + dicomFileName)
+                self.sendEmptyResponse(400, "Bad Request: checksum does not agree")
+                return None
+
+        return dicomFileName, size, md5
+
+    def submitIngestJob(self, account, filename):
+        """Receive raw DICOM file and queue it for asynchronous import into PACS
+
+        Responds with 202 and job which can be polled at its Location
+        """
+        if self.ingestionJobs is None:
+            self.sendEmptyResponse(503, closeConnection=True)
+            return
+
+        # Received files of different jobs cannot collide
+        jobId = uuid.uuid4().hex
+
+        received = self.receiveDicomFile(jobId + "_" + os.path.basename(filename))
+        if received is None:
+            return
+
+        dicomFileName, size, md5 = received
+
+        job = self.ingestionJobs.submit(jobId, dicomFileName, account.partnersite.pacs.pacsbaseurl, account.username, size, md5)
+        result = json.dumps(job)
+
+        self.send_response(202)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.send_header("Location", "/api/v1/ingestJobs/" + jobId)
+        self.end_headers()
+        self.wfile.write(result)
+
+    def getIngestJob(self, account, jobId):
+        """Report progress of asynchronous import job
+        """
+        if self.ingestionJobs is None:
+            return
+
+        job = self.ingestionJobs.get(jobId, account.username)
+        if job is not None:
+            result = json.dumps(job)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
+
+    def uploadDicomBatch(self, account):
+        """Receive archive of DICOM files (e.g. whole series or study) and import them into PACS together
+
+        Tar archive (application/x-tar) is extracted while streamed, zip archive (application/zip)
+        is saved first (its directory is at the end), response is per SOP instance manifest
+        """
+        ctype, pdict = cgi.parse_header(self.headers.getheader("content-type", ""))
+        if ctype not in ["application/x-tar", "application/zip"]:
+            self.sendEmptyResponse(415, closeConnection=True)
+            return
+
+        if self.headers.getheader("content-length") is None:
+            self.sendEmptyResponse(411, closeConnection=True)
+            return
+
+        body = RequestBody(self.rfile, int(self.headers.getheader("content-length")))
+
+        # Each batch has its own folder, file names from different batches cannot collide
+        batchDir = uuid.uuid4().hex
+        os.makedirs(self._tempDir + os.sep + batchDir)
+
+        try:
+            if ctype == "application/x-tar":
+                dicomFileNames = self.extractTar(body, batchDir)
             else:
-                self.logger.info("POST - page not found.")
-                self.send_response(404)
-                self.send_header("Content-Type", "application/json")
-                self.end_headers()
-        else:
-            self.logger.info("POST - not authenticated.")
-            self.send_response(403)
-            self.send_header("Content-Type", "appilcation/json")
-            self.end_headers
+                dicomFileNames = self.extractZip(body, batchDir)
+        except (IOError, tarfile.TarError, zipfile.BadZipfile), err:
+            self.logger.error("Cannot extract DICOM batch: " + str(err))
+            shutil.rmtree(self._tempDir + os.sep + batchDir, ignore_errors=True)
+            self.sendEmptyResponse(400, "Bad Request: invalid DICOM archive", closeConnection=True)
+            return
 
-        self.svcDb.Session.remove()
+        # Trailing archive padding
+        body.drain()
 
-        return
+        self.logger.info("Received DICOM batch " + batchDir + " with " + str(len(dicomFileNames)) + " files")
+
+        # Correct, import into PACS and verify
+        manifest = self._svcIngestion.ingestBatch(batchDir, dicomFileNames, account.partnersite.pacs.pacsbaseurl)
+
+        imported = len([entry for entry in manifest if entry["result"] is True])
+        dic = { "batch": batchDir, "files": manifest, "imported": imported, "failed": len(manifest) - imported }
+        result = json.dumps(dic)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def extractTar(self, body, batchDir):
+        """Extract regular files of streamed tar archive into batch folder
+        """
+        dicomFileNames = []
+
+        archive = tarfile.open(fileobj=body, mode="r|*")
+        try:
+            for member in archive:
+                if not member.isfile():
+                    continue
+
+                dicomFileName = self.batchFileName(member.name, dicomFileNames)
+                DicomService().saveStream(self._tempDir + os.sep + batchDir, dicomFileName, archive.extractfile(member), member.size)
+                dicomFileNames.append(dicomFileName)
+        finally:
+            archive.close()
+
+        return dicomFileNames
+
+    def extractZip(self, body, batchDir):
+        """Save zip archive into batch folder and extract its files there
+        """
+        archiveFileName = batchDir + ".zip"
+        archivePath = self._tempDir + os.sep + archiveFileName
+        DicomService().saveStream(self._tempDir, archiveFileName, body, body.remaining)
+
+        dicomFileNames = []
+        try:
+            archive = zipfile.ZipFile(archivePath)
+            try:
+                for info in archive.infolist():
+                    if info.filename.endswith("/"):
+                        continue
+
+                    dicomFileName = self.batchFileName(info.filename, dicomFileNames)
+                    DicomService().saveStream(self._tempDir + os.sep + batchDir, dicomFileName, archive.open(info), info.file_size)
+                    dicomFileNames.append(dicomFileName)
+            finally:
+                archive.close()
+        finally:
+            os.remove(archivePath)
+
+        return dicomFileNames
+
+    def batchFileName(self, memberName, dicomFileNames):
+        """File name of archive member within batch folder
+
+        Archive paths are flattened (never point outside of batch folder), duplicates are numbered
+        """
+        dicomFileName = os.path.basename(memberName.replace("\\", "/"))
+        if dicomFileName in ["", ".", ".."]:
+            dicomFileName = "file.dcm"
+
+        index = 1
+        uniqueFileName = dicomFileName
+        while uniqueFileName in dicomFileNames:
+            uniqueFileName = str(index) + "_" + dicomFileName
+            index += 1
+
+        return uniqueFileName
+
+########  ##     ## ##       ##
+##     ## ##     ## ##       ##
+##     ## ##     ## ##       ##
+########  ##     ## ##       ##
+##        ##     ## ##       ##
+##        ##     ## ##       ##
+##         #######  ######## ########
+
+    def addPullDataRequest(self, account):
+        """Create pull data request between partner sites
+        """
+        ctype, pdict = cgi.parse_header(self.headers.getheader('content-type'))
+        if ctype == "application/json":
+            length = int(self.headers.getheader("content-length"))
+
+            #data = cgi.parse_qs(self.rfile.read(length), keep_blank_values=1)
+
+            dic = json.loads(self.rfile.read(length))
+            serializer = PullDataRequestSerializer()
+            obj = serializer.deserialize(dic)
+
+            # create pullDataRequest object in DB
+            session = self.svcDb.Session()
+
+            ourSite = self.svcDb.getPartnerSiteByName(session, obj.sentToSite.sitename)
+            fromSite = self.svcDb.getPartnerSiteByName(session, obj.sentFromSite.sitename)
+
+            pullDataRequest = PullDataRequest()
+            pullDataRequest.subject = obj.subject
+            pullDataRequest.message = obj.message
+            pullDataRequest.created = obj.created
+            pullDataRequest.senttositeid = ourSite.siteid
+            pullDataRequest.sentfromsiteid = fromSite.siteid
+
+            session.add(pullDataRequest)
+            session.commit()
+
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            # Request body was not read
+            self.sendEmptyResponse(415, closeConnection=True)
 
  ######   ######## ########
 ##    ##  ##          ##
@@ -496,60 +1046,41 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
 ##    ##  ##          ##
  ######   ########    ##
 
-    def do_GET(self):
-        """Query local RadPlanBio DB and report the results in JSON format
-        """
-        # Authentication data
-        username = self.headers.getheader("Username")
-        password = self.headers.getheader("Password")
-        clearpass = self.headers.getheader("Clearpass")
+   ###     ######   ######   #######  ##     ## ##    ## ########
+  ## ##   ##    ## ##    ## ##     ## ##     ## ###   ##    ##
+ ##   ##  ##       ##       ##     ## ##     ## ####  ##    ##
+##     ## ##       ##       ##     ## ##     ## ## ## ##    ##
+######### ##       ##       ##     ## ##     ## ##  ####    ##
+##     ## ##    ## ##    ## ##     ## ##     ## ##   ###    ##
+##     ##  ######   ######   #######   #######  ##    ##    ##
 
-        # Query the DB to authenticate the user
-        authenticated = False
-        session = self.svcDb.Session()
-        account = self.svcDb.getDefaultAccountByUsername(session, username)
-
-        # Authentication
+    def authenticateUser(self, account):
+        """Report default account of authenticated user
+        """
+        serializer = DefaultAccountSerializer()
+        dic = serializer.serialize(account)
+        result = json.dumps(dic)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def getMyDefaultAccount(self, account):
+        """Report default account of authenticated user
+        """
         if account is not None:
-            # First try portal password
-            if account.password == password:
-                authenticated = True
-            # Than open clinica password
-            else:
-                self.logger.info("Authentication: trying OC user")
-                # OpenClinica
-                ocpassword = ""
-                if (self.appConfig.get("OpenClinicaDB")["enabled"]):
-                    ocsession = self.svcDb.ocSession()
-                    ocpassword = self.svcDb.getAccountPasswordHash(ocsession, username)
-
-                if ocpassword != "" and ocpassword == password:
-                    self.logger.info("Authentication: oc authentication success")
-                    authenticated = True
-
-        self.logger.info("GET method: " + self.path)
+            serializer = DefaultAccountSerializer()
+            listOfDics = []
+            dic = serializer.serialize(account)
+            result = json.dumps(dic)
 
-        if authenticated:
-            if None != re.search("/api/v1/authenticateUser/*", self.path):
-                serializer = DefaultAccountSerializer()
-                dic = serializer.serialize(account)
-                result = json.dumps(dic)
-
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/getMyDefaultAccount/*", self.path):
-                if account is not None:
-                    serializer = DefaultAccountSerializer()
-                    listOfDics = []
-                    dic = serializer.serialize(account)
-                    result = json.dumps(dic)
-
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(result)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
 
  ######  ######## ##     ## ########  ##    ##
 ##    ##    ##    ##     ## ##     ##  ##  ##
@@ -559,23 +1090,25 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
 ##    ##    ##    ##     ## ##     ##    ##
  ######     ##     #######  ########     ##
 
-            elif None != re.search("/api/v1/getStudyByOcIdentifier/*", self.path):
-                ocIdentifier = self.path.split("/")[-1]
-                decodedIdentifier = ocIdentifier.decode("utf-8")
+    def getStudyByOcIdentifier(self, account, ocIdentifier):
+        """Report RPB study according to OC study identifier
+        """
+        decodedIdentifier = ocIdentifier.decode("utf-8")
 
-                session = self.svcDb.Session()
-                study = self.svcDb.getStudyByOcIdentifier(session, decodedIdentifier)
+        session = self.svcDb.Session()
+        study = self.svcDb.getStudyByOcIdentifier(session, decodedIdentifier)
 
-                if study is not None:
-                    serializer = StudySerializer()
-                    listOfDics = []
-                    dic = serializer.serialize(study)
-                    result = json.dumps(dic)
+        if study is not None:
+            serializer = StudySerializer()
+            listOfDics = []
+            dic = serializer.serialize(study)
+            result = json.dumps(dic)
 
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(result)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
 
 ########  ########  ######  ######## ########  ##     ##  ######  ########
 ##     ##    ##    ##    ##    ##    ##     ## ##     ## ##    ##    ##
@@ -585,23 +1118,26 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
 ##    ##     ##    ##    ##    ##    ##    ##  ##     ## ##    ##    ##
 ##     ##    ##     ######     ##    ##     ##  #######   ######     ##
 
-            elif None != re.search("/api/v1/getAllRTStructs/*", self.path):
-                session = self.svcDb.Session()
-                structs = self.svcDb.getAllRTStructs(session)
+    def getAllRTStructs(self, account):
+        """Report all RT structures
+        """
+        session = self.svcDb.Session()
+        structs = self.svcDb.getAllRTStructs(session)
 
-                serializer = RTStructSerializer()
-                listOfDics = []
+        serializer = RTStructSerializer()
+        listOfDics = []
 
-                for rtstruct in structs:
-                    dic = serializer.serialize(rtstruct)
-                    listOfDics.append(dic)
+        for rtstruct in structs:
+            dic = serializer.serialize(rtstruct)
+            listOfDics.append(dic)
 
-                result = json.dumps(listOfDics)
+        result = json.dumps(listOfDics)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(result)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
 
  ######  ########  ########       ###    ##    ## ##    ##  #######  ########    ###    ######## ####  #######  ##    ##  ######
 ##    ## ##     ## ##            ## ##   ###   ## ###   ## ##     ##    ##      ## ##      ##     ##  ##     ## ###   ## ##    ##
@@ -611,79 +1147,56 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
 ##    ## ##    ##  ##          ##     ## ##   ### ##   ### ##     ##    ##    ##     ##    ##     ##  ##     ## ##   ### ##    ##
  ######  ##     ## ##          ##     ## ##    ## ##    ##  #######     ##    ##     ##    ##    ####  #######  ##    ##  ######
 
-            elif None != re.search("/api/v1/getCrfFieldsAnnotationForStudy/*", self.path):
-                studyid = self.path.split("/")[-1]
-                session = self.svcDb.Session()
-                annotations = self.svcDb.getCrfFieldAnnotationsForStudy(session, studyid)
-
-                serializer = CrfFieldAnnotationSerializer()
-                listOfDics = []
-
-                for a in annotations:
-                    dic = serializer.serialize(a)
-                    listOfDics.append(dic)
-
-                result = json.dumps(listOfDics)
-
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/getDicomStudyCrfAnnotationsForStudy/*", self.path):
-                studyid = self.path.split("/")[-1]
-                session = self.svcDb.Session()
-                annotations = self.svcDb.getDicomStudyCrfAnnotationsForStudy(session, studyid)
+    def getCrfFieldsAnnotationForStudy(self, account, studyid):
+        """Report all eCRF field annotations of study
+        """
+        session = self.svcDb.Session()
+        annotations = self.svcDb.getCrfFieldAnnotationsForStudy(session, studyid)
 
-                serializer = CrfFieldAnnotationSerializer()
-                listOfDics = []
+        self._sendCrfFieldAnnotations(annotations)
 
-                for a in annotations:
-                    dic = serializer.serialize(a)
-                    listOfDics.append(dic)
+    def getDicomStudyCrfAnnotationsForStudy(self, account, studyid):
+        """Report DICOM study eCRF field annotations of study
+        """
+        session = self.svcDb.Session()
+        annotations = self.svcDb.getDicomStudyCrfAnnotationsForStudy(session, studyid)
 
-                result = json.dumps(listOfDics)
+        self._sendCrfFieldAnnotations(annotations)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/getDicomPatientCrfAnnotationsForStudy/*", self.path):
-                studyid = self.path.split("/")[-1]
-                session = self.svcDb.Session()
-                annotations = self.svcDb.getDicomPatientCrfAnnotationsForStudy(session, studyid)
+    def getDicomPatientCrfAnnotationsForStudy(self, account, studyid):
+        """Report DICOM patient eCRF field annotations of study
+        """
+        session = self.svcDb.Session()
+        annotations = self.svcDb.getDicomPatientCrfAnnotationsForStudy(session, studyid)
 
-                serializer = CrfFieldAnnotationSerializer()
-                listOfDics = []
+        self._sendCrfFieldAnnotations(annotations)
 
-                for a in annotations:
-                    dic = serializer.serialize(a)
-                    listOfDics.append(dic)
+    def getDicomReportCrfAnnotationsForStudy(self, account, studyid):
+        """Report DICOM report eCRF field annotations of study
+        """
+        session = self.svcDb.Session()
+        annotations = self.svcDb.getDicomReportCrfAnnotationsForStudy(session, studyid)
 
-                result = json.dumps(listOfDics)
+        self._sendCrfFieldAnnotations(annotations)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/getDicomReportCrfAnnotationsForStudy/*", self.path):
-                studyid = self.path.split("/")[-1]
-                session = self.svcDb.Session()
-                annotations = self.svcDb.getDicomReportCrfAnnotationsForStudy(session, studyid)
+    def _sendCrfFieldAnnotations(self, annotations):
+        """Serialize eCRF field annotations to JSON response
+        """
+        serializer = CrfFieldAnnotationSerializer()
+        listOfDics = []
 
-                serializer = CrfFieldAnnotationSerializer()
-                listOfDics = []
+        for a in annotations:
+            dic = serializer.serialize(a)
+            listOfDics.append(dic)
 
-                for a in annotations:
-                    dic = serializer.serialize(a)
-                    listOfDics.append(dic)
+        result = json.dumps(listOfDics)
 
-                result = json.dumps(listOfDics)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(result)
-                
 ########     ###    ########  ######## ##    ## ######## ########      ######  #### ######## ########
 ##     ##   ## ##   ##     ##    ##    ###   ## ##       ##     ##    ##    ##  ##     ##    ##
 ##     ##  ##   ##  ##     ##    ##    ####  ## ##       ##     ##    ##        ##     ##    ##
@@ -691,553 +1204,802 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
 ##        ######### ##   ##      ##    ##  #### ##       ##   ##            ##  ##     ##    ##
 ##        ##     ## ##    ##     ##    ##   ### ##       ##    ##     ##    ##  ##     ##    ##
 ##        ##     ## ##     ##    ##    ##    ## ######## ##     ##     ######  ####    ##    ########
-    
-            elif None != re.search("/api/v1/getAllPartnerSites/*", self.path):
-                session = self.svcDb.Session()
-                sites = self.svcDb.getAllPartnerSites(session)
 
-                serializer = PartnerSiteSerializer()
-                listOfDics = []
+    def getAllPartnerSites(self, account):
+        """Report all partner sites
+        """
+        session = self.svcDb.Session()
+        sites = self.svcDb.getAllPartnerSites(session)
 
-                for site in sites:
-                    dic = serializer.serialize(site)
-                    listOfDics.append(dic)
+        serializer = PartnerSiteSerializer()
+        listOfDics = []
 
-                result = json.dumps(listOfDics)
+        for site in sites:
+            dic = serializer.serialize(site)
+            listOfDics.append(dic)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/getAllPartnerExceptName/*", self.path):
-                exceptSiteName = self.path.split("/")[-1]
-                session = self.svcDb.Session()
-                sites = self.svcDb.getAllPartnerExceptName(session, exceptSiteName)
+        result = json.dumps(listOfDics)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
 
-                listOfDics = []
-                for site in sites:
-                    serializer = PartnerSiteSerializer()
-                    dic = serializer.serialize(site)
-                    listOfDics.append(dic)
+    def getAllPartnerExceptName(self, account, exceptSiteName):
+        """Report all partner sites except the specified one
+        """
+        session = self.svcDb.Session()
+        sites = self.svcDb.getAllPartnerExceptName(session, exceptSiteName)
 
-                results = json.dumps(listOfDics)
+        listOfDics = []
+        for site in sites:
+            serializer = PartnerSiteSerializer()
+            dic = serializer.serialize(site)
+            listOfDics.append(dic)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(results)
-            elif None != re.search("/api/v1/getPartnerSiteByName/*", self.path):
-                siteName = self.path.split("/")[-1]
-
-                session = self.svcDb.Session()
-                site = self.svcDb.getPartnerSiteByName(session, siteName)
-
-                if site is not None:
-                    serializer = PartnerSiteSerializer()
-                    dic = serializer.serialize(site)
-                    result = json.dumps(dic)
-
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(result)
-            # Deprecated
-            elif None != re.search("/api/v1/getMySite/*", self.path):
-                session = self.svcDb.Session()
-                site = self.svcDb.getMySite(session)
-                if site is not None:
-                    serializer = PartnerSiteSerializer()
-                    dic = serializer.serialize(site)
-                    result = json.dumps(dic)
-
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(result)
-                else:
-                    self.send_response(400, 'Bad Request: record does not exist')
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-      
- ######   #######  ######## ######## ##      ##    ###    ########  ######## 
-##    ## ##     ## ##          ##    ##  ##  ##   ## ##   ##     ## ##       
-##       ##     ## ##          ##    ##  ##  ##  ##   ##  ##     ## ##       
- ######  ##     ## ######      ##    ##  ##  ## ##     ## ########  ######   
-      ## ##     ## ##          ##    ##  ##  ## ######### ##   ##   ##       
-##    ## ##     ## ##          ##    ##  ##  ## ##     ## ##    ##  ##       
+        results = json.dumps(listOfDics)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(results)))
+        self.end_headers()
+        self.wfile.write(results)
+
+    def getPartnerSiteByName(self, account, siteName):
+        """Report partner site according to its name
+        """
+        session = self.svcDb.Session()
+        site = self.svcDb.getPartnerSiteByName(session, siteName)
+
+        if site is not None:
+            serializer = PartnerSiteSerializer()
+            dic = serializer.serialize(site)
+            result = json.dumps(dic)
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
+
+    def getMySite(self, account):
+        """Deprecated: report partner site of this server
+        """
+        session = self.svcDb.Session()
+        site = self.svcDb.getMySite(session)
+        if site is not None:
+            serializer = PartnerSiteSerializer()
+            dic = serializer.serialize(site)
+            result = json.dumps(dic)
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
+        else:
+            self.sendEmptyResponse(400, "Bad Request: record does not exist")
+
+ ######   #######  ######## ######## ##      ##    ###    ########  ########
+##    ## ##     ## ##          ##    ##  ##  ##   ## ##   ##     ## ##
+##       ##     ## ##          ##    ##  ##  ##  ##   ##  ##     ## ##
+ ######  ##     ## ######      ##    ##  ##  ## ##     ## ########  ######
+      ## ##     ## ##          ##    ##  ##  ## ######### ##   ##   ##
+##    ## ##     ## ##          ##    ##  ##  ## ##     ## ##    ##  ##
  ######   #######  ##          ##     ###  ###  ##     ## ##     ## ########
 
-            elif None != re.search("/api/v1/getLatestSoftware/*", self.path):
-                name = self.path.split("/")[-1]
+    def getLatestSoftware(self, account, name):
+        """Report latest version of software according to its name
+        """
+        session = self.svcDb.Session()
+        software = self.svcDb.getLatestSoftwareByName(session, name)
 
-                session = self.svcDb.Session()
-                software = self.svcDb.getLatestSoftwareByName(session, name)
+        if software is not None:
+            serializer = SoftwareSerializer()
+            dic = serializer.serialize(software)
+            result = json.dumps(dic)
 
-                if software is not None:
-                    serializer = SoftwareSerializer()
-                    dic = serializer.serialize(software)
-                    result = json.dumps(dic)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
 
-                    self.send_response(200)
-                    self.send_header("Content-Type", "application/octet-stream")
-                    self.end_headers()
-                    self.wfile.write(result)
+    def getServerStatistics(self, account):
+        """Report server counters for monitoring
+        """
+        statistics = { "pid": os.getpid() }
 
-########     ###     ######   ######  
-##     ##   ## ##   ##    ## ##    ## 
-##     ##  ##   ##  ##       ##       
-########  ##     ## ##        ######  
-##        ######### ##             ## 
-##        ##     ## ##    ## ##    ## 
-##        ##     ##  ######   ######  
-            
-            elif None != re.search("/api/v1/getAllDicomStudies/*", self.path):
-                baseUrl = account.partnersite.pacs.pacsbaseurl
-                endpoint = "?mode=radplanbiostudies"
+        if self.authCache is not None:
+            statistics["authenticationCache"] = self.authCache.statistics()
 
-                s = requests.Session()
-                s.headers.update({ "Accept": "application/json"})
+        if self.server.ocSessions is not None:
+            statistics["ocSessionCache"] = self.server.ocSessions.statistics()
 
-                r = s.get(baseUrl + endpoint)
+        if self.server.ocWebServices is not None:
+            statistics["ocSoapClients"] = self.server.ocWebServices.statistics()
 
-                resultCode = r.status_code
+        if self.server.studyMetadata is not None:
+            statistics["studyMetadata"] = self.server.studyMetadata.statistics()
 
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.end_headers()
-                self.wfile.write(r.json())
-            elif None != re.search("/api/v1/getDicomStudiesByPatientId/*", self.path):
-                patientId = self.path.split("/")[-1]
+        if isinstance(self.server, WorkerPoolMixIn):
+            statistics["workerPool"] = self.server.poolStatistics()
 
-                baseUrl = account.partnersite.pacs.pacsbaseurl
-                endpoint = "?mode=radplanbiostudies" + "patientidmatch=" + patientId
+        if self.ingestionJobs is not None:
+            statistics["ingestionJobs"] = self.ingestionJobs.statistics()
 
-                s = requests.Session()
-                s.headers.update({ 'Accept': 'application/json'})
+        if self.server.correctionPool is not None:
+            statistics["correctionPool"] = self.server.correctionPool.statistics()
 
-                r = s.get(baseUrl + endpoint)
+        statistics["corrections"] = self.server.correctionCounters.statistics()
 
-                resultCode = r.status_code
+        if self.server.storePool is not None:
+            statistics["storePool"] = self.server.storePool.statistics()
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(r.json())
-            
-            elif None != re.search(".*/api/v1/patients/.*/dicomStudies/.*/dcm/.*", self.path):
-                dicomPatientId = self.path.split("/")[-5]
-                dicomStudyInstaceUid = self.path.split("/")[-3]
-                filename = self.path.split("/") [-1]
-
-                fileToRead = ConfigDetails().rpbUnzipDir + os.sep + username + os.sep + dicomPatientId + os.sep + dicomStudyInstaceUid + os.sep + filename
-                if os.path.isfile(fileToRead): 
-                    f = open(fileToRead, "rb")
-                    self.send_response(200)
-                    self.send_header("Content-Language", "English")
-                    self.send_header("Content-Type", "application/octet-stream")
-                    self.end_headers()
-                    self.wfile.write(f.read())
-            elif None != re.search(".*/api/v1/patients/.*/dicomStudies/.*/clean", self.path):
-                dicomPatientId = self.path.split("/")[-4]
-                dicomStudyInstaceUid = self.path.split("/")[-2]
-                
-                shutil.rmtree("./" + ConfigDetails().rpbUnzipDir + os.sep + username + os.sep + dicomPatientId + os.sep + dicomStudyInstaceUid)
-
-                result = '{ "result":' + str(True).lower()  + ' }'
+        if self.server.importVerifier is not None:
+            statistics["importVerification"] = self.server.importVerifier.statistics()
 
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search(".*/api/v1/patients/.*/dicomStudies/.*/unzip", self.path):
-                dicomPatientId = self.path.split("/")[-4]
-                dicomStudyInstaceUid = self.path.split("/")[-2]
-               
-                # Asking for DICOM data in this RPB instance however in which PACS
-                if self.pseudonymIndicatesMulticentreStudy(dicomPatientId):
-                    identifier = self.getPartnerSiteIdentifier(dicomPatientId)
-                    session = self.svcDb.Session()
-                    site = self.svcDb.getPartnerSiteByIdentifier(
-                        session, 
-                        identifier
-                    )
-                else:
-                    site = account.partnersite 
-                    
-                baseUrl = site.pacs.pacsbaseurl
+        statistics["pacsConnections"] = self.server._svcPacs.statistics()
 
-                # TODO: add session ID to the path (to fix the case when the user is logged in multiple times and downloading the same study)
-                downloadPath = ConfigDetails().rpbDownloadDir + os.sep + username
+        statistics["fanout"] = self.server.fanout.statistics()
 
-                if os.path.isdir(downloadPath) == False:
-                    os.mkdir(downloadPath)
-                
-                zippedDataPath = self._svcPacs.downloadDicomStudy(baseUrl, dicomPatientId, dicomStudyInstaceUid, downloadPath)
+        result = json.dumps(statistics)
 
-                # Folder structure for unzipped files
-                zfile = zipfile.ZipFile(zippedDataPath)
-                unzippedDataPath = "./" + ConfigDetails().rpbUnzipDir + os.sep + username
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
 
-                if os.path.isdir(unzippedDataPath) == False:
-                    os.mkdir(unzippedDataPath)
+########     ###     ######   ######
+##     ##   ## ##   ##    ## ##    ##
+##     ##  ##   ##  ##       ##
+########  ##     ## ##        ######
+##        ######### ##             ##
+##        ##     ## ##    ## ##    ##
+##        ##     ##  ######   ######
 
-                unzippedDataPath = unzippedDataPath + os.sep + dicomPatientId 
+    def getAllDicomStudies(self, account):
+        """Report all DICOM studies from PACS of user partner site
+        """
+        baseUrl = account.partnersite.pacs.pacsbaseurl
 
-                if os.path.isdir(unzippedDataPath) == False:
-                    os.mkdir(unzippedDataPath)
+        studies = self._svcPacs.getAllStudies(baseUrl)
+        if studies is None:
+            self.sendEmptyResponse(502)
+            return
 
-                unzippedDataPath = unzippedDataPath + os.sep + dicomStudyInstaceUid
+        result = json.dumps(studies)
 
-                if os.path.isdir(unzippedDataPath) == False:
-                    os.mkdir(unzippedDataPath)
-                
-                zfile.extractall(unzippedDataPath)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
 
-                os.remove(zippedDataPath)
+    def getDicomStudiesByPatientId(self, account, patientId):
+        """Report DICOM studies of patient from PACS of user partner site
+        """
+        baseUrl = account.partnersite.pacs.pacsbaseurl
 
-                f = []
-                for (dirpath, dirnames, filenames) in os.walk(unzippedDataPath):
-                    f.extend(filenames)
-                    break
+        studies = self._svcPacs.getPatientStudies(baseUrl, patientId)
+        if studies is None:
+            self.sendEmptyResponse(502)
+            return
 
-                stringJson = '{ "Patients": [ '
-                stringJson = stringJson + '{ '
-                stringJson = stringJson + '"UniqueIdentifier": "' + dicomPatientId + '", '
-                stringJson = stringJson + '"Studies": [ '
-                stringJson = stringJson + '{ '
-                stringJson = stringJson + '"StudyInstanceUid": "' + dicomStudyInstaceUid + '", '
-                stringJson = stringJson + '"Files": [ '
-                i = 0
-                for filename in f:
-                    if i == 0:
-                        stringJson = stringJson + '{ '
-                    else:
-                        stringJson = stringJson + ', { '
-                    
-                    # subject serverie public URL for request routing)
-                    # e.g. https://radplanbio.uniklinikum-dresden.de/serverieDD/api/v1....
-                    baseUrl = site.serverie.publicurl
-
-                    stringJson = stringJson + '"WebApiUrl" : "' + baseUrl + '/api/v1/patients/' + dicomPatientId + '/dicomStudies/' + dicomStudyInstaceUid + '/dcm/' + filename + '"' 
-                    #stringJson = stringJson + '"WebApiUrl" : "' + "localhost:9000" + '/api/v1/patients/' + dicomPatientId + '/dicomStudies/' + dicomStudyInstaceUid + '/dcm/' + filename + '"'
-                    stringJson = stringJson + ' }'
-
-                    i = i + 1
-
-                # Closing structure                    
-                stringJson = stringJson + '] } ] } ] }'
+        result = json.dumps(studies)
 
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.end_headers()
-                self.wfile.write(stringJson)
-            elif None != re.search(".*/api/v1/studies/.*/dicomStudies", self.path):
-                
-                # For multiple studies I need multiple identifiers
-                studyIdentifier = self.path.split("/")[-2]
-
-                # Read partner site of logged user
-                baseUrl = account.partnersite.edc.soapbaseurl
-
-                session = self.svcDb.ocSession()
-                passwordHash = self.svcDb.getAccountPasswordHash(session, account.ocusername)
-
-                # Create connection artifact to users main OpenClinica SOAP
-                ocConnectInfo = OCConnectInfo(baseUrl, account.ocusername, passwordHash)
-                self._svcOcWebServices = OCWebServices(ocConnectInfo)
-
-                # Is it parent study or study site
-                selectedStudy = None
-                selectedSite = None
-                success, studies = self._svcOcWebServices.listAllStudies()
-
-                if success:
-                    self.logger.debug("SOAP studies size: " + str(len(studies)))
-                    selectedStudy = first.first(study for study in studies if study.identifier().encode("utf-8") == studyIdentifier)                    
-
-                # Site was selected
-                if selectedStudy is None:
-                    for s in studies:
-                        if s.sites:
-                            for site in s.sites:
-                                if site.identifier == studyIdentifier:
-                                    selectedSite = site
-                                    selectedStudy = s
-                                    break
-
-                # Load study metadata
-                sucess, studyMetadata = self._svcOcWebServices.getStudyMetadata(selectedStudy)
-
-                # RPB study entity
-                session = self.svcDb.Session()
-                study = self.svcDb.getStudyByOcIdentifier(session, selectedStudy.identifier())
-
-                # Load subject for whole study or only site if it is multicentre study
-                # oid is study OID (monocentre study) or site study OID (multi-centre study)
-                subjects = None
-                isMultiCentre = False
-                if selectedSite is not None:
-                    oid = selectedSite.oid
-                    subjects = self._svcOcWebServices.listAllStudySubjectsByStudySite([selectedStudy, selectedSite, studyMetadata])
-                    isMultiCentre = True
-                elif selectedStudy is not None:
-                    oid = selectedStudy.oid()
-                    subjects = self._svcOcWebServices.listAllStudySubjectsByStudy([selectedStudy, studyMetadata])
-                    isMultiCentre = False
-
-                self.logger.debug("SOAP subjects count: " + str(len(subjects)))
-
-                self._svcOcRestfulService = OCRestfulService(account.ocusername, clearpass)
-                
-                # Subjects has to be enhanced with values from REST services
-                subjectsREST = self._svcOcRestfulService.getStudyCasebookSubjects([account.partnersite.edc.edcbaseurl, oid])
-                self.logger.debug("REST subjects count: " + str(len(subjectsREST)))
-
-                # Synchronise subjects
-                for ss in subjects:
-                    for sREST in subjectsREST:
-                        if sREST.studySubjectId == ss.label():
-                            ss.oid = sREST.oid
-
-                # Load DICOM annotation for that study
-                session = self.svcDb.Session()
-                dicomAnnotations = self.svcDb.getDicomStudyCrfAnnotationsForStudy(session, study.id)
-                           
-                stringJson = '{ "Patients": [ '
-                i = 0
-                for subject in subjects:
-
-                    # Events values has to be enhanced with values from REST services
-                    eventsREST = self._svcOcRestfulService.getStudyCasebookEvents([account.partnersite.edc.edcbaseurl, oid, subject.oid])
-                    self.logger.debug("REST events count: " + str(len(eventsREST)))
-
-                    # Syncrhonise events
-                    for event in subject.events:
-                        for e in eventsREST:
-                            if e.eventDefinitionOID == event.eventDefinitionOID and e.startDate.isoformat() == event.startDate.isoformat():
-                                event.status = e.status
-                                event.studyEventRepeatKey = e.studyEventRepeatKey
-                                event.setForms(e.forms)
-                    
-                    try:
-                        # Starting new patient
-                        if i == 0:
-                            stringJson = stringJson + '{ '
-                        else:
-                            stringJson = stringJson + ', { '
-                       
-                        # Load site accoring site identifier in subject pseudonym
-                        if isMultiCentre:
-                            identifier = self.getPartnerSiteIdentifier(
-                                subject.subject.uniqueIdentifier
-                            )
-                            session = self.svcDb.Session()
-                            site = self.svcDb.getPartnerSiteByIdentifier(
-                                session, 
-                                identifier
-                            )
-                        else:
-                            site = account.partnersite
-
-                        stringJson = stringJson + '"SubjectKey": "' + subject.oid + '", '
-                        stringJson = stringJson + '"StudySubjectID": "' + subject.label() + '", '
-                        stringJson = stringJson + '"UniqueIdentifier": "' + subject.subject.uniqueIdentifier + '", '
-                        stringJson = stringJson + '"Studies": [ '
-                        
-                        for event in subject.events:
-                            j = 0
-                            for crfAnnotation in dicomAnnotations:
-                                if crfAnnotation.eventdefinitionoid == event.eventDefinitionOID:
-                                    if event.hasScheduledCrf(crfAnnotation.formoid):
-
-                                        # Load study instace uids data
-                                        session = self.svcDb.ocSession()
-                                        value = self.svcDb.getCrfItemValueV2(
-                                            session, 
-                                            oid, 
-                                            subject.subject.uniqueIdentifier, 
-                                            event.eventDefinitionOID, 
-                                            event.studyEventRepeatKey, 
-                                            crfAnnotation.formoid, 
-                                            crfAnnotation.crfitemoid
-                                        )
-
-                                        # Only when there is actually some data
-                                        if value is not None and value is not "":
-                                            self.logger.debug("DICOM StudyInstanceUID according to eCRF annotation: " + str(value))
-                                            field = CrfDicomField(
-                                                crfAnnotation.crfitemoid,
-                                                value,
-                                                crfAnnotation.annotationtype.name,
-                                                crfAnnotation.eventdefinitionoid,
-                                                crfAnnotation.formoid,
-                                                crfAnnotation.groupoid
-                                            )
-
-                                            # Load label from metadata
-                                            itemMeta = self._svcOdmMetaData.loadCrfItem(crfAnnotation.formoid, crfAnnotation.crfitemoid, studyMetadata)
-                                            if itemMeta is not None:
-                                                self.logger.debug("DICOM StudyInstanceUID eCRF label: " + itemMeta.label)
-                                                field.label = itemMeta.label
-
-                                            
-                                            # Starting new DICOM study
-                                            if j == 0:
-                                                stringJson = stringJson + '{ '
-                                            else:
-                                                stringJson = stringJson + ', { '
-
-                                            stringJson = stringJson + '"StudyInstanceUid": "' + value + '"'
-                                            stringJson = stringJson + ', "StudyEventOid": "' + field.eventOid + '"'
-                                            stringJson = stringJson + ', "ItemOid": "' + field.oid + '"'
-                                            stringJson = stringJson + ', "Label": "' + field.label + '"'
-                                            
-                                            # subject serverie public URL + application (for request routing)
-                                            # e.g. https://radplanbio.uniklinikum-dresden.de/serverieDD/
-                                            stringJson = stringJson + ', "WebApiUrl" : "' + site.serverie.publicurl + '/api/v1/patients/' + subject.subject.uniqueIdentifier + '/dicomStudies/' + value + '"' 
-
-                                            stringJson = stringJson + '}'
-                                            j = j + 1
-
-                                            self.logger.debug(stringJson)
-                                        else:
-                                             self.logger.debug("No UID imported into eCRF.")
-                    except Exception, err:
-                        self.logger.error(str(err))
-
-                    # End studies array, end patient
-                    stringJson = stringJson + '] }'
-                    i = i + 1
-
-                # End patients array, end json root
-                stringJson = stringJson + '] }'
-
-                self.logger.debug(stringJson)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
 
+    def getPatientDicomStudyFile(self, account, dicomPatientId, dicomStudyInstaceUid, filename):
+        """Download one file of unzipped DICOM study
+        """
+        fileToRead = ConfigDetails().rpbUnzipDir + os.sep + account.username + os.sep + dicomPatientId + os.sep + dicomStudyInstaceUid + os.sep + filename
+        if os.path.isfile(fileToRead):
+            with open(fileToRead, "rb") as f:
                 self.send_response(200)
-                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Language", "English")
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(os.path.getsize(fileToRead)))
                 self.end_headers()
-                self.wfile.write(stringJson)  
 
- #######   ######  
-##     ## ##    ## 
-##     ## ##       
-##     ## ##       
-##     ## ##       
-##     ## ##    ## 
- #######   ######  
+                # Stream the file instead of loading it into memory
+                shutil.copyfileobj(f, self.wfile)
 
-            elif None != re.search("/api/v1/getCrfItemValue/*", self.path):
-                command = self.path.split("/")
-                #/api/v1/getCrfItemValue/studyid/subjectPid/studyEventOid/formOid/itemOid
+    def cleanPatientDicomStudy(self, account, dicomPatientId, dicomStudyInstaceUid):
+        """Remove unzipped DICOM study of user
+        """
+        shutil.rmtree("./" + ConfigDetails().rpbUnzipDir + os.sep + account.username + os.sep + dicomPatientId + os.sep + dicomStudyInstaceUid)
 
-                studySiteOid = command[-5]
-                subjectPid = command[-4]
-                studyEventOid = command[-3]
-                formOid = command[-2]
-                itemOid = command[-1]
+        result = '{ "result":' + str(True).lower()  + ' }'
 
-                session = self.svcDb.ocSession()
-                value = self.svcDb.getCrfItemValueV1(session, studySiteOid, subjectPid, studyEventOid, formOid, itemOid)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
 
-                dic = { "itemOid" : itemOid, "itemValue" : value }
-                result = json.dumps(dic)
+    def unzipPatientDicomStudy(self, account, dicomPatientId, dicomStudyInstaceUid):
+        """Download DICOM study from PACS, unzip it and report download URLs of its files
+        """
+        username = account.username
+
+        # Asking for DICOM data in this RPB instance however in which PACS
+        if self.pseudonymIndicatesMulticentreStudy(dicomPatientId):
+            identifier = self.getPartnerSiteIdentifier(dicomPatientId)
+            session = self.svcDb.Session()
+            site = self.svcDb.getPartnerSiteByIdentifier(
+                session,
+                identifier
+            )
+        else:
+            site = account.partnersite
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Content-Length', str(len(result)))
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v2/getCrfItemValue/*", self.path):
-                command = self.path.split("/")
-                #/api/v2/getCrfItemValue/studyid/subjectPid/studyEventOid/studyEventRepeatKey/formOid/itemOid
+        baseUrl = site.pacs.pacsbaseurl
 
-                studySiteOid = command[-6]
-                subjectPid = command[-5]
-                studyEventOid = command[-4]
-                studyEventRepeatKey = command[-3]
-                formOid = command[-2]
-                itemOid = command[-1]
+        # TODO: add session ID to the path (to fix the case when the user is logged in multiple times and downloading the same study)
+        downloadPath = ConfigDetails().rpbDownloadDir + os.sep + username
 
-                session = self.svcDb.ocSession()
-                value = self.svcDb.getCrfItemValueV2(session, studySiteOid, subjectPid, studyEventOid, studyEventRepeatKey, formOid, itemOid)
+        if os.path.isdir(downloadPath) == False:
+            os.mkdir(downloadPath)
 
-                dic = { "itemOid" : itemOid, "itemValue" : value }
-                result = json.dumps(dic)
+        zippedDataPath = self._svcPacs.downloadDicomStudy(baseUrl, dicomPatientId, dicomStudyInstaceUid, downloadPath)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Content-Length', str(len(result)))
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/getOCAccoutPasswordHash/*", self.path):
-                session = self.svcDb.ocSession()
-                passwordHash = self.svcDb.getAccountPasswordHash(session, account.ocusername)
+        # Folder structure for unzipped files
+        zfile = zipfile.ZipFile(zippedDataPath)
+        unzippedDataPath = "./" + ConfigDetails().rpbUnzipDir + os.sep + username
 
-                dic = { "ocPasswordHash" : passwordHash }
-                result = json.dumps(dic)
+        if os.path.isdir(unzippedDataPath) == False:
+            os.mkdir(unzippedDataPath)
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(result)
-            elif None != re.search("/api/v1/getOCStudyByIdentifier/*", self.path):
-                ocStudyIdentifer = ocUsername = self.path.split("/")[-1]
-
-                session = self.svcDb.ocSession()
-                study = self.svcDb.getOCStudyByIdentifier(session, ocStudyIdentifer)
-
-                if study is not None:
-                    serializer = OCStudySerializer()
-                    dic = serializer.serialize(study)
-                    result = json.dumps(dic)
-
-                    self.send_response(200)
-                    self.send_header("Content-Type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(result)   
-            elif None != re.search("/api/v1/getUserActiveStudy/*", self.path):
-                ocUsername = self.path.split("/")[-1]
-
-                session = self.svcDb.ocSession()
-                study = self.svcDb.getUserActiveStudy(session, ocUsername)
-
-                if study is not None:
-                    serializer = OCStudySerializer()
-                    dic = serializer.serialize(study)
-                    result = json.dumps(dic)
-
-                    self.send_response(200)
-                    self.send_header("Content-Type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(result)
-            elif None != re.search("/api/v1/changeUserActiveStudy/*", self.path):
-                newActiveStudyId = self.path.split("/")[-1]  
-                ocUsername = self.path.split("/")[-2]   
-
-                session = self.svcDb.ocSession()
-                updateResult = self.svcDb.changeUserActiveStudy(session, ocUsername, int(newActiveStudyId))
-
-                result = '{ "result":' + str(updateResult).lower()  + ' }'
+        unzippedDataPath = unzippedDataPath + os.sep + dicomPatientId
 
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.end_headers()
-                self.wfile.write(result)
+        if os.path.isdir(unzippedDataPath) == False:
+            os.mkdir(unzippedDataPath)
+
+        unzippedDataPath = unzippedDataPath + os.sep + dicomStudyInstaceUid
+
+        if os.path.isdir(unzippedDataPath) == False:
+            os.mkdir(unzippedDataPath)
+
+        zfile.extractall(unzippedDataPath)
+
+        os.remove(zippedDataPath)
+
+        f = []
+        for (dirpath, dirnames, filenames) in os.walk(unzippedDataPath):
+            f.extend(filenames)
+            break
+
+        stringJson = '{ "Patients": [ '
+        stringJson = stringJson + '{ '
+        stringJson = stringJson + '"UniqueIdentifier": "' + dicomPatientId + '", '
+        stringJson = stringJson + '"Studies": [ '
+        stringJson = stringJson + '{ '
+        stringJson = stringJson + '"StudyInstanceUid": "' + dicomStudyInstaceUid + '", '
+        stringJson = stringJson + '"Files": [ '
+        i = 0
+        for filename in f:
+            if i == 0:
+                stringJson = stringJson + '{ '
             else:
-                self.logger.info("GET - page not found.")
-                self.send_response(404)
-                self.send_header("Content-Type", "application/json")
-                self.end_headers()
+                stringJson = stringJson + ', { '
+
+            # subject serverie public URL for request routing)
+            # e.g. https://radplanbio.uniklinikum-dresden.de/serverieDD/api/v1....
+            baseUrl = site.serverie.publicurl
+
+            stringJson = stringJson + '"WebApiUrl" : "' + baseUrl + '/api/v1/patients/' + dicomPatientId + '/dicomStudies/' + dicomStudyInstaceUid + '/dcm/' + filename + '"'
+            #stringJson = stringJson + '"WebApiUrl" : "' + "localhost:9000" + '/api/v1/patients/' + dicomPatientId + '/dicomStudies/' + dicomStudyInstaceUid + '/dcm/' + filename + '"'
+            stringJson = stringJson + ' }'
+
+            i = i + 1
+
+        # Closing structure
+        stringJson = stringJson + '] } ] } ] }'
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(stringJson)))
+        self.end_headers()
+        self.wfile.write(stringJson)
+
+    def getStudyDicomStudies(self, account, studyIdentifier):
+        """Report DICOM studies annotated in eCRFs of all study (site) subjects
+        """
+        # OC REST login requires clear text password
+        clearpass = self.headers.getheader("Clearpass")
+
+        # Read partner site of logged user
+        baseUrl = account.partnersite.edc.soapbaseurl
+
+        session = self.svcDb.ocSession()
+        passwordHash = self.svcDb.getAccountPasswordHash(session, account.ocusername)
+
+        # Connection artifact to users main OpenClinica SOAP, clients of user are reused between requests
+        ocConnectInfo = OCConnectInfo(baseUrl, account.ocusername, passwordHash)
+        if self.server.ocWebServices is not None:
+            svcOcWebServices = self.server.ocWebServices.acquire(ocConnectInfo)
+            reusable = False
+            try:
+                self._reportStudyDicomStudies(account, studyIdentifier, clearpass, ocConnectInfo, svcOcWebServices)
+                reusable = True
+            finally:
+                # Client with failed call is not reused (its connections can be broken)
+                self.server.ocWebServices.release(ocConnectInfo, svcOcWebServices, reusable)
         else:
-            self.logger.info("GET - not authenticated.")
-            self.send_response(403)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers
+            self._reportStudyDicomStudies(account, studyIdentifier, clearpass, ocConnectInfo, OCWebServices(ocConnectInfo))
 
-        self.svcDb.Session.remove()
+    def _reportStudyDicomStudies(self, account, studyIdentifier, clearpass, ocConnectInfo, svcOcWebServices):
+        """Report DICOM studies annotated in eCRFs of all study (site) subjects with SOAP client of user
+        """
+        # Is it parent study or study site
+        selectedStudy = None
+        selectedSite = None
+        success, studies = svcOcWebServices.listAllStudies()
+
+        if success:
+            self.logger.debug("SOAP studies size: " + str(len(studies)))
+            selectedStudy = first.first(study for study in studies if study.identifier().encode("utf-8") == studyIdentifier)
+
+        # Site was selected
+        if selectedStudy is None:
+            for s in studies:
+                if s.sites:
+                    for site in s.sites:
+                        if site.identifier == studyIdentifier:
+                            selectedSite = site
+                            selectedStudy = s
+                            break
+
+        # Subjects of whole study or only site if it is multicentre study
+        # oid is study OID (monocentre study) or site study OID (multi-centre study)
+        isMultiCentre = selectedSite is not None
+        if isMultiCentre:
+            oid = selectedSite.oid
+        else:
+            oid = selectedStudy.oid()
 
-        return
+        self._svcOcRestfulService = OCRestfulService(account.ocusername, clearpass, self.server.ocSessions)
+
+        # ORM objects of request session are used only in request thread, fanout threads get plain values
+        edcBaseUrl = account.partnersite.edc.edcbaseurl
+
+        # Study metadata, SOAP subjects, REST casebook and DICOM annotations are independent remote calls
+        bootstrap = TaskGraph(self.server.fanout)
+        bootstrap.add("metadata", lambda: self._loadStudyMetadata(ocConnectInfo, svcOcWebServices, selectedStudy))
+        if isMultiCentre:
+            bootstrap.add("subjects", lambda: svcOcWebServices.listAllStudySubjectsByStudySite([selectedStudy, selectedSite, None]))
+        else:
+            # Subjects are listed without metadata and their events are enhanced when both are available
+            bootstrap.add("subjectsSoap", lambda: svcOcWebServices.listAllStudySubjectsByStudy([selectedStudy, None]))
+            bootstrap.add("subjects", lambda subjects, metadata: svcOcWebServices.addStudySubjectsMetadata(subjects, metadata[0]), ["subjectsSoap", "metadata"])
+        bootstrap.add("casebook", lambda: self._svcOcRestfulService.getStudyCasebook(edcBaseUrl, oid))
+        bootstrap.add("dicomAnnotations", lambda: self._loadDicomAnnotations(selectedStudy))
+        bootstrap.add("crfItemValues", lambda dicomAnnotations: self._loadCrfItemValues(oid, dicomAnnotations), ["dicomAnnotations"])
+
+        try:
+            results = bootstrap.run(self.clientDisconnected)
+        except Cancelled, err:
+            self.logger.info("Client disconnected, DICOM studies listing cancelled: " + str(err))
+            self.close_connection = 1
+            return
+
+        path, duration = bootstrap.criticalPath()
+        self.logger.debug("DICOM studies bootstrap critical path " + " > ".join(path) + ": " + str(int(duration * 1000)) + " ms")
+
+        metadataIndex = results["metadata"][1]
+        subjects = results["subjects"]
+        casebook = results["casebook"]
+        dicomAnnotations = results["dicomAnnotations"]
+        crfItemValues = results["crfItemValues"]
+
+        self.logger.debug("SOAP subjects count: " + str(len(subjects)))
+
+        # Subjects has to be enhanced with values from REST services (whole study casebook is fetched once)
+        subjectsREST = casebook.subjectList()
+        self.logger.debug("REST subjects count: " + str(len(subjectsREST)))
+
+        # Synchronise subjects
+        for ss in subjects:
+            for sREST in subjectsREST:
+                if sREST.studySubjectId == ss.label():
+                    ss.oid = sREST.oid
+
+        serverieUrls = self._subjectServerieUrls(account, isMultiCentre, subjects)
+
+        stringJson = '{ "Patients": [ '
+
+        # Subjects are enriched concurrently (bounded per request), JSON keeps the order of subjects
+        try:
+            patients = self.server.fanout.map(
+                lambda subject: self._subjectDicomStudiesJson(edcBaseUrl, oid, casebook, dicomAnnotations, crfItemValues, metadataIndex, serverieUrls.get(subject.subject.uniqueIdentifier), subject),
+                subjects,
+                ConfigDetails().rpbFanoutConcurrency,
+                self.clientDisconnected
+            )
+        except Cancelled, err:
+            self.logger.info("Client disconnected, DICOM studies listing cancelled: " + str(err))
+            self.close_connection = 1
+            return
+
+        stringJson = stringJson + ', '.join(patients)
+
+        # End patients array, end json root
+        stringJson = stringJson + '] }'
+
+        self.logger.debug(stringJson)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(stringJson)))
+        self.end_headers()
+        self.wfile.write(stringJson)
+
+    def _loadStudyMetadata(self, ocConnectInfo, svcOcWebServices, study):
+        """ODM metadata of study and its parsed index, from shared cache when it is enabled
+        """
+        if self.server.studyMetadata is None:
+            odm = self._fetchStudyMetadata(svcOcWebServices, study)
+            if odm is None:
+                return None, None
+            return odm, self._svcOdmMetaData.indexMetadata(odm)
+
+        metadata = self.server.studyMetadata.get(
+            (ocConnectInfo.baseUrl, study.identifier()),
+            lambda: self._fetchStudyMetadata(svcOcWebServices, study),
+            lambda: self._refreshStudyMetadata(ocConnectInfo, study)
+        )
+        if metadata is None:
+            return None, None
+
+        return metadata.odm, metadata.index()
+
+    def _fetchStudyMetadata(self, svcOcWebServices, study):
+        """ODM metadata of study from OC SOAP or None
+        """
+        success, odm = svcOcWebServices.getStudyMetadata(study)
+        if not success:
+            return None
+
+        return odm
+
+    def _refreshStudyMetadata(self, ocConnectInfo, study):
+        """ODM metadata of study for background refresh, SOAP client of request is not shared
+        """
+        if self.server.ocWebServices is None:
+            return self._fetchStudyMetadata(OCWebServices(ocConnectInfo), study)
+
+        svcOcWebServices = self.server.ocWebServices.acquire(ocConnectInfo)
+        reusable = False
+        try:
+            odm = self._fetchStudyMetadata(svcOcWebServices, study)
+            reusable = True
+        finally:
+            self.server.ocWebServices.release(ocConnectInfo, svcOcWebServices, reusable)
+
+        return odm
+
+    def _loadDicomAnnotations(self, selectedStudy):
+        """DICOM annotations of eCRF items defined for the RPB study of OC study
+
+        Runs on fanout thread, so it uses own session (not thread local one of request) which is
+        closed before returning. Annotations are returned as plain CrfDicomFields without value.
+        """
+        session = self.svcDb.Session.session_factory()
+        try:
+            study = self.svcDb.getStudyByOcIdentifier(session, selectedStudy.identifier())
+
+            return [
+                CrfDicomField(
+                    a.crfitemoid,
+                    None,
+                    a.annotationtype.name,
+                    a.eventdefinitionoid,
+                    a.formoid,
+                    a.groupoid
+                )
+                for a in self.svcDb.getDicomStudyCrfAnnotationsForStudy(session, study.id)
+            ]
+        finally:
+            session.close()
+
+    def _loadCrfItemValues(self, oid, dicomAnnotations):
+        """Values of annotated eCRF items for all subjects and events of study (site) at once
+        """
+        session = self.svcDb.ocSession()
+        try:
+            return self.svcDb.getCrfItemValuesForStudy(
+                session,
+                oid,
+                [(a.eventOid, a.formOid, a.oid) for a in dicomAnnotations]
+            )
+        finally:
+            session.close()
+
+    def _subjectServerieUrls(self, account, isMultiCentre, subjects):
+        """Public URL of serverie of partner site for each subject unique identifier (resolved in request thread)
+
+        Site of multicentre study subject is according site identifier in subject pseudonym
+        """
+        if not isMultiCentre:
+            publicUrl = account.partnersite.serverie.publicurl
+            return dict((subject.subject.uniqueIdentifier, publicUrl) for subject in subjects)
+
+        session = self.svcDb.Session()
+        siteUrls = {}
+        serverieUrls = {}
+
+        for subject in subjects:
+            identifier = self.getPartnerSiteIdentifier(subject.subject.uniqueIdentifier)
+            if identifier not in siteUrls:
+                site = self.svcDb.getPartnerSiteByIdentifier(session, identifier)
+                siteUrls[identifier] = site.serverie.publicurl if site is not None and site.serverie is not None else None
+
+            serverieUrls[subject.subject.uniqueIdentifier] = siteUrls[identifier]
+
+        return serverieUrls
+
+    def _subjectDicomStudiesJson(self, edcBaseUrl, oid, casebook, dicomAnnotations, crfItemValues, metadataIndex, serverieUrl, subject):
+        """Patient JSON with DICOM studies annotated in eCRFs of one subject (executed concurrently for subjects of study)
+
+        Runs on fanout thread so it gets only plain values (no ORM objects bound to session of request)
+        """
+        # Events values has to be enhanced with values from REST services
+        if casebook.subject(subject.oid) is not None:
+            eventsREST = casebook.subjectEvents(subject.oid)
+        elif subject.oid:
+            # Subject missing in study casebook (e.g. added meanwhile) is requested alone
+            eventsREST = self._svcOcRestfulService.getStudyCasebookEvents([edcBaseUrl, oid, subject.oid])
+        else:
+            eventsREST = []
+        self.logger.debug("REST events count: " + str(len(eventsREST)))
+
+        stringJson = '{ '
+        try:
+            # Syncrhonise events, REST event with start date in unknown format cannot be matched
+            for event in subject.events:
+                for e in eventsREST:
+                    if e.startDate is None:
+                        continue
+                    if e.eventDefinitionOID == event.eventDefinitionOID and e.startDate.isoformat() == event.startDate.isoformat():
+                        event.status = e.status
+                        event.studyEventRepeatKey = e.studyEventRepeatKey
+                        event.setForms(e.forms)
+
+            stringJson = stringJson + '"SubjectKey": "' + subject.oid + '", '
+            stringJson = stringJson + '"StudySubjectID": "' + subject.label() + '", '
+            stringJson = stringJson + '"UniqueIdentifier": "' + subject.subject.uniqueIdentifier + '", '
+            stringJson = stringJson + '"Studies": [ '
+
+            j = 0
+            for event in subject.events:
+                for crfAnnotation in dicomAnnotations:
+                    if crfAnnotation.eventOid == event.eventDefinitionOID:
+                        if event.hasScheduledCrf(crfAnnotation.formOid):
+
+                            # Study instace uids data
+                            value = crfItemValues.get((
+                                subject.subject.uniqueIdentifier,
+                                event.eventDefinitionOID,
+                                str(event.studyEventRepeatKey),
+                                crfAnnotation.formOid,
+                                crfAnnotation.oid
+                            ), "")
+
+                            # Only when there is actually some data
+                            if value is not None and value is not "":
+                                if serverieUrl is None:
+                                    raise ValueError("Partner site of subject " + subject.subject.uniqueIdentifier + " is not known")
+
+                                self.logger.debug("DICOM StudyInstanceUID according to eCRF annotation: " + str(value))
+                                field = CrfDicomField(
+                                    crfAnnotation.oid,
+                                    value,
+                                    crfAnnotation.annotationType,
+                                    crfAnnotation.eventOid,
+                                    crfAnnotation.formOid,
+                                    crfAnnotation.groupOid
+                                )
+
+                                # Load label from metadata
+                                itemMeta = self._svcOdmMetaData.loadCrfItem(crfAnnotation.formOid, crfAnnotation.oid, metadataIndex)
+                                if itemMeta is not None:
+                                    self.logger.debug("DICOM StudyInstanceUID eCRF label: " + itemMeta.label)
+                                    field.label = itemMeta.label
+
+
+                                # Starting new DICOM study
+                                if j == 0:
+                                    stringJson = stringJson + '{ '
+                                else:
+                                    stringJson = stringJson + ', { '
+
+                                stringJson = stringJson + '"StudyInstanceUid": "' + value + '"'
+                                stringJson = stringJson + ', "StudyEventOid": "' + field.eventOid + '"'
+                                stringJson = stringJson + ', "ItemOid": "' + field.oid + '"'
+                                stringJson = stringJson + ', "Label": "' + field.label + '"'
+
+                                # subject serverie public URL + application (for request routing)
+                                # e.g. https://radplanbio.uniklinikum-dresden.de/serverieDD/
+                                stringJson = stringJson + ', "WebApiUrl" : "' + serverieUrl + '/api/v1/patients/' + subject.subject.uniqueIdentifier + '/dicomStudies/' + value + '"'
+
+                                stringJson = stringJson + '}'
+                                j = j + 1
+
+                                self.logger.debug(stringJson)
+                            else:
+                                 self.logger.debug("No UID imported into eCRF.")
+        except Exception, err:
+            self.logger.error(str(err))
+
+        # End studies array, end patient
+        return stringJson + '] }'
+
+ #######   ######
+##     ## ##    ##
+##     ## ##
+##     ## ##
+##     ## ##
+##     ## ##    ##
+ #######   ######
+
+    def getCrfItemValueV1(self, account, studySiteOid, subjectPid, studyEventOid, formOid, itemOid):
+        """Report eCRF item value
+        """
+        session = self.svcDb.ocSession()
+        value = self.svcDb.getCrfItemValueV1(session, studySiteOid, subjectPid, studyEventOid, formOid, itemOid)
+
+        dic = { "itemOid" : itemOid, "itemValue" : value }
+        result = json.dumps(dic)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def getCrfItemValueV2(self, account, studySiteOid, subjectPid, studyEventOid, studyEventRepeatKey, formOid, itemOid):
+        """Report eCRF item value of repeating study event
+        """
+        session = self.svcDb.ocSession()
+        value = self.svcDb.getCrfItemValueV2(session, studySiteOid, subjectPid, studyEventOid, studyEventRepeatKey, formOid, itemOid)
+
+        dic = { "itemOid" : itemOid, "itemValue" : value }
+        result = json.dumps(dic)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def getOCAccoutPasswordHash(self, account):
+        """Report OC password hash of authenticated user
+        """
+        session = self.svcDb.ocSession()
+        passwordHash = self.svcDb.getAccountPasswordHash(session, account.ocusername)
+
+        dic = { "ocPasswordHash" : passwordHash }
+        result = json.dumps(dic)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def getOCStudyByIdentifier(self, account, ocStudyIdentifer):
+        """Report OC study according to its identifier
+        """
+        session = self.svcDb.ocSession()
+        study = self.svcDb.getOCStudyByIdentifier(session, ocStudyIdentifer)
+
+        if study is not None:
+            serializer = OCStudySerializer()
+            dic = serializer.serialize(study)
+            result = json.dumps(dic)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
+
+    def getUserActiveStudy(self, account, ocUsername):
+        """Report active OC study of user
+        """
+        session = self.svcDb.ocSession()
+        study = self.svcDb.getUserActiveStudy(session, ocUsername)
+
+        if study is not None:
+            serializer = OCStudySerializer()
+            dic = serializer.serialize(study)
+            result = json.dumps(dic)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(result)))
+            self.end_headers()
+            self.wfile.write(result)
+
+    def changeUserActiveStudy(self, account, ocUsername, newActiveStudyId):
+        """Change active OC study of user
+        """
+        session = self.svcDb.ocSession()
+        updateResult = self.svcDb.changeUserActiveStudy(session, ocUsername, newActiveStudyId)
+
+        result = '{ "result":' + str(updateResult).lower()  + ' }'
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+########   #######  ##     ## ######## ########  ######
+##     ## ##     ## ##     ##    ##    ##       ##    ##
+##     ## ##     ## ##     ##    ##    ##       ##
+########  ##     ## ##     ##    ##    ######    ######
+##   ##   ##     ## ##     ##    ##    ##             ##
+##    ##  ##     ## ##     ##    ##    ##       ##    ##
+##     ##  #######   #######     ##    ########  ######
+
+# Route table: HTTP method, path template, request handler
+ROUTES = [
+    # DICOM
+    ("POST", "/api/v1/uploadDicomData", SecureHTTPRequestHandler.uploadDicomData),
+    ("POST", "/api/v1/uploadDicomFile/{filename}", SecureHTTPRequestHandler.uploadDicomFile),
+    ("POST", "/api/v1/uploadDicomBatch", SecureHTTPRequestHandler.uploadDicomBatch),
+    ("POST", "/api/v1/ingestJobs/{filename}", SecureHTTPRequestHandler.submitIngestJob),
+    ("GET", "/api/v1/ingestJobs/{jobId}", SecureHTTPRequestHandler.getIngestJob),
+    # Pull
+    ("POST", "/api/v1/addPullDataRequest", SecureHTTPRequestHandler.addPullDataRequest),
+    # Account
+    ("GET", "/api/v1/authenticateUser", SecureHTTPRequestHandler.authenticateUser),
+    ("GET", "/api/v1/getMyDefaultAccount", SecureHTTPRequestHandler.getMyDefaultAccount),
+    # Study
+    ("GET", "/api/v1/getStudyByOcIdentifier/{ocIdentifier}", SecureHTTPRequestHandler.getStudyByOcIdentifier),
+    # RTStruct
+    ("GET", "/api/v1/getAllRTStructs", SecureHTTPRequestHandler.getAllRTStructs),
+    # CRF annotations
+    ("GET", "/api/v1/getCrfFieldsAnnotationForStudy/{studyid}", SecureHTTPRequestHandler.getCrfFieldsAnnotationForStudy),
+    ("GET", "/api/v1/getDicomStudyCrfAnnotationsForStudy/{studyid}", SecureHTTPRequestHandler.getDicomStudyCrfAnnotationsForStudy),
+    ("GET", "/api/v1/getDicomPatientCrfAnnotationsForStudy/{studyid}", SecureHTTPRequestHandler.getDicomPatientCrfAnnotationsForStudy),
+    ("GET", "/api/v1/getDicomReportCrfAnnotationsForStudy/{studyid}", SecureHTTPRequestHandler.getDicomReportCrfAnnotationsForStudy),
+    # Partner site
+    ("GET", "/api/v1/getAllPartnerSites", SecureHTTPRequestHandler.getAllPartnerSites),
+    ("GET", "/api/v1/getAllPartnerExceptName/{exceptSiteName}", SecureHTTPRequestHandler.getAllPartnerExceptName),
+    ("GET", "/api/v1/getPartnerSiteByName/{siteName}", SecureHTTPRequestHandler.getPartnerSiteByName),
+    ("GET", "/api/v1/getMySite", SecureHTTPRequestHandler.getMySite),
+    # Software
+    ("GET", "/api/v1/getLatestSoftware/{name}", SecureHTTPRequestHandler.getLatestSoftware),
+    ("GET", "/api/v1/getServerStatistics", SecureHTTPRequestHandler.getServerStatistics),
+    # PACS
+    ("GET", "/api/v1/getAllDicomStudies", SecureHTTPRequestHandler.getAllDicomStudies),
+    ("GET", "/api/v1/getDicomStudiesByPatientId/{patientId}", SecureHTTPRequestHandler.getDicomStudiesByPatientId),
+    ("GET", "/api/v1/patients/{dicomPatientId}/dicomStudies/{dicomStudyInstaceUid}/dcm/{filename}", SecureHTTPRequestHandler.getPatientDicomStudyFile),
+    ("GET", "/api/v1/patients/{dicomPatientId}/dicomStudies/{dicomStudyInstaceUid}/clean", SecureHTTPRequestHandler.cleanPatientDicomStudy),
+    ("GET", "/api/v1/patients/{dicomPatientId}/dicomStudies/{dicomStudyInstaceUid}/unzip", SecureHTTPRequestHandler.unzipPatientDicomStudy),
+    ("GET", "/api/v1/studies/{studyIdentifier}/dicomStudies", SecureHTTPRequestHandler.getStudyDicomStudies),
+    # OC
+    ("GET", "/api/v1/getCrfItemValue/{studySiteOid}/{subjectPid}/{studyEventOid}/{formOid}/{itemOid}", SecureHTTPRequestHandler.getCrfItemValueV1),
+    ("GET", "/api/v2/getCrfItemValue/{studySiteOid}/{subjectPid}/{studyEventOid}/{studyEventRepeatKey}/{formOid}/{itemOid}", SecureHTTPRequestHandler.getCrfItemValueV2),
+    ("GET", "/api/v1/getOCAccoutPasswordHash", SecureHTTPRequestHandler.getOCAccoutPasswordHash),
+    ("GET", "/api/v1/getOCStudyByIdentifier/{ocStudyIdentifer}", SecureHTTPRequestHandler.getOCStudyByIdentifier),
+    ("GET", "/api/v1/getUserActiveStudy/{ocUsername}", SecureHTTPRequestHandler.getUserActiveStudy),
+    ("GET", "/api/v1/changeUserActiveStudy/{ocUsername}/{newActiveStudyId:int}", SecureHTTPRequestHandler.changeUserActiveStudy),
+]
+
+# Compiled once per process, shared by all request handler instances
+SecureHTTPRequestHandler.router = Router()
+for method, template, handler in ROUTES:
+    SecureHTTPRequestHandler.router.add(method, template, handler)
 
  ######  ########    ###    ########  ########
 ##    ##    ##      ## ##   ##     ##    ##
@@ -1247,14 +2009,17 @@ class SecureHTTPRequestHandler(SimpleHTTPRequestHandler):
 ##    ##    ##    ##     ## ##    ##     ##
  ######     ##    ##     ## ##     ##    ##
 
-def startServer(HandlerClass = SecureHTTPRequestHandler, ServerClass = ThreadingHTTPSServer):
+def startServer(HandlerClass = SecureHTTPRequestHandler, ServerClass = PooledHTTPSServer):
     """startServer function
 
     SecureHTTPRequestHander - main sever request handler logic
-    ThreadingHTTPSServer - server class
+    PooledHTTPSServer - server class
     """
+    # Logging is configured once per process (reloaded on SIGHUP)
+    LoggingBootstrap.configure("logging.ini")
+    LoggingBootstrap.installReloadSignal()
+
     logger = logging.getLogger(__name__)
-    logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
     # Server info  
     logger.info(ConfigDetails().name)
@@ -1273,19 +2038,93 @@ def startServer(HandlerClass = SecureHTTPRequestHandler, ServerClass = Threading
                     ConfigDetails().rpbHost = appConfig.get(section)["host"]
                 if appConfig.hasOption(section, "port"):
                     ConfigDetails().rpbPort = int(appConfig.get(section)["port"])
+                if appConfig.hasOption(section, "processes"):
+                    ConfigDetails().rpbProcesses = int(appConfig.get(section)["processes"])
 
                 # Server address as touple ip address, port
                 serverAddress = (ConfigDetails().rpbHost, ConfigDetails().rpbPort)
-                httpd = ServerClass(serverAddress, HandlerClass)
 
-                # Get socket info
-                sa = httpd.socket.getsockname()
-                
-                # Init info               
-                logger.info("Server serving HTTPS on " + sa[0] + " port " + str(sa[1]) + " ...")
+                # Pre-fork mode (fork is not available on Windows)
+                if ConfigDetails().rpbProcesses > 1 and hasattr(os, "fork"):
+                    listeningSocket = bindSslSocket(serverAddress)
+
+                    # Get socket info
+                    sa = listeningSocket.getsockname()
+
+                    # Init info
+                    logger.info("Server serving HTTPS on " + sa[0] + " port " + str(sa[1]) + " with " + str(ConfigDetails().rpbProcesses) + " processes ...")
+
+                    # Services and DB connections are created in every worker process after fork
+                    supervisor = PreforkSupervisor(
+                        ConfigDetails().rpbProcesses,
+                        lambda: serveWorker(ServerClass, serverAddress, HandlerClass, listeningSocket)
+                    )
+                    supervisor.run()
+                else:
+                    if ConfigDetails().rpbProcesses > 1:
+                        logger.warning("Pre-fork mode is not supported on this platform, serving with one process.")
+
+                    httpd = ServerClass(serverAddress, HandlerClass)
+
+                    # SIGHUP also forgets cached credentials (pre-forked workers are restarted instead)
+                    installAuthenticationCacheSignal(httpd)
+
+                    # Get socket info
+                    sa = httpd.socket.getsockname()
+
+                    # Init info
+                    logger.info("Server serving HTTPS on " + sa[0] + " port " + str(sa[1]) + " ...")
+
+                    # Run infinite server body loop
+                    httpd.serve_forever()
+
+def installAuthenticationCacheSignal(httpd):
+    """Invalidate authentication cache on SIGHUP in addition to logging reload (not available on Windows)
+    """
+    if not hasattr(signal, "SIGHUP") or httpd.authCache is None:
+        return
+
+    reloadLogging = signal.getsignal(signal.SIGHUP)
+
+    def reload(signum, frame):
+        # Signal handler runs in main thread, cache lock is taken in background
+        threading.Thread(target=httpd.authCache.invalidate).start()
+        if callable(reloadLogging):
+            reloadLogging(signum, frame)
+
+    signal.signal(signal.SIGHUP, reload)
+
+def serveWorker(ServerClass, serverAddress, HandlerClass, listeningSocket):
+    """Server body of pre-forked worker process
+
+    SIGTERM stops accepting new connections, requests in progress are finished
+    """
+    httpd = ServerClass(serverAddress, HandlerClass, listeningSocket)
+
+    # shutdown() waits for serve_forever loop which runs in this (main) thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
+
+    httpd.serve_forever()
+
+    if isinstance(httpd, WorkerPoolMixIn):
+        httpd.stopWorkers()
+
+    if httpd.ingestionJobs is not None:
+        httpd.ingestionJobs.stop()
+
+    httpd.fanout.stop()
+
+    if httpd.correctionPool is not None:
+        httpd.correctionPool.stop()
+
+    if httpd.importVerifier is not None:
+        httpd.importVerifier.stop()
+
+    if httpd.storePool is not None:
+        httpd.storePool.close()
 
-                # Run infinite server body loop
-                httpd.serve_forever()
+    if httpd.ocWebServices is not None:
+        httpd.ocWebServices.close()
 
 def main():
     """Main function
@@ -17,7 +17,6 @@ from ConfigParser import *
 
 # Logging
 import logging
-import logging.config
 
  ######  ######## ########  ##     ## ####  ######  ######## 
 ##    ## ##       ##     ## ##     ##  ##  ##    ## ##       
@@ -38,9 +37,8 @@ class AppConfigurationService(object):
     def __init__(self, configFileName="radplanbio-server.cfg"):
         """Default Constructor
         """
-        # Setup logger - use config file
+        # Setup logger
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         self._logger.info("Reading config file: " + configFileName)
         self.configFileName = configFileName
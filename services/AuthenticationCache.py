@@ -0,0 +1,155 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import hashlib, threading, time
+
+# Collections
+from collections import OrderedDict
+
+# Logging
+import logging
+
+ ######  ######## ########  ##     ## ####  ######  ########
+##    ## ##       ##     ## ##     ##  ##  ##    ## ##
+##       ##       ##     ## ##     ##  ##  ##       ##
+ ######  ######   ########  ##     ##  ##  ##       ######
+      ## ##       ##   ##    ##   ##   ##  ##       ##
+##    ## ##       ##    ##    ## ##    ##  ##    ## ##
+ ######  ######## ##     ##    ###    ####  ######  ########
+
+class AuthenticationCache(object):
+    """In-process cache of verified request credentials
+
+    Maps (username, credential digest) to detached DefaultAccount snapshot
+    (including partner site, PACS, serverie and EDC) of authenticated user.
+    Entries expire after TTL seconds and the least recently used entries are
+    evicted when the cache is full.
+    """
+
+    def __init__(self, ttl=60, maxSize=1024):
+        """Default constructor
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.ttl = ttl
+        self.maxSize = maxSize
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def get(self, username, password):
+        """Get account snapshot for credentials or None when not cached
+        """
+        if username is None or password is None:
+            return None
+
+        key = self._key(username, password)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            account, expires = entry
+            if expires < time.time():
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            # Most recently used entries are at the end
+            self._entries[key] = entry
+            self.hits += 1
+
+            return account
+
+    def put(self, username, password, account):
+        """Store account snapshot of successfully verified credentials
+        """
+        if username is None or password is None:
+            return
+
+        key = self._key(username, password)
+
+        with self._lock:
+            # Credentials of user changed, older entries are not valid anymore
+            for k in [k for k in self._entries if k[0] == username and k != key]:
+                del self._entries[k]
+                self.invalidations += 1
+
+            self._entries.pop(key, None)
+            self._entries[key] = (account, time.time() + self.ttl)
+
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username=None):
+        """Remove cached entries of user or all entries (e.g. revoked account, changed portal password)
+
+        Returns number of removed entries
+        """
+        with self._lock:
+            if username is None:
+                keys = self._entries.keys()
+            else:
+                keys = [k for k in self._entries if k[0] == username]
+
+            for k in keys:
+                del self._entries[k]
+
+            self.invalidations += len(keys)
+
+        self._logger.info("Authentication cache invalidated entries: " + str(len(keys)))
+
+        return len(keys)
+
+    def statistics(self):
+        """Cache counters for monitoring
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxSize": self.maxSize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _key(self, username, password):
+        """Cache key, the credential itself is kept only as a digest
+        """
+        return (username, hashlib.sha256(username + "\0" + password).hexdigest())
@@ -6,19 +6,18 @@
  ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
 #### ##     ## ##         #######  ##     ##    ##     ######
 
-# HTTP
-import requests
-
 # Standard
 import os
 
 # Logging
 import logging
-import logging.config
 
 # Contexts
 from contexts.ConfigDetails import ConfigDetails
 
+# Utils
+from utils.HttpSessionPool import HttpSessionPool
+
  ######  ######## ########  ##     ## ####  ######  ########
 ##    ## ##       ##     ## ##     ##  ##  ##    ## ##
 ##       ##       ##     ## ##     ##  ##  ##       ##
@@ -31,14 +30,26 @@ class ConquestService:
     """Conquest PACS communication service
     """
 
-    def __init__(self):
+    def __init__(self, sessionPool=None):
         """Default constructor
+
+        Param sessionPool is HttpSessionPool shared with other PACS clients (optional)
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig('logging.ini', disable_existing_loggers=False)
 
         self._pacsMethodPrefix = "?mode="
 
+        # Keep-alive connections to PACS web servers
+        if sessionPool is None:
+            sessionPool = HttpSessionPool(
+                ConfigDetails().pacsPoolSize,
+                ConfigDetails().pacsConnectTimeout,
+                ConfigDetails().pacsReadTimeout,
+                ConfigDetails().pacsRetries,
+                { "Content-Type": "application/json", "Content-Length": "0" }
+            )
+        self._sessionPool = sessionPool
+
 ##     ## ######## ######## ##     ##  #######  ########   ######
 ###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
 #### #### ##          ##    ##     ## ##     ## ##     ## ##
@@ -70,10 +81,33 @@ class ConquestService:
 
         return result
 
+    def seriesInstances(self, pacsBaseUrl, patientID, studyInstanceUID, seriesInstanceUID):
+        """List SOP instance UIDs of series stored within PACS database
+
+        Conquest web server mode rpbseriesinstances answers {"SopUIDs": [...]}
+        Returns list of SOP instance UIDs or None when the PACS cannot answer the query
+        """
+        result = None
+        method = "rpbseriesinstances"
+
+        url = pacsBaseUrl + self._pacsMethodPrefix + method
+        url += "&PatientID=" + patientID
+        url += "&StudyUID=" + studyInstanceUID
+        url += "&SeriesUID=" + seriesInstanceUID
+
+        try:
+            response = self._httpGetRequest(url)
+            if response.status_code == 200:
+                result = [str(sopInstanceUID) for sopInstanceUID in response.json()["SopUIDs"]]
+        except Exception as err:
+            self._logger.error("PACS series query failed: " + str(err))
+
+        return result
+
     def getAllStudies(self, pacsBaseUrl):
         """Get list of all DICOM studies within PACS
         """
-        results = None
+        result = None
         method = "radplanbiostudies"
 
         url = pacsBaseUrl + self._pacsMethodPrefix + method
@@ -81,17 +115,39 @@ class ConquestService:
         try:
             response = self._httpGetRequest(url)
             if response.status_code == 200:
-                results = response.json()
-                result = True
+                result = response.json()
         except Exception as err:
             self._logger.error("Failed to communicate with PACS: " + str(err))
 
         return result
 
+    def getPatientStudies(self, pacsBaseUrl, patientID):
+        """Get list of DICOM studies of patient within PACS
+        """
+        result = None
+        method = "radplanbiostudies"
+
+        url = pacsBaseUrl + self._pacsMethodPrefix + method
+        url += "&patientidmatch=" + patientID
+
+        try:
+            response = self._httpGetRequest(url)
+            if response.status_code == 200:
+                result = response.json()
+        except Exception as err:
+            self._logger.error("Failed to communicate with PACS: " + str(err))
+
+        return result
+
+    def statistics(self):
+        """PACS connection counters for monitoring
+        """
+        return self._sessionPool.statistics()
+
     def downloadDicomStudy(self, pacsBaseUrl, patientID, studyInstanceUID, path):
         """Send a http request to Conquest web server in order to invoke download of the study
         """
-        results = None
+        result = None
         method = "zipstudy"
         dum = ".zip"
 
@@ -113,16 +169,19 @@ class ConquestService:
 
             with open(localFilename, "wb") as handle:
 
-                response = self._httpGetRequest(url)
+                # Zip is written while it is received, the connection is released afterwards
+                response = self._httpGetRequest(url, stream=True)
+                try:
+                    if response.status_code == 200:
+                        self._logger.debug("Zip request OK.")
 
-                if response.status_code == 200:
-                    self._logger.debug("Zip request OK.")
+                        for block in response.iter_content(65536):
+                            if not block:
+                                break
 
-                    for block in response.iter_content(1024):
-                        if not block:
-                            break
-
-                        handle.write(block)
+                            handle.write(block)
+                finally:
+                    response.close()
 
                 result = localFilename
 
@@ -144,14 +203,7 @@ class ConquestService:
 ##        ##    ##   ##    ## ##   ##     ##    ##    ##       
 ##        ##     ## ####    ###    ##     ##    ##    ######## 
 
-    def _httpGetRequest(self, url):
-        """HTTP get request to Conquect PACS
+    def _httpGetRequest(self, url, stream=False):
+        """HTTP get request to Conquect PACS (pooled keep-alive connection)
         """
-        contentLength = 0
-
-        session = requests.Session()
-        session.headers.update({ "Content-Type": "application/json",  "Content-Length": contentLength })
-
-        response = session.get(url, verify=False)
-
-        return response
\ No newline at end of file
+        return self._sessionPool.get(url, stream=stream)
@@ -834,6 +834,79 @@ class DataPersistanceService():
 
         return value
 
+    def getCrfItemValuesForStudy(self, session, studySiteOid, annotations):
+        """Get values of annotated OpenClinica eCRF fields for all subjects of study (site) at once
+
+        Param annotations is list of (study event OID, form OID, item OID) triples
+        Returns dict (subjectPid, studyEventOid, studyEventRepeatKey, formOid, itemOid) -> value
+        Repeat key is string (as in REST casebook), the last row wins as in getCrfItemValueV2
+        """
+        values = {}
+
+        annotations = list(set(annotations))
+        if len(annotations) == 0:
+            return values
+
+        # One bind parameter triple per annotation
+        params = { "studySiteOid": studySiteOid }
+        triples = []
+        for n, annotation in enumerate(annotations):
+            triples.append("(:e%d, :f%d, :i%d)" % (n, n, n))
+            params["e%d" % n], params["f%d" % n], params["i%d" % n] = annotation
+
+        # Only item value is used, so response set decode subquery of v2 is not joined
+        rawQuery = """select
+            s.unique_identifier as SubjectPID,
+            sed.oc_oid as SEOid,
+            se.sample_ordinal as SERepeat,
+            cv.oc_oid as FormOid,
+            i.oc_oid as ItemOid,
+            id.value as ItemValue
+
+            from study st
+            inner join study_subject ss
+                on st.study_id = ss.study_id
+            inner join subject s
+                on ss.subject_id = s.subject_id
+            inner join study_event se
+                on ss.study_subject_id = se.study_subject_id
+            inner join study_event_definition sed
+                on se.study_event_definition_id = sed.study_event_definition_id
+            inner join event_crf ec
+                on se.study_event_id = ec.study_event_id
+            inner join crf_version cv
+                on ec.crf_version_id = cv.crf_version_id
+            inner join event_definition_crf edc
+                on cv.crf_id = edc.crf_id
+                and se.study_event_definition_id = edc.study_event_definition_id
+            inner join item_form_metadata ifm
+                on cv.crf_version_id = ifm.crf_version_id
+            inner join item i
+                on ifm.item_id = i.item_id
+            left join item_data id
+                on ec.event_crf_id = id.event_crf_id
+                and i.item_id = id.item_id
+
+            where st.oc_oid = :studySiteOid and
+                (sed.oc_oid, cv.oc_oid, i.oc_oid) in (""" + ", ".join(triples) + """)
+                order by
+                ss.study_subject_id,
+                sed.ordinal,
+                se.sample_ordinal,
+                edc.ordinal,
+                id.ordinal,
+                ifm.ordinal"""
+
+        conn = session.connection()
+        result = conn.execute(text(rawQuery), params)
+
+        for row in result:
+            values[(row[0], row[1], str(row[2]), row[3], row[4])] = row[5] # ItemValue
+
+        conn.close()
+
+        return values
+
     def getCrfItemValueV1(self, session, studySiteOid, subjectPid, studyEventOid, formOid, itemOid):
         """Get a value from OpenClinica eCRF field v1
         """
@@ -977,6 +1050,26 @@ class DataPersistanceService():
 
         return account
 
+    def detachDefaultAccount(self, session, account):
+        """Load default account with partner site details and detach it from session
+
+        Detached account can be used after the session is removed (e.g. cached)
+        """
+        instances = [account]
+
+        site = account.partnersite
+        if site is not None:
+            instances.append(site)
+            for related in [site.serverie, site.pacs, site.portal, site.pidg, site.edc]:
+                if related is not None:
+                    instances.append(related)
+
+        for instance in instances:
+            if instance in session:
+                session.expunge(instance)
+
+        return account
+
 ########     ###    ########  ######## ##    ## ######## ########      ######  #### ######## ########
 ##     ##   ## ##   ##     ##    ##    ###   ## ##       ##     ##    ##    ##  ##     ##    ##
 ##     ##  ##   ##  ##     ##    ##    ####  ## ##       ##     ##    ##        ##     ##    ##
@@ -0,0 +1,369 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# System
+import os, platform
+
+# Logging
+import logging
+
+# PyQt
+from PyQt4 import QtCore
+
+# Contexts
+from contexts.ConfigDetails import ConfigDetails
+
+# Services
+from services.DicomService import DicomService
+
+# Correction
+from correct.mainCorrect import EXITCODES, NOFASTPATHOPTION
+
+# Utils
+from utils.DicomUpperLayer import isSuccess
+from utils.ProcessPool import Degraded
+
+ ######  ######## ########  ##     ## ####  ######  ########
+##    ## ##       ##     ## ##     ##  ##  ##    ## ##
+##       ##       ##     ## ##     ##  ##  ##       ##
+ ######  ######   ########  ##     ##  ##  ##       ######
+      ## ##       ##   ##    ##   ##   ##  ##       ##
+##    ## ##       ##    ##    ## ##    ##  ##    ## ##
+ ######  ######## ##     ##    ###    ####  ######  ########
+
+class DicomIngestionService(object):
+    """Ingestion of received DICOM files
+
+    Received file (already saved in temp folder) is corrected, imported into PACS
+    (C-STORE or PACS import folder) and its presence in PACS is verified
+    """
+
+    def __init__(self, svcPacs, tempDir="temp", correctedDir="corrected", correctionPool=None, correctionCounters=None, storePool=None, importVerifier=None):
+        """Constructor
+
+        Param correctionPool is ProcessPool of warm correction workers (optional)
+        Param correctionCounters are Counters of files per correction class (optional)
+        Param storePool is DicomStoreService with pooled C-STORE associations (optional, storescu otherwise)
+        Param importVerifier is ImportVerificationService shared by handlers (optional, per file polling otherwise)
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self._svcPacs = svcPacs
+        self._svcDicom = DicomService()
+
+        self._tempDir = tempDir
+        self._correctedDir = correctedDir
+        self._correctionPool = correctionPool
+        self._correctionCounters = correctionCounters
+        self._storePool = storePool
+        self._importVerifier = importVerifier
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def ingest(self, dicomFileName, pacsBaseUrl):
+        """Import received DICOM file into PACS
+
+        Returns True when the file was imported (and verified), False when the import failed
+        and "PACS" when the file was sent but it is not present in PACS
+        """
+        tempFile = self._tempDir + os.sep + dicomFileName
+        correctedFile = self._correctedDir + os.sep + dicomFileName
+
+        identifiers = self._svcDicom.readIdentifiers(tempFile)
+        patientId = identifiers.patientId
+        studyUid = identifiers.studyInstanceUid
+        seriesUid = identifiers.seriesInstanceUid
+        sopUid = identifiers.sopInstanceUid
+
+        saveSucessfull = False
+        result = None
+        # Apply DICOM correction before importing to PACS
+        if ConfigDetails().dicomCorrect:
+            self.correct(tempFile, correctedFile)
+
+            # DICOM C-STORE
+            if ConfigDetails().storescuEnabled:
+                # Sent to PACS
+                saveSucessfull = self.store(correctedFile)
+                result = saveSucessfull
+
+            # Copy to PACS import folder
+            else:
+                saveSucessfull = self._svcDicom.importFile(correctedFile, ConfigDetails().rpbIncoming + os.sep + dicomFileName)
+
+                # Remove the corrected file after import
+                if saveSucessfull:
+                    os.remove(correctedFile)
+
+                result = saveSucessfull
+        # Direct import to PACS - without correction
+        else:
+            # DICOM C-STORE
+            if ConfigDetails().storescuEnabled:
+                saveSucessfull = self.store(tempFile)
+                result = saveSucessfull
+            # Copy to PACS import folder
+            else:
+                saveSucessfull = self._svcDicom.importFile(tempFile, ConfigDetails().rpbIncoming + os.sep + dicomFileName)
+                result = saveSucessfull
+
+        if saveSucessfull:
+            # Remove the temp file
+            os.remove(tempFile)
+
+            # Verify the existence of file withing PACS
+            if ConfigDetails().dicomVerifyimport:
+                fileImportSucess = self.verify(pacsBaseUrl, patientId, studyUid, seriesUid, sopUid)
+
+                if fileImportSucess:
+                    # Remove from corrected after sucessfull import
+                    if ConfigDetails().dicomCorrect:
+                        os.remove(correctedFile)
+
+                    result = fileImportSucess
+                else:
+                    # In case of DICOM C-STORE
+                    if ConfigDetails().storescuEnabled:
+                        # Sent to PACS with second set of options
+                        saveSucessfull = self.store(correctedFile, False, True)
+
+                        if saveSucessfull:
+                            fileImportSucess = self.verify(pacsBaseUrl, patientId, studyUid, seriesUid, sopUid)
+
+                            if fileImportSucess:
+                                # Remove from corrected after sucessfull import
+                                if ConfigDetails().dicomCorrect:
+                                    os.remove(correctedFile)
+
+                                result = fileImportSucess
+                            else:
+                                result = "PACS"
+                                self._logger.error("DICOM file was not imported.")
+            else:
+                # Remove from corrected if no verification
+                if ConfigDetails().dicomCorrect:
+                    os.remove(correctedFile)
+
+        return result
+
+    def ingestBatch(self, batchDir, dicomFileNames, pacsBaseUrl):
+        """Import received DICOM files (e.g. whole series) into PACS together
+
+        Files are corrected one by one, but sent to PACS within shared associations and their
+        presence in PACS is polled for all pending instances in each verification round
+        Returns manifest list with one entry per file (result as in ingest)
+        """
+        tempDir = self._tempDir + os.sep + batchDir
+        correctedDir = self._correctedDir + os.sep + batchDir
+
+        if ConfigDetails().dicomCorrect and not os.path.isdir(correctedDir):
+            os.makedirs(correctedDir)
+
+        manifest = []
+        for dicomFileName in dicomFileNames:
+            tempFile = tempDir + os.sep + dicomFileName
+            entry = { "filename": dicomFileName, "sopInstanceUid": None, "seriesInstanceUid": None, "result": False }
+            manifest.append(entry)
+
+            try:
+                identifiers = self._svcDicom.readIdentifiers(tempFile)
+                entry["patientId"] = identifiers.patientId
+                entry["studyInstanceUid"] = identifiers.studyInstanceUid
+                entry["seriesInstanceUid"] = identifiers.seriesInstanceUid
+                entry["sopInstanceUid"] = identifiers.sopInstanceUid
+            except Exception, err:
+                self._logger.error("Cannot read DICOM file " + dicomFileName + ": " + str(err))
+                continue
+
+            # Archives may contain other files as well (e.g. DICOMDIR, reports)
+            if entry["sopInstanceUid"] is None:
+                self._logger.error("Received file is not DICOM instance: " + dicomFileName)
+                continue
+
+            # Apply DICOM correction before importing to PACS
+            if ConfigDetails().dicomCorrect:
+                self.correct(tempFile, correctedDir + os.sep + dicomFileName)
+                entry["file"] = correctedDir + os.sep + dicomFileName
+            else:
+                entry["file"] = tempFile
+
+        pending = [entry for entry in manifest if "file" in entry]
+
+        # DICOM C-STORE
+        if ConfigDetails().storescuEnabled:
+            stored = self.storeBatch([entry["file"] for entry in pending])
+            for entry, saveSucessfull in zip(pending, stored):
+                entry["result"] = saveSucessfull
+        # Copy to PACS import folder
+        else:
+            for entry in pending:
+                entry["result"] = self._svcDicom.importFile(entry["file"], ConfigDetails().rpbIncoming + os.sep + entry["filename"])
+
+        sent = [entry for entry in pending if entry["result"]]
+
+        # Verify the existence of files withing PACS
+        if sent and ConfigDetails().dicomVerifyimport:
+            missing = self.verifyBatch(pacsBaseUrl, sent)
+
+            # In case of DICOM C-STORE sent to PACS with second set of options
+            if missing and ConfigDetails().storescuEnabled:
+                stored = self.storeBatch([entry["file"] for entry in missing], False, True)
+                resent = [entry for entry, saveSucessfull in zip(missing, stored) if saveSucessfull]
+                missing = [entry for entry, saveSucessfull in zip(missing, stored) if not saveSucessfull]
+                if resent:
+                    missing += self.verifyBatch(pacsBaseUrl, resent)
+
+            for entry in missing:
+                entry["result"] = "PACS"
+                self._logger.error("DICOM file " + entry["filename"] + " was not imported.")
+
+        # Remove received and corrected files of imported instances
+        for entry in sent:
+            if entry["result"] is True:
+                if os.path.isfile(tempDir + os.sep + entry["filename"]):
+                    os.remove(tempDir + os.sep + entry["filename"])
+                if ConfigDetails().dicomCorrect and os.path.isfile(entry["file"]):
+                    os.remove(entry["file"])
+
+        for entry in manifest:
+            entry.pop("file", None)
+            entry.pop("patientId", None)
+            entry.pop("studyInstanceUid", None)
+
+        # Batch folders are removed when nothing is left for investigation
+        for directory in [tempDir, correctedDir]:
+            if os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+
+        return manifest
+
+    def correct(self, source, destination):
+        """Run DICOM correction tool (RadPlanBio-correct)
+        """
+        # Warm correction worker process (no interpreter start per file), tool process when the pool is degraded
+        if self._correctionPool is not None and not self._correctionPool.degraded:
+            try:
+                correction = self._correctionPool.run(source, destination, ConfigDetails().dicomCorrectFastPath)
+                self._countCorrection(correction or "failed")
+                return correction
+            except Degraded, err:
+                self._logger.warning("Correction worker processes not available, correction tool process is used: " + str(err))
+
+        process = QtCore.QProcess()
+
+        # Input (from temp) output (to corrected)
+        args = "\"" + source + "\" \"" + destination + "\""
+        if not ConfigDetails().dicomCorrectFastPath:
+            args = args + " " + NOFASTPATHOPTION
+
+        if platform.system() == "Linux":
+            if os.path.isfile("./correct/RadPlanBio-correct"):
+                process.start("./correct/RadPlanBio-correct " + args)
+            elif os.path.isfile("./correct/mainCorrect.py"):
+                process.start("python ./correct/mainCorrect.py " + args)
+        elif os.path.isfile("./correct/mainCorrect.py"):
+            process.start("python ./correct/mainCorrect.py " + args)
+
+        # Wait until it is really finished
+        process.waitForFinished(-1)
+
+        # Correction tool reports correction class in exit code
+        correction = None
+        for name, exitCode in EXITCODES.items():
+            if process.exitCode() == exitCode:
+                correction = name
+
+        if correction is not None:
+            self._countCorrection(correction)
+        elif process.exitStatus() == QtCore.QProcess.NormalExit and process.exitCode() == 0:
+            # Tool which does not report correction class (or no tool found)
+            self._countCorrection("external")
+        else:
+            self._countCorrection("failed")
+
+        return correction
+
+    def store(self, filename, optProposeLossless=True, optRequired=True):
+        """Send file to PACS with DICOM C-STORE
+        """
+        return self.storeBatch([filename], optProposeLossless, optRequired)[0]
+
+    def storeBatch(self, filenames, optProposeLossless=True, optRequired=True):
+        """Send files to PACS with DICOM C-STORE (shared associations)
+
+        Returns list of results in order of filenames
+        """
+        # Native SCU with pooled associations reports status of every instance
+        # it proposes transfer syntax of each file (storescu options are not applicable)
+        if self._storePool is not None and optProposeLossless and optRequired:
+            statuses = self._storePool.store(ConfigDetails().aetitle, ConfigDetails().call, ConfigDetails().peer, ConfigDetails().port, filenames)
+            for filename, status in zip(filenames, statuses):
+                if status is None:
+                    self._logger.warning("Native C-STORE did not send " + filename + " (presentation context rejected or association failed)")
+            return [isSuccess(status) for status in statuses]
+
+        # Second set of options is only applicable to storescu
+        if self._storePool is not None:
+            self._logger.info("C-STORE of " + str(len(filenames)) + " files with storescu (propose lossless: " + str(optProposeLossless) + ", required: " + str(optRequired) + ")")
+
+        if len(filenames) == 1:
+            return [self._svcDicom.storescuFile(ConfigDetails().aetitle, ConfigDetails().call, ConfigDetails().peer, ConfigDetails().port, filenames[0], optProposeLossless, optRequired)]
+
+        return self._svcDicom.storescuFiles(ConfigDetails().aetitle, ConfigDetails().call, ConfigDetails().peer, ConfigDetails().port, filenames, optProposeLossless, optRequired)
+
+    def verify(self, pacsBaseUrl, patientId, studyUid, seriesUid, sopUid):
+        """Poll PACS until the file is present or the number of verification attempts is reached
+        """
+        if self._importVerifier is not None:
+            return self._importVerifier.verify(pacsBaseUrl, patientId, studyUid, seriesUid, sopUid)
+
+        fileImportSucess = False
+        for i in range(0, ConfigDetails().dicomVerifyimportRepeat):
+            fileImportSucess = self._svcPacs.fileExists(pacsBaseUrl, patientId, studyUid, seriesUid, sopUid)
+            self._logger.info("[" + str(i) + "] Verify file import into PACS with result: " + str(fileImportSucess))
+            if fileImportSucess:
+                break
+
+        return fileImportSucess
+
+    def verifyBatch(self, pacsBaseUrl, entries):
+        """Poll PACS until all files are present or the number of verification attempts is reached
+
+        Every round asks only for instances which were not found yet
+        Returns manifest entries of instances which are still missing
+        """
+        if self._importVerifier is not None:
+            found = self._importVerifier.verifyMany(pacsBaseUrl, [(entry["patientId"], entry["studyInstanceUid"], entry["seriesInstanceUid"], entry["sopInstanceUid"]) for entry in entries])
+            missing = [entry for entry, fileImportSucess in zip(entries, found) if not fileImportSucess]
+            self._logger.info("Verify batch import into PACS, missing files: " + str(len(missing)) + " of " + str(len(entries)))
+        else:
+            missing = list(entries)
+            for i in range(0, ConfigDetails().dicomVerifyimportRepeat):
+                missing = [entry for entry in missing if not self._svcPacs.fileExists(pacsBaseUrl, entry["patientId"], entry["studyInstanceUid"], entry["seriesInstanceUid"], entry["sopInstanceUid"])]
+                self._logger.info("[" + str(i) + "] Verify batch import into PACS, missing files: " + str(len(missing)) + " of " + str(len(entries)))
+                if not missing:
+                    break
+
+        missingIds = set(id(entry) for entry in missing)
+        for entry in entries:
+            if id(entry) not in missingIds:
+                entry["result"] = True
+
+        return missing
+
+    def _countCorrection(self, correction):
+        """Count corrected file in its correction class
+        """
+        if self._correctionCounters is not None:
+            self._correctionCounters.increment(correction)
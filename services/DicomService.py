@@ -7,18 +7,34 @@
 #### ##     ## ##         #######  ##     ##    ##     ######
 
 # System
-import os, platform, shutil
+import hashlib, os, platform, shutil
 
 # DICOM
 import dicom
 
 # Logging
 import logging
-import logging.config
+
+# Domain
+from domain.DicomIdentifiers import DicomIdentifiers
 
 # PyQt
 from PyQt4 import QtCore
 
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Size of chunks for streaming received files to disk
+CHUNKSIZE = 64 * 1024
+
+# Files passed to one storescu invocation (command line length limit)
+STORESCUFILESPERCALL = 200
+
  ######  ######## ########  ##     ## ####  ######  ########
 ##    ## ##       ##     ## ##     ##  ##  ##    ## ##
 ##       ##       ##     ## ##     ##  ##  ##       ##
@@ -35,7 +51,26 @@ class DicomService:
         """Default constructor
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig('logging.ini', disable_existing_loggers=False)
+
+    def readIdentifiers(self, filename):
+        """Read identifiers of DICOM file in one pass
+
+        Parsing stops before pixel data (header only)
+        """
+        ds = dicom.read_file(filename, stop_before_pixels=True, force=True)
+
+        fileMeta = getattr(ds, "file_meta", None)
+        transferSyntaxUid = fileMeta.get("TransferSyntaxUID") if fileMeta is not None else None
+
+        return DicomIdentifiers(
+            ds.get("PatientID"),
+            ds.get("StudyInstanceUID"),
+            ds.get("SeriesInstanceUID"),
+            ds.get("SOPInstanceUID"),
+            ds.get("SOPClassUID"),
+            transferSyntaxUid,
+            ds.get("Modality")
+        )
 
     def getPatientID(self, filename):
         """Read PatientID from DICOM file
@@ -96,6 +131,43 @@ class DicomService:
         # The following is the return from the server: allows for error handling, if all is ok, it should be True
         return True
 
+    def saveStream(self, directory, filename, stream, length, chunkSize=CHUNKSIZE):
+        """Save dicom file streamed from request body on the server
+
+        The body is copied in chunks (constant memory per upload), partially received file
+        is never visible under its final name
+        Returns number of bytes written and MD5 hex digest of the content
+        """
+        path = directory + os.sep + filename
+        partPath = path + ".part"
+
+        self._logger.info("Saving streamed file: " + path)
+
+        md5 = hashlib.md5()
+        size = 0
+
+        try:
+            with open(partPath, "wb") as f:
+                while size < length:
+                    chunk = stream.read(min(chunkSize, length - size))
+                    if not chunk:
+                        break
+
+                    md5.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            if size != length:
+                raise IOError("Received DICOM file data length does not agree: " + str(size) + " of " + str(length))
+
+            os.rename(partPath, path)
+        except:
+            if os.path.isfile(partPath):
+                os.remove(partPath)
+            raise
+
+        return size, md5.hexdigest()
+
     def importFile(self, source, importDestination):
         """Copy DICOM file to the folder for import into PACS
         """
@@ -137,8 +209,56 @@ class DicomService:
 
             process = QtCore.QProcess()
             process.start(command)
-            
+
             # Wait until it is really finished
-            process.waitForFinished(-1)
-            return True
+            return self._finishedSuccessfully(process)
+
+    def storescuFiles(self, aetitle, call, peer, port, filenames, optProposeLossless=True, optRequired=True):
+        """C-STORE of multiple files to Storage Service Class Provider (SCP)
+
+        Files are sent within one association per storescu invocation instead of one per file
+        Returns list of results in order of filenames (storescu reports one exit status per invocation)
+        """
+        if platform.system() == "Linux":
+            results = []
+            for i in range(0, len(filenames), STORESCUFILESPERCALL):
+                command = "storescu "
+                command += "--aetitle " + aetitle + " "
+                command += "--call " + call + " "
+                command += peer + " "
+                command += str(port) + " "
+                command += " ".join("\"" + filename + "\"" for filename in filenames[i:i + STORESCUFILESPERCALL])
+
+                # force to also propose the JPEG Lossless Transfer Syntax
+                if optProposeLossless:
+                    command += " --propose-lossless"
+                # only proposes those SOP Classes  (presentation contexts) that can be found in the files
+                if optRequired:
+                    command += " --required"
+
+                self._logger.debug("Starting store storescu for " + str(len(filenames[i:i + STORESCUFILESPERCALL])) + " files")
+
+                process = QtCore.QProcess()
+                process.start(command)
+
+                # Wait until it is really finished
+                result = self._finishedSuccessfully(process)
+                results += [result] * len(filenames[i:i + STORESCUFILESPERCALL])
+
+            return results
+
+        return [None] * len(filenames)
+
+    def _finishedSuccessfully(self, process):
+        """Wait for external tool and check its exit status
+        """
+        if not process.waitForFinished(-1):
+            self._logger.error("External tool could not be started: " + str(process.errorString()))
+            return False
+
+        if process.exitStatus() != QtCore.QProcess.NormalExit or process.exitCode() != 0:
+            self._logger.error("External tool failed with exit code " + str(process.exitCode()) + ": " + str(process.readAllStandardError()))
+            return False
+
+        return True
             
\ No newline at end of file
@@ -0,0 +1,285 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# System
+import struct, threading, time
+
+# DICOM
+import dicom
+
+# Logging
+import logging
+
+# Utils
+from utils.DicomUpperLayer import Association, DicomNetworkError, IMPLICITVRLITTLEENDIAN, MAXPRESENTATIONCONTEXTS
+
+ ######  ######## ########  ##     ## ####  ######  ########
+##    ## ##       ##     ## ##     ##  ##  ##    ## ##
+##       ##       ##     ## ##     ##  ##  ##       ##
+ ######  ######   ########  ##     ##  ##  ##       ######
+      ## ##       ##   ##    ##   ##   ##  ##       ##
+##    ## ##       ##    ##    ## ##    ##  ##    ## ##
+ ######  ######## ##     ##    ###    ####  ######  ########
+
+class DicomStoreService(object):
+    """Native DICOM C-STORE SCU with pool of long-lived associations
+
+    Associations are kept per (aetitle, call, peer, port). Every association proposes
+    (SOP class, transfer syntax) pairs seen for its peer so far, instances are sent
+    in their own transfer syntax (dataset part of the file is streamed unchanged).
+    """
+
+    def __init__(self, timeout=60, idleTimeout=30, maxAssociations=4):
+        """Constructor
+
+        Param timeout is socket timeout in seconds
+        Param idleTimeout is number of seconds idle association is kept open
+        Param maxAssociations is number of concurrent associations per peer
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.timeout = timeout
+        self.idleTimeout = idleTimeout
+        self.maxAssociations = maxAssociations
+
+        self._lock = threading.Lock()
+
+        # Key -> idle associations, known syntaxes (most recent first), association slots
+        self._idle = {}
+        self._syntaxes = {}
+        self._slots = {}
+
+        # Monitoring counters
+        self._opened = 0
+        self._reused = 0
+        self._failedAssociations = 0
+        self._stored = 0
+        self._failed = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def store(self, aetitle, call, peer, port, filenames):
+        """C-STORE files to Storage Service Class Provider (SCP)
+
+        Returns list of C-STORE response statuses in order of filenames,
+        None when the instance could not be sent
+        """
+        key = (aetitle, call, peer, int(port))
+
+        statuses = []
+        association = None
+        for filename in filenames:
+            try:
+                instance = self.readInstance(filename)
+            except Exception, err:
+                self._logger.error("Cannot read DICOM file for C-STORE " + filename + ": " + str(err))
+                with self._lock:
+                    self._failed += 1
+                statuses.append(None)
+                continue
+
+            status = None
+
+            # Association which broke while idle is replaced once
+            for attempt in range(2):
+                try:
+                    if association is None or not association.proposed(instance[0], instance[2]):
+                        if association is not None:
+                            # Association back in the pool is not owned anymore (not discarded when checkout fails)
+                            self._checkin(key, association)
+                            association = None
+                        association = self._checkout(key, instance[0], instance[2])
+
+                    if not association.supports(instance[0], instance[2]):
+                        self._logger.error("PACS did not accept presentation context " + str((instance[0], instance[2])) + " for " + filename)
+                        break
+
+                    status = association.store(filename, *instance)
+                    break
+                except (DicomNetworkError, IOError), err:
+                    # Association with partially sent instance cannot be used anymore
+                    self._logger.error("C-STORE of " + filename + " failed: " + str(err))
+                    if association is not None:
+                        self._discard(key, association)
+                        association = None
+
+            with self._lock:
+                if status is not None:
+                    self._stored += 1
+                else:
+                    self._failed += 1
+
+            statuses.append(status)
+
+        if association is not None:
+            self._checkin(key, association)
+
+        return statuses
+
+    def readInstance(self, filename):
+        """Read SOP class, SOP instance, transfer syntax and dataset offset of DICOM file
+
+        Returns tuple (sopClassUid, sopInstanceUid, transferSyntaxUid, offset)
+        """
+        ds = dicom.read_file(filename, stop_before_pixels=True, force=True)
+
+        transferSyntaxUid = None
+        fileMeta = getattr(ds, "file_meta", None)
+        if fileMeta is not None:
+            transferSyntaxUid = fileMeta.get("TransferSyntaxUID")
+
+        return (
+            str(ds.SOPClassUID),
+            str(ds.SOPInstanceUID),
+            str(transferSyntaxUid or IMPLICITVRLITTLEENDIAN),
+            self.datasetOffset(filename)
+        )
+
+    def datasetOffset(self, filename):
+        """Position of dataset in file (after preamble and file meta information)
+        """
+        with open(filename, "rb") as f:
+            header = f.read(132)
+            if len(header) < 132 or header[128:132] != "DICM":
+                return 0
+
+            # File meta information is explicit VR little endian group 0002
+            offset = 132
+            while True:
+                element = f.read(8)
+                if len(element) < 8:
+                    break
+
+                group, number, vr = struct.unpack("<HH2s", element[:6])
+                if group != 0x0002:
+                    break
+
+                if vr in ["OB", "OW", "OF", "SQ", "UT", "UN"]:
+                    length = struct.unpack("<I", f.read(4))[0]
+                    headerLength = 12
+                else:
+                    length = struct.unpack("<H", element[6:8])[0]
+                    headerLength = 8
+
+                offset += headerLength + length
+                f.seek(offset)
+
+            return offset
+
+    def close(self):
+        """Release idle associations
+        """
+        with self._lock:
+            idle = [(key, association) for key in self._idle for association in self._idle[key]]
+            self._idle = {}
+
+        for key, association in idle:
+            association.release()
+            self._slots[key].release()
+
+    def statistics(self):
+        """Association pool counters for monitoring
+        """
+        with self._lock:
+            return {
+                "peers": len(self._slots),
+                "idle": sum(len(associations) for associations in self._idle.values()),
+                "opened": self._opened,
+                "reused": self._reused,
+                "failedAssociations": self._failedAssociations,
+                "stored": self._stored,
+                "failed": self._failed
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _checkout(self, key, sopClassUid, transferSyntaxUid):
+        """Idle association which proposed the syntax or new association
+        """
+        syntax = (sopClassUid, transferSyntaxUid)
+        expired = []
+        unsuitable = None
+
+        with self._lock:
+            # Recently used syntaxes are proposed first
+            syntaxes = self._syntaxes.setdefault(key, [])
+            if syntax in syntaxes:
+                syntaxes.remove(syntax)
+            syntaxes.insert(0, syntax)
+            del syntaxes[MAXPRESENTATIONCONTEXTS:]
+
+            slots = self._slots.setdefault(key, threading.BoundedSemaphore(self.maxAssociations))
+
+            idle = self._idle.setdefault(key, [])
+            now = time.time()
+            for association in list(idle):
+                if now - association.lastUsed > self.idleTimeout:
+                    idle.remove(association)
+                    expired.append(association)
+
+            found = None
+            for association in idle:
+                if association.proposed(sopClassUid, transferSyntaxUid):
+                    found = association
+                    break
+
+            if found is not None:
+                idle.remove(found)
+                self._reused += 1
+            elif idle:
+                # Slot of association without the syntax is needed for the new one
+                unsuitable = idle.pop()
+
+            syntaxes = list(syntaxes)
+
+        for association in expired + ([unsuitable] if unsuitable is not None else []):
+            association.release()
+            slots.release()
+
+        if found is not None:
+            return found
+
+        slots.acquire()
+
+        association = Association(key[0], key[1], key[2], key[3], syntaxes, self.timeout)
+        try:
+            association.open()
+        except Exception:
+            slots.release()
+            with self._lock:
+                self._failedAssociations += 1
+            raise
+
+        with self._lock:
+            self._opened += 1
+
+        return association
+
+    def _checkin(self, key, association):
+        """Return association to the pool
+        """
+        with self._lock:
+            self._idle.setdefault(key, []).append(association)
+
+    def _discard(self, key, association):
+        """Abort broken association and free its slot
+        """
+        association.abort()
+        self._slots[key].release()
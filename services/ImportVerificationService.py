@@ -0,0 +1,321 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import random, threading, time
+
+# Collections
+from collections import deque
+
+# Logging
+import logging
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Seconds before series query is tried again after PACS could not answer it
+SERIESQUERYRETRY = 600
+
+# Number of most recent verification latencies used for percentiles
+LATENCYSAMPLES = 1000
+
+ ######  ##          ###     ######   ######  ########  ######
+##    ## ##         ## ##   ##    ## ##    ## ##       ##    ##
+##       ##        ##   ##  ##       ##       ##       ##
+##       ##       ##     ##  ######   ######  ######    ######
+##       ##       #########       ##       ## ##             ##
+##    ## ##       ##     ## ##    ## ##    ## ##       ##    ##
+ ######  ######## ##     ##  ######   ######  ########  ######
+
+class _Series(object):
+    """Instances of one series waiting for verification
+    """
+
+    def __init__(self, interval):
+        """Constructor
+        """
+        # SOP instance UID -> list of waiters
+        self.pending = {}
+        self.interval = interval
+        self.due = time.time()
+        self.busy = False
+
+class _Waiter(object):
+    """Caller waiting for its instances
+    """
+
+    def __init__(self, count, deadline):
+        """Constructor
+        """
+        self.remaining = count
+        self.deadline = deadline
+        self.submitted = time.time()
+        self.found = set()
+        self.done = threading.Event()
+
+class ImportVerificationService(object):
+    """Verification of instances imported into PACS, batched per series
+
+    Instances waiting for verification are grouped by series. The series is queried
+    once per round and all its pending instances are resolved by one PACS request.
+    Rounds without progress back off exponentially (with jitter) up to maxInterval.
+    Series query needs Conquest web server mode rpbseriesinstances (see README), without
+    it (default) PACS is asked for every pending instance (fileExists).
+    """
+
+    def __init__(self, svcPacs, timeout=20, interval=0.25, maxInterval=5, workers=2, seriesQuery=False):
+        """Constructor
+
+        Param timeout is number of seconds instance is waited for
+        Param interval is initial delay between series queries in seconds
+        Param maxInterval is maximal delay between series queries in seconds
+        Param workers is number of threads querying PACS
+        Param seriesQuery enables series query of PACS (rpbseriesinstances)
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self._svcPacs = svcPacs
+
+        self.timeout = timeout
+        self.interval = interval
+        self.maxInterval = maxInterval
+        self.workers = workers
+        self.seriesQuery = seriesQuery
+
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._threads = []
+
+        # (pacsBaseUrl, patient, study, series) -> _Series
+        self._series = {}
+
+        # PACS base URL -> time when series query failed
+        self._seriesQueryFailed = {}
+
+        # Monitoring counters
+        self._latencies = deque(maxlen=LATENCYSAMPLES)
+        self._verified = 0
+        self._missing = 0
+        self._seriesQueries = 0
+        self._fileQueries = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def start(self):
+        """Start threads querying PACS
+        """
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name="Verification-" + str(i))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """Stop querying PACS, waiting callers get instances as missing
+
+        Running PACS queries are waited for
+        """
+        with self._condition:
+            self._stopped = True
+            for series in self._series.values():
+                for waiters in series.pending.values():
+                    for waiter in waiters:
+                        waiter.done.set()
+            self._series = {}
+            self._condition.notify_all()
+
+        for t in self._threads:
+            t.join()
+
+    def verify(self, pacsBaseUrl, patientId, studyUid, seriesUid, sopUid):
+        """Wait until the instance is present in PACS or timeout is reached
+        """
+        return self.verifyMany(pacsBaseUrl, [(patientId, studyUid, seriesUid, sopUid)])[0]
+
+    def verifyMany(self, pacsBaseUrl, instances):
+        """Wait until instances are present in PACS or timeout is reached
+
+        Param instances is list of (patientId, studyUid, seriesUid, sopUid)
+        Returns list of results in order of instances
+        """
+        waiter = _Waiter(len(set(instances)), time.time() + self.timeout)
+
+        with self._condition:
+            if self._stopped:
+                return [False] * len(instances)
+
+            for patientId, studyUid, seriesUid, sopUid in set(instances):
+                key = (pacsBaseUrl, patientId, studyUid, seriesUid)
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = _Series(self.interval)
+                elif series.interval > self.interval:
+                    # Newly stored instance, the series is probably being imported right now
+                    series.interval = self.interval
+                    series.due = min(series.due, time.time() + self.interval)
+                series.pending.setdefault(sopUid, []).append(waiter)
+
+            self._condition.notify_all()
+
+        waiter.done.wait()
+
+        return [instance[3] in waiter.found for instance in instances]
+
+    def statistics(self):
+        """Verification counters and latency percentiles (milliseconds) for monitoring
+        """
+        with self._condition:
+            latencies = sorted(self._latencies)
+
+            return {
+                "series": len(self._series),
+                "pending": sum(len(series.pending) for series in self._series.values()),
+                "verified": self._verified,
+                "missing": self._missing,
+                "seriesQueries": self._seriesQueries,
+                "fileQueries": self._fileQueries,
+                "latency": {
+                    "p50": self._percentile(latencies, 50),
+                    "p90": self._percentile(latencies, 90),
+                    "p99": self._percentile(latencies, 99),
+                    "max": self._percentile(latencies, 100)
+                }
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _work(self):
+        """Query thread body, takes series which are due
+        """
+        while True:
+            with self._condition:
+                key = None
+                while key is None:
+                    if self._stopped:
+                        return
+
+                    now = time.time()
+                    wait = None
+                    for candidate, series in self._series.items():
+                        if series.busy:
+                            continue
+                        if series.due <= now:
+                            key = candidate
+                            break
+                        if wait is None or series.due - now < wait:
+                            wait = series.due - now
+
+                    if key is None:
+                        self._condition.wait(wait)
+
+                series = self._series[key]
+                series.busy = True
+                sopUids = series.pending.keys()
+
+            found = set()
+            try:
+                found = self._query(key, sopUids)
+            except Exception:
+                self._logger.exception("PACS import verification failed")
+
+            with self._condition:
+                self._resolve(key, series, found)
+
+    def _query(self, key, sopUids):
+        """Ask PACS which of the instances of series are present
+        """
+        pacsBaseUrl, patientId, studyUid, seriesUid = key
+
+        if self.seriesQuery and time.time() - self._seriesQueryFailed.get(pacsBaseUrl, 0) > SERIESQUERYRETRY:
+            with self._condition:
+                self._seriesQueries += 1
+
+            stored = self._svcPacs.seriesInstances(pacsBaseUrl, patientId, studyUid, seriesUid)
+            if stored is not None:
+                return set(sopUids) & set(stored)
+
+            self._logger.warning("PACS does not answer series query, verifying files one by one.")
+            self._seriesQueryFailed[pacsBaseUrl] = time.time()
+
+        with self._condition:
+            self._fileQueries += len(sopUids)
+
+        return set(sopUid for sopUid in sopUids if self._svcPacs.fileExists(pacsBaseUrl, patientId, studyUid, seriesUid, sopUid))
+
+    def _resolve(self, key, series, found):
+        """Release waiters of found instances and of instances which timed out, schedule next query
+        """
+        series.busy = False
+        now = time.time()
+
+        for sopUid in found:
+            for waiter in series.pending.pop(sopUid, []):
+                waiter.found.add(sopUid)
+                waiter.remaining -= 1
+                self._verified += 1
+                self._latencies.append(now - waiter.submitted)
+                if waiter.remaining == 0:
+                    waiter.done.set()
+
+        for sopUid, waiters in series.pending.items():
+            for waiter in list(waiters):
+                if waiter.deadline <= now:
+                    waiters.remove(waiter)
+                    waiter.remaining -= 1
+                    self._missing += 1
+                    if waiter.remaining == 0:
+                        waiter.done.set()
+            if not waiters:
+                del series.pending[sopUid]
+
+        if not series.pending:
+            if self._series.get(key) is series:
+                del self._series[key]
+            return
+
+        # Import in progress is polled often, otherwise back off
+        if found:
+            series.interval = self.interval
+        else:
+            series.interval = min(series.interval * 2, self.maxInterval)
+
+        # Equal jitter, series of concurrent uploads are not queried in lockstep
+        series.due = now + series.interval / 2.0 + random.uniform(0, series.interval / 2.0)
+
+        # Do not sleep past the earliest deadline
+        deadline = min(waiter.deadline for waiters in series.pending.values() for waiter in waiters)
+        series.due = min(series.due, max(deadline, now))
+
+        self._condition.notify_all()
+
+    def _percentile(self, values, percent):
+        """Nearest rank percentile of sorted seconds in milliseconds
+        """
+        if not values:
+            return None
+
+        index = max(0, int(round(percent / 100.0 * len(values))) - 1)
+
+        return round(values[index] * 1000, 1)
@@ -0,0 +1,438 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# System
+import errno, glob, os, re, threading, time
+
+# Queue
+import Queue
+
+# JSON
+import json
+
+# Logging
+import logging
+
+# File locking (not available on Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Contexts
+from contexts.ConfigDetails import ConfigDetails
+
+# Services
+from services.DicomService import DicomService
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Pipeline stages in processing order
+STAGES = ["correct", "store", "verify"]
+
+# Seconds between scans for abandoned and expired jobs
+RECOVERINTERVAL = 60
+
+# Job identifiers are generated as uuid4 hex
+JOBIDPATTERN = re.compile("^[0-9a-f]{32}$")
+
+# Job fields reported to clients
+PUBLICFIELDS = ["id", "filename", "size", "md5", "stage", "status", "result", "error",
+    "seriesInstanceUid", "sopInstanceUid", "created", "updated"]
+
+ ######  ######## ########  ##     ## ####  ######  ########
+##    ## ##       ##     ## ##     ##  ##  ##    ## ##
+##       ##       ##     ## ##     ##  ##  ##       ##
+ ######  ######   ########  ##     ##  ##  ##       ######
+      ## ##       ##   ##    ##   ##   ##  ##       ##
+##    ## ##       ##    ##    ## ##    ##  ##    ## ##
+ ######  ######## ##     ##    ###    ####  ######  ########
+
+class IngestionJobService(object):
+    """Asynchronous ingestion of received DICOM files
+
+    Every job is persisted as JSON file in job folder and passes correct, store and verify
+    stages. Each stage has its own queue and worker threads, so correction (CPU) and
+    PACS I/O concurrency can be tuned separately. Jobs of stopped processes are resumed
+    from their last stage.
+    """
+
+    def __init__(self, svcIngestion, tempDir="temp", correctedDir="corrected", jobDir="jobs", correctWorkers=2, storeWorkers=2, verifyWorkers=4, retention=86400):
+        """Constructor
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self._svcIngestion = svcIngestion
+        self._svcDicom = DicomService()
+
+        self._tempDir = tempDir
+        self._correctedDir = correctedDir
+        self._jobDir = jobDir
+        self._retention = retention
+        self._workers = { "correct": correctWorkers, "store": storeWorkers, "verify": verifyWorkers }
+
+        self._queues = dict((stage, Queue.Queue()) for stage in STAGES)
+        self._handlers = { "correct": self._correct, "store": self._store, "verify": self._verify }
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        # Jobs processed by this process
+        self._active = set()
+
+        # Monitoring counters
+        self._busy = dict((stage, 0) for stage in STAGES)
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._resumed = 0
+
+        if not os.path.isdir(self._jobDir):
+            os.makedirs(self._jobDir)
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def start(self):
+        """Start stage worker threads and resume unfinished jobs
+        """
+        for stage in STAGES:
+            for i in range(self._workers[stage]):
+                t = threading.Thread(target=self._work, args=(stage,), name="Ingestion-" + stage + "-" + str(i))
+                t.daemon = True
+                t.start()
+
+        t = threading.Thread(target=self._watch, name="Ingestion-recovery")
+        t.daemon = True
+        t.start()
+
+        self._logger.info("Ingestion job workers started: " + ", ".join(stage + " " + str(self._workers[stage]) for stage in STAGES))
+
+    def stop(self):
+        """Stop taking jobs from stage queues
+
+        Jobs in progress are not waited for, they are resumed after restart
+        """
+        self._stopped.set()
+        for stage in STAGES:
+            for i in range(self._workers[stage]):
+                self._queues[stage].put(None)
+
+    def submit(self, jobId, dicomFileName, pacsBaseUrl, username, size=None, md5=None):
+        """Create job for DICOM file received in temp folder and queue it for correction
+        """
+        now = time.time()
+        job = {
+            "id": jobId,
+            "filename": dicomFileName,
+            "file": self._tempDir + os.sep + dicomFileName,
+            "pacsBaseUrl": pacsBaseUrl,
+            "username": username,
+            "size": size,
+            "md5": md5,
+            "stage": STAGES[0],
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "owner": os.getpid(),
+            "created": now,
+            "updated": now
+        }
+        self._save(job)
+
+        with self._lock:
+            self._active.add(jobId)
+            self._submitted += 1
+
+        self._queues[job["stage"]].put(job)
+
+        return self.describe(job)
+
+    def get(self, jobId, username):
+        """Load job of user (it can be processed by any server process)
+
+        Returns None when the job does not exist
+        """
+        if not JOBIDPATTERN.match(jobId):
+            return None
+
+        job = self._load(self._jobPath(jobId))
+        if job is None or job["username"] != username:
+            return None
+
+        return self.describe(job)
+
+    def describe(self, job):
+        """Job fields reported to clients
+        """
+        return dict((field, job.get(field)) for field in PUBLICFIELDS)
+
+    def statistics(self):
+        """Ingestion counters for monitoring
+        """
+        with self._lock:
+            stages = {}
+            for stage in STAGES:
+                stages[stage] = {
+                    "workers": self._workers[stage],
+                    "busy": self._busy[stage],
+                    "queued": self._queues[stage].qsize()
+                }
+
+            return {
+                "stages": stages,
+                "active": len(self._active),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "resumed": self._resumed
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _correct(self, job):
+        """Read DICOM identifiers and apply DICOM correction
+
+        Returns next stage
+        """
+        tempFile = self._tempDir + os.sep + job["filename"]
+
+        identifiers = self._svcDicom.readIdentifiers(tempFile)
+        job["patientId"] = identifiers.patientId
+        job["studyInstanceUid"] = identifiers.studyInstanceUid
+        job["seriesInstanceUid"] = identifiers.seriesInstanceUid
+        job["sopInstanceUid"] = identifiers.sopInstanceUid
+
+        if ConfigDetails().dicomCorrect:
+            correctedFile = self._correctedDir + os.sep + job["filename"]
+            self._svcIngestion.correct(tempFile, correctedFile)
+            job["file"] = correctedFile
+
+        return "store"
+
+    def _store(self, job):
+        """Send file to PACS (C-STORE or PACS import folder)
+
+        Returns next stage or None when the job is finished
+        """
+        tempFile = self._tempDir + os.sep + job["filename"]
+
+        # DICOM C-STORE
+        if ConfigDetails().storescuEnabled:
+            saveSucessfull = self._svcIngestion.store(job["file"])
+        # Copy to PACS import folder
+        else:
+            saveSucessfull = self._svcDicom.importFile(job["file"], ConfigDetails().rpbIncoming + os.sep + job["filename"])
+
+        if not saveSucessfull:
+            job["result"] = False
+            return None
+
+        nextStage = None
+        if ConfigDetails().dicomVerifyimport:
+            nextStage = "verify"
+        else:
+            job["result"] = True
+
+        # Record the progress before the received file disappears
+        job["stage"] = nextStage or job["stage"]
+        self._save(job)
+
+        # Sent file is needed by verify stage for C-STORE with second set of options
+        keepFile = nextStage is not None and ConfigDetails().storescuEnabled
+
+        # Without correction the sent file is the received one
+        if job["file"] != tempFile:
+            self._remove(tempFile)
+        if not keepFile:
+            self._remove(job["file"])
+
+        return nextStage
+
+    def _verify(self, job):
+        """Poll PACS for the file, C-STORE is repeated with second set of options when it is missing
+
+        Returns None (the job is finished)
+        """
+        identifiers = (job["patientId"], job["studyInstanceUid"], job["seriesInstanceUid"], job["sopInstanceUid"])
+
+        fileImportSucess = self._svcIngestion.verify(job["pacsBaseUrl"], *identifiers)
+
+        # In case of DICOM C-STORE sent to PACS with second set of options
+        if not fileImportSucess and ConfigDetails().storescuEnabled:
+            if self._svcIngestion.store(job["file"], False, True):
+                fileImportSucess = self._svcIngestion.verify(job["pacsBaseUrl"], *identifiers)
+
+        # Sent file is removed after sucessfull import, corrected file which was not imported is kept for investigation
+        if fileImportSucess or job["file"] == self._tempDir + os.sep + job["filename"]:
+            self._remove(job["file"])
+
+        if fileImportSucess:
+            job["result"] = True
+        else:
+            job["result"] = "PACS"
+            self._logger.error("DICOM file was not imported: " + job["filename"])
+
+        return None
+
+    def _work(self, stage):
+        """Stage worker thread body
+        """
+        while True:
+            job = self._queues[stage].get()
+            if job is None:
+                break
+
+            with self._lock:
+                self._busy[stage] += 1
+
+            job["status"] = "running"
+            self._save(job)
+
+            try:
+                nextStage = self._handlers[stage](job)
+            except Exception, err:
+                self._logger.exception("Ingestion job " + job["id"] + " failed in stage " + stage)
+                job["result"] = False
+                job["error"] = str(err)
+                nextStage = None
+            finally:
+                with self._lock:
+                    self._busy[stage] -= 1
+
+            if nextStage is not None:
+                job["stage"] = nextStage
+                job["status"] = "queued"
+                self._save(job)
+                self._queues[nextStage].put(job)
+            else:
+                self._finish(job)
+
+    def _finish(self, job):
+        """Persist final state of the job
+        """
+        job["status"] = "done" if job["result"] is True else "failed"
+        self._save(job)
+
+        with self._lock:
+            self._active.discard(job["id"])
+            if job["status"] == "done":
+                self._completed += 1
+            else:
+                self._failed += 1
+
+        self._logger.info("Ingestion job " + job["id"] + " finished with result: " + str(job["result"]))
+
+    def _watch(self):
+        """Periodically resume abandoned jobs and remove expired ones
+        """
+        while not self._stopped.is_set():
+            try:
+                self._recover()
+            except Exception:
+                self._logger.exception("Ingestion job recovery failed")
+
+            self._stopped.wait(RECOVERINTERVAL)
+
+    def _recover(self):
+        """Claim unfinished jobs whose owner process does not run anymore
+        """
+        lockFile = open(self._jobDir + os.sep + ".lock", "a")
+        try:
+            # Pre-forked processes must not claim the same job
+            if fcntl is not None:
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+
+            for path in glob.glob(self._jobDir + os.sep + "*.json"):
+                job = self._load(path)
+                if job is None:
+                    continue
+
+                if job["status"] in ["done", "failed"]:
+                    if time.time() - job["updated"] > self._retention:
+                        self._remove(path)
+                    continue
+
+                with self._lock:
+                    if job["id"] in self._active:
+                        continue
+
+                if job["owner"] != os.getpid() and self._isRunning(job["owner"]):
+                    continue
+
+                job["owner"] = os.getpid()
+                job["status"] = "queued"
+                self._save(job)
+
+                with self._lock:
+                    self._active.add(job["id"])
+                    self._resumed += 1
+
+                self._logger.info("Resuming ingestion job " + job["id"] + " in stage " + job["stage"])
+                self._queues[job["stage"]].put(job)
+        finally:
+            lockFile.close()
+
+    def _isRunning(self, pid):
+        """Process with pid exists
+        """
+        try:
+            os.kill(pid, 0)
+        except OSError, err:
+            return err.errno == errno.EPERM
+
+        return True
+
+    def _jobPath(self, jobId):
+        """Job file path
+        """
+        return self._jobDir + os.sep + jobId + ".json"
+
+    def _save(self, job):
+        """Write job file atomically (readers never see partially written job)
+        """
+        job["updated"] = time.time()
+
+        path = self._jobPath(job["id"])
+        partPath = path + "." + str(os.getpid()) + "." + str(threading.current_thread().ident) + ".part"
+        with open(partPath, "w") as f:
+            json.dump(job, f)
+
+        os.rename(partPath, path)
+
+    def _load(self, path):
+        """Read job file, None when it does not exist
+        """
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _remove(self, path):
+        """Remove file when it still exists (stage can be repeated after restart)
+        """
+        if os.path.isfile(path):
+            os.remove(path)
@@ -0,0 +1,204 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Collections
+from collections import OrderedDict
+
+# Datetime
+from datetime import datetime
+
+# Domain
+from domain.Subject import Subject
+from domain.Event import Event
+from domain.Crf import Crf
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Event start is reported as date or as date with time
+DATEFORMATS = { 11: "%d-%b-%Y", 20: "%d-%b-%Y %H:%M:%S" }
+
+ ######  ##          ###     ######   ######
+##    ## ##         ## ##   ##    ## ##    ##
+##       ##        ##   ##  ##       ##
+##       ##       ##     ##  ######   ######
+##       ##       #########       ##       ##
+##    ## ##       ##     ## ##    ## ##    ##
+ ######  ######## ##     ##  ######   ######
+
+class OCCasebook(object):
+    """Casebook of OpenClinica REST clinical data (JSON) parsed once into indexes
+
+    Subjects are indexed by OID, events of subject by (event definition OID, repeat key)
+    and default CRF versions by event definition OID. Events carry their CRFs including
+    not yet started default versions of their event definition.
+    """
+
+    def __init__(self, casebook):
+        """Constructor
+
+        Param casebook is decoded JSON response of rest/clinicaldata/json/view
+        """
+        self.subjects = OrderedDict()
+        self.events = {}
+        self.defaultForms = {}
+
+        if not isinstance(casebook, dict):
+            return
+
+        study = casebook.get("Study") or {}
+        self._indexDefaultForms(study.get("MetaDataVersion") or {})
+
+        clinicalData = casebook.get("ClinicalData") or {}
+        for subj in asList(clinicalData.get("SubjectData")):
+            subject = Subject()
+            subject.oid = subj["@SubjectKey"]
+            subject.studySubjectId = subj["@OpenClinica:StudySubjectID"]
+            if "@OpenClinica:UniqueIdentifier" in subj:
+                subject.uniqueIdentifier = subj["@OpenClinica:UniqueIdentifier"]
+
+            self.subjects[subject.oid] = subject
+            self.events[subject.oid] = OrderedDict()
+
+            for ed in asList(subj.get("StudyEventData")):
+                event = self._event(ed)
+                self.events[subject.oid][(event.eventDefinitionOID, event.studyEventRepeatKey)] = event
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def subject(self, subjectOid):
+        """Subject by OID or None
+        """
+        return self.subjects.get(subjectOid)
+
+    def subjectList(self):
+        """Subjects in casebook order
+        """
+        return self.subjects.values()
+
+    def subjectEvents(self, subjectOid):
+        """Events of subject in casebook order
+        """
+        return self.events.get(subjectOid, {}).values()
+
+    def event(self, subjectOid, eventDefinitionOid, repeatKey):
+        """Event of subject by event definition OID and repeat key or None
+        """
+        return self.events.get(subjectOid, {}).get((eventDefinitionOid, repeatKey))
+
+    def defaultFormOids(self, eventDefinitionOid):
+        """OIDs of default CRF versions of event definition
+        """
+        return self.defaultForms.get(eventDefinitionOid, [])
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _indexDefaultForms(self, metaData):
+        """Default CRF versions of every event definition
+        """
+        # Form OID -> event definitions referencing the form
+        references = {}
+        for sed in asList(metaData.get("StudyEventDef")):
+            self.defaultForms[sed["@OID"]] = []
+            for fr in asList(sed.get("FormRef")):
+                references.setdefault(fr["@FormOID"], []).append(sed["@OID"])
+
+        for fd in asList(metaData.get("FormDef")):
+            formOid = fd["@OID"]
+            details = fd.get("OpenClinica:FormDetails") or {}
+
+            for presence in asList(details.get("OpenClinica:PresentInEventDefinition")):
+                if presence.get("@IsDefaultVersion") != "Yes":
+                    continue
+
+                # Presence without event definition applies to all referencing event definitions
+                if "@StudyEventOID" in presence:
+                    eventDefinitionOids = [presence["@StudyEventOID"]]
+                else:
+                    eventDefinitionOids = references.get(formOid, [])
+
+                for eventDefinitionOid in eventDefinitionOids:
+                    forms = self.defaultForms.get(eventDefinitionOid)
+                    if forms is not None and eventDefinitionOid in references.get(formOid, []) and formOid not in forms:
+                        forms.append(formOid)
+
+    def _event(self, ed):
+        """Event with its CRFs, not yet started default CRF versions are added
+        """
+        event = Event()
+        event.eventDefinitionOID = ed["@StudyEventOID"]
+        event.status = ed["@OpenClinica:Status"]
+        event.startDate = parseStartDate(ed["@OpenClinica:StartDate"])
+        event.studyEventRepeatKey = ed["@StudyEventRepeatKey"]
+
+        # Subject Age At Event is optional (because collect birth date is optional)
+        if "OpenClinica:SubjectAgeAtEvent" in ed:
+            event.subjectAgeAtEvent = ed["OpenClinica:SubjectAgeAtEvent"]
+
+        # Resulting eCRFs
+        scheduled = set()
+        for frm in asList(ed.get("FormData")):
+            crf = Crf()
+            crf.oid = frm["@FormOID"]
+            crf.version = frm["@OpenClinica:Version"]
+            crf.status = frm["@OpenClinica:Status"]
+            event.addCrf(crf)
+            scheduled.add(crf.oid)
+
+        # + automatically schedule default version only (if it is not)
+        for formOid in self.defaultFormOids(event.eventDefinitionOID):
+            if formOid not in scheduled:
+                crf = Crf()
+                crf.oid = formOid
+                event.addCrf(crf)
+
+        return event
+
+######## ##     ## ##    ##  ######  ######## ####  #######  ##    ##  ######
+##       ##     ## ###   ## ##    ##    ##     ##  ##     ## ###   ## ##    ##
+##       ##     ## ####  ## ##          ##     ##  ##     ## ####  ## ##
+######   ##     ## ## ## ## ##          ##     ##  ##     ## ## ## ##  ######
+##       ##     ## ##  #### ##          ##     ##  ##     ## ##  ####       ##
+##       ##     ## ##   ### ##    ##    ##     ##  ##     ## ##   ### ##    ##
+##        #######  ##    ##  ######     ##    ####  #######  ##    ##  ######
+
+def asList(value):
+    """JSON of XML element which can occur once (dict) or repeatedly (list) as list
+    """
+    if value is None:
+        return []
+    elif type(value) is list:
+        return value
+
+    return [value]
+
+def parseStartDate(dateString):
+    """Event start date (with optional time), None when the format is unknown
+    """
+    format = DATEFORMATS.get(len(dateString))
+    if format is None:
+        return None
+
+    return datetime.strptime(dateString, format)
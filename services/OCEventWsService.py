@@ -8,7 +8,6 @@
 
 # Logging
 import logging
-import logging.config
 
 # Date
 from datetime import datetime
@@ -36,7 +35,6 @@ class OCEventWsService():
         """Constructor
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         proxies = None
 
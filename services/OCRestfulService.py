@@ -11,7 +11,6 @@ import os
 
 # Logging
 import logging
-import logging.config
 
 # HTTP
 import requests
@@ -20,23 +19,28 @@ from requests.auth import HTTPBasicAuth
 # String
 from string import whitespace
 
-# Datetime
-from datetime import datetime
-
 # JSON
 import json
 
 # PyQt - threading
 from PyQt4 import QtCore
 
-# Domain
-from domain.Subject import Subject
-from domain.Event import Event
-from domain.Crf import Crf
+# Services
+from services.OCCasebook import OCCasebook
 
 # Utils
 from utils.JsonSerializer import JsonSerializer
 
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# OC redirects requests without valid session (and failed logins) to login page
+LOGINPAGE = "/pages/login/login"
 
  ######  ######## ########  ##     ## ####  ######  ########
 ##    ## ##       ##     ## ##     ##  ##  ##    ## ##
@@ -50,15 +54,17 @@ class OCRestfulService:
     """OC RESTful communication service
     """
 
-    def __init__(self, username = None, clearpass = None):
+    def __init__(self, username = None, clearpass = None, sessionCache = None):
         """Default constructor
+
+        Param sessionCache is OCSessionCache of logged in sessions (optional, login per request otherwise)
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         # Spring security login to OC
         self._username = username
         self._clearpass = clearpass
+        self._sessionCache = sessionCache
 
         # Proxy settings
         self._proxyEnabled = False
@@ -95,32 +101,8 @@ class OCRestfulService:
             studyOid = data[1]
 
         method = studyOid + "/*/*/*"
-        results = []
 
-        r = self._ocRequest(ocBaseUrl, method)
-
-        if r.status_code == 200:
-            if "ClinicalData" in r.json():
-                subjectData = r.json()["ClinicalData"]["SubjectData"]
-
-                # Multiple subjects
-                if type(subjectData) is list:
-                    for subj in subjectData:
-                        subject = Subject()
-                        subject.oid = subj["@SubjectKey"]
-                        subject.studySubjectId = subj["@OpenClinica:StudySubjectID"]
-                        if "@OpenClinica:UniqueIdentifier" in subj:
-                            subject.uniqueIdentifier = subj["@OpenClinica:UniqueIdentifier"]
-                        results.append(subject)
-                # Only one subject reported
-                elif type(subjectData) is dict:
-                    subj = subjectData
-                    subject = Subject()
-                    subject.oid = subj["@SubjectKey"]
-                    subject.studySubjectId = subj["@OpenClinica:StudySubjectID"]
-                    if "@OpenClinica:UniqueIdentifier" in subj:
-                        subject.uniqueIdentifier = subj["@OpenClinica:UniqueIdentifier"]
-                    results.append(subject)
+        results = self.getCasebook(ocBaseUrl, method).subjectList()
 
         if thread:
             thread.emit(QtCore.SIGNAL("finished(QVariant)"), results)
@@ -133,24 +115,38 @@ class OCRestfulService:
         SubjectId can be StudySubjectOID (SS_) or StudySubjectID (in new version of OC)
         """
         method = studyOid + "/" + subjectId + "/*/*"
-        results = None
 
-        r = self._ocRequest(ocBaseUrl, method)
+        # Exactly one subject should be reported
+        subjects = self.getCasebook(ocBaseUrl, method).subjectList()
+        if len(subjects) == 1:
+            return subjects[0]
+
+        return None
+
+    def getStudyCasebook(self, ocBaseUrl, studyOid):
+        """Get casebook of whole study (all subjects with their events and forms) in one request
+
+        Events of every subject are available without further casebook requests
+        """
+        method = studyOid + "/*/*/*"
 
+        return self.getCasebook(ocBaseUrl, method)
+
+    def getCasebook(self, ocBaseUrl, method):
+        """Get casebook (clinical data) decoded once into indexed OCCasebook
+
+        Casebook is empty when OC did not report clinical data
+        """
+        casebook = None
+
+        r = self._ocRequest(ocBaseUrl, method)
         if r.status_code == 200:
-            if "ClinicalData" in r.json():
-                subjectData = r.json()["ClinicalData"]["SubjectData"]
-                # Exactly one subject should be reported
-                if type(subjectData) is dict:
-                    subj = subjectData
-                    subject = Subject()
-                    subject.oid = subj["@SubjectKey"]
-                    subject.studySubjectId = subj["@OpenClinica:StudySubjectID"]
-                    if "@OpenClinica:UniqueIdentifier" in subj:
-                        subject.uniqueIdentifier = subj["@OpenClinica:UniqueIdentifier"]
-                    results.append(subject)
-
-        return results
+            try:
+                casebook = r.json()
+            except ValueError:
+                self._logger.error("OpenClinica casebook is not JSON: " + method)
+
+        return OCCasebook(casebook)
 
  #######   ######     ######## ##     ## ######## ##    ## ######## 
 ##     ## ##    ##    ##       ##     ## ##       ###   ##    ##    
@@ -169,183 +165,12 @@ class OCRestfulService:
             subjectOid = data[2]
 
         method = studyOid + "/" + subjectOid + "/*/*"
-        results = []
-        
-        r = self._ocRequest(ocBaseUrl, method)
 
-        if r.status_code == 200:
-            if "ClinicalData" in r.json():
-                if "SubjectData" in r.json()["ClinicalData"]:
-                    if "StudyEventData" in r.json()["ClinicalData"]["SubjectData"]:
-                        
-                        eventData = r.json()["ClinicalData"]["SubjectData"]["StudyEventData"]
-
-                        # Multiple events
-                        if type(eventData) is list:
-                            for ed in eventData:
-                                event = Event()
-                                event.eventDefinitionOID = ed["@StudyEventOID"]
-                                event.status = ed["@OpenClinica:Status"]
-
-                                dateString = ed["@OpenClinica:StartDate"]
-                                format = ""
-                                # Is it only date or datetime
-                                if len(dateString) == 11:
-                                    format = "%d-%b-%Y"
-                                elif len(dateString) == 20:
-                                    format = "%d-%b-%Y %H:%M:%S"
-
-                                event.startDate = datetime.strptime(dateString, format)
-                                event.studyEventRepeatKey = ed["@StudyEventRepeatKey"]
-
-                                # Subject Age At Event is optional (because collect birth date is optional)
-                                if "OpenClinica:SubjectAgeAtEvent" in ed:
-                                    event.subjectAgeAtEvent = ed["OpenClinica:SubjectAgeAtEvent"]
-
-                                # Resulting eCRFs
-                                if "FormData" in ed:
-                                    formData = ed["FormData"]
-
-                                    # Multiple forms
-                                    if type(formData) is list:
-                                        for frm in formData:
-                                            crf = Crf()
-                                            crf.oid = frm["@FormOID"]
-                                            crf.version = frm["@OpenClinica:Version"]
-                                            crf.status = frm["@OpenClinica:Status"]
-                                            event.addCrf(crf)
-                                    # Only one form in event
-                                    elif type(formData) is dict:
-                                        frm  = formData
-                                        crf = Crf()
-                                        crf.oid = frm["@FormOID"]
-                                        crf.version = frm["@OpenClinica:Version"]
-                                        crf.status = frm["@OpenClinica:Status"]
-                                        event.addCrf(crf)
-                                
-                                # + automatically schedule default version only (if it is not)
-                                eventFormOids = []
-
-                                eventDefinition = r.json()["Study"]["MetaDataVersion"]["StudyEventDef"]
-                                if type(eventDefinition) is list:
-                                    for ed in eventDefinition:
-                                        formRef = ed["FormRef"]
-                                        if type(formRef) is list:
-                                            for fr in formRef:
-                                                eventFormOids.append(fr["@FormOID"])
-                                        elif type(formRef) is dict:
-                                            eventFormOids.append(formRef["@FormOID"])
-                                elif type(eventDefinition) is dict:
-                                    ed = eventDefinition
-                                    formRef = ed["FormRef"]
-                                    if type(formRef) is list:
-                                        for fr in formRef:
-                                            eventFormOids.append(fr["@FormOID"])
-                                    elif type(formRef) is dict:
-                                        eventFormOids.append(formRef["@FormOID"])
-
-                                formDefinition = r.json()["Study"]["MetaDataVersion"]["FormDef"]
-                                if type(formDefinition) is list:
-                                    for fd in formDefinition:
-                                        if fd["@OID"] in eventFormOids:
-                                            if not event.hasScheduledCrf(fd["@OID"]):
-                                                if fd["OpenClinica:FormDetails"]["OpenClinica:PresentInEventDefinition"]["@IsDefaultVersion"] == "Yes":
-                                                    crf = Crf()
-                                                    crf.oid = fd["@OID"]
-                                                    event.addCrf(crf)
-                                elif type(formDefinition) is dict:
-                                    fd = formDefinition
-                                    if fd["@OID"] in eventFormOids:
-                                        if not event.hasScheduledCrf(fd["@OID"]):
-                                            if fd["OpenClinica:FormDetails"]["OpenClinica:PresentInEventDefinition"]["@IsDefaultVersion"] == "Yes":
-                                                crf = Crf()
-                                                crf.oid = fd["@OID"]
-                                                event.addCrf(crf)
-
-                                results.append(event)
-                        # Only one event reported
-                        elif type(eventData) is dict:
-                            ed = eventData
-
-                            event = Event()
-                            event.eventDefinitionOID = ed["@StudyEventOID"]
-                            event.status = ed["@OpenClinica:Status"]
-                            dateString = ed["@OpenClinica:StartDate"]
-
-                            format = ""
-                            # Is it only date or datetime
-                            if len(dateString) == 11:
-                                format = "%d-%b-%Y"
-                            elif len(dateString) == 20:
-                                format = "%d-%b-%Y %H:%M:%S"
-
-                            event.startDate = datetime.strptime(dateString, format)
-                            event.studyEventRepeatKey = ed["@StudyEventRepeatKey"]
-
-                            # Subject Age At Event is optional (because collect birth date is optional)
-                            if "OpenClinica:SubjectAgeAtEvent" in ed:
-                                event.subjectAgeAtEvent = ed["OpenClinica:SubjectAgeAtEvent"]
-
-                            # Resulting eCRFs
-                            if "FormData" in ed:
-                                formData = ed["FormData"]
-
-                                # Multiple forms
-                                if type(formData) is list:
-                                    for frm in formData:
-                                        crf = Crf()
-                                        crf.oid = frm["@FormOID"]
-                                        crf.version = frm["@OpenClinica:Version"]
-                                        crf.status = frm["@OpenClinica:Status"]
-                                        event.addCrf(crf)
-                                # Only one form in event
-                                elif type(formData) is dict:
-                                    frm  = formData
-                                    crf = Crf()
-                                    crf.oid = frm["@FormOID"]
-                                    crf.version = frm["@OpenClinica:Version"]
-                                    crf.status = frm["@OpenClinica:Status"]
-                                    event.addCrf(crf)
-                            # + automatically schedule default version (if it is not)
-                            eventFormOids = []
-
-                            eventDefinition = r.json()["Study"]["MetaDataVersion"]["StudyEventDef"]
-                            if type(eventDefinition) is list:
-                                for ed in eventDefinition:
-                                    formRef = ed["FormRef"]
-                                    if type(formRef) is list:
-                                        for fr in formRef:
-                                            eventFormOids.append(fr["@FormOID"])
-                                    elif type(formRef) is dict:
-                                        eventFormOids.append(formRef["@FormOID"])
-                            elif type(eventDefinition) is dict:
-                                ed = eventDefinition
-                                formRef = ed["FormRef"]
-                                if type(formRef) is list:
-                                    for fr in formRef:
-                                        eventFormOids.append(fr["@FormOID"])
-                                elif type(formRef) is dict:
-                                    eventFormOids.append(formRef["@FormOID"])
-
-                            formDefinition = r.json()["Study"]["MetaDataVersion"]["FormDef"]
-                            if type(formDefinition) is list:
-                                for fd in formDefinition:
-                                    if fd["@OID"] in eventFormOids:
-                                        if not event.hasScheduledCrf(fd["@OID"]):
-                                            if fd["OpenClinica:FormDetails"]["OpenClinica:PresentInEventDefinition"]["@IsDefaultVersion"] == "Yes":
-                                                crf = Crf()
-                                                crf.oid = fd["@OID"]
-                                                event.addCrf(crf)
-                            elif type(formDefinition) is dict:
-                                fd = formDefinition
-                                if fd["@OID"] in eventFormOids:
-                                    if not event.hasScheduledCrf(fd["@OID"]):
-                                        if fd["OpenClinica:FormDetails"]["OpenClinica:PresentInEventDefinition"]["@IsDefaultVersion"] == "Yes":
-                                            crf = Crf()
-                                            crf.oid = fd["@OID"]
-                                            event.addCrf(crf)
-
-                            results.append(event)
+        casebook = self.getCasebook(ocBaseUrl, method)
+
+        results = []
+        for subject in casebook.subjectList():
+            results.extend(casebook.subjectEvents(subject.oid))
 
         if thread:
             thread.emit(QtCore.SIGNAL("finished(QVariant)"), results)
@@ -364,16 +189,13 @@ class OCRestfulService:
 
     def _ocRequest(self, ocBaseUrl, method):
         """Generic OpenClinica (restfull URL) GET request
-        """
-        contentLength = 0
-        body = None
 
+        With session cache the logged in session is reused (one HTTP round trip),
+        session which OC expired meanwhile is logged in again
+        """
          # xml, html
         format = "json"
 
-        s = requests.Session()
-        loginCredentials = { "j_username": self._username, "j_password" : self._clearpass }
-
         auth = None
         if self._proxyAuthEnabled:
             auth = HTTPBasicAuth(self._proxyAuthLogin, self._proxyAuthPassword)
@@ -383,23 +205,73 @@ class OCRestfulService:
         if ocBaseUrl.endswith("/") == False:
             ocBaseUrl += "/"
 
+        proxies = self._proxies()
+        url = ocBaseUrl + "rest/clinicaldata/" + format + "/view/" + method
+
+        if self._sessionCache is None:
+            s = self._login(ocBaseUrl, auth, proxies, requests.Session())
+            return s.get(url, auth=auth, verify=False, proxies=proxies)
+
+        for attempt in range(2):
+            s = self._sessionCache.login(self._username, self._clearpass, ocBaseUrl, lambda: self._login(ocBaseUrl, auth, proxies))
+            if s is None:
+                # Login failed, the request is answered with login page as before
+                s = requests.Session()
+
+            r = s.get(url, auth=auth, verify=False, proxies=proxies)
+            if not self._isLoginRequired(r):
+                break
+
+            self._logger.info("OpenClinica session expired, logging in again.")
+            self._sessionCache.invalidate(self._username, self._clearpass, ocBaseUrl, s)
+
+        return r
+
+    def _login(self, ocBaseUrl, auth, proxies, s=None):
+        """Spring security login to OpenClinica
+
+        Returns logged in session, or None when the login was not accepted (only for cached sessions)
+        """
+        cached = s is None
+        if cached:
+            s = requests.Session()
+
+        loginCredentials = { "j_username": self._username, "j_password" : self._clearpass }
+        r = s.post(ocBaseUrl + "j_spring_security_check", loginCredentials, auth=auth, verify=False, proxies=proxies)
+
+        if cached and self._isLoginRequired(r):
+            self._logger.error("OpenClinica login failed for user: " + str(self._username))
+            s.close()
+            return None
+
+        return s
+
+    def _isLoginRequired(self, r):
+        """Response is login page instead of requested resource (not logged in or session expired)
+        """
+        if r.status_code == 401:
+            return True
+
+        for response in list(r.history) + [r]:
+            if LOGINPAGE in response.url or LOGINPAGE in response.headers.get("Location", ""):
+                return True
+
+        return False
+
+    def _proxies(self):
+        """Proxies of OC requests
+        """
         # Application proxy enabled
         if self._proxyEnabled:
             if self._noProxy != "" and self._noProxy is not whitespace and self._noProxy in "https://" + self.__ip:
                 self._logger.info("Connecting without proxy because of no proxy: " + self._noProxy)
-                r = s.post(ocBaseUrl + "j_spring_security_check", loginCredentials, auth=auth, verify=False, proxies={})
-                r = s.get(ocBaseUrl + "rest/clinicaldata/" + format + "/view/" + method, auth=auth, verify=False, proxies={})
+                return {}
             else:
                 proxies = { "http" : "http://" + self._proxyHost + ":" + self._proxyPort, "https" : "https://" + self._proxyHost + ":" + self._proxyPort}
                 self._logger.info("Connecting with application defined proxy: " + str(proxies))
-                r = s.post(ocBaseUrl + "j_spring_security_check", loginCredentials, auth=auth, verify=False, proxies=proxies)
-                r = s.get(ocBaseUrl + "rest/clinicaldata/" + format + "/view/" + method, auth=auth, verify=False, proxies=proxies)
-        # Use system proxy
-        else:
-            #proxies = requests.utils.get_environ_proxies("https://" + self.__ip)
-            #self._logger.info("Using system proxy variables (no proxy applied): " + str(proxies))
-            
-            r = s.post(ocBaseUrl + "j_spring_security_check", loginCredentials, auth=auth, verify=False, proxies={})
-            r = s.get(ocBaseUrl + "rest/clinicaldata/" + format + "/view/" + method, auth=auth, verify=False, proxies={})
+                return proxies
 
-        return r
+        # Use system proxy
+        #proxies = requests.utils.get_environ_proxies("https://" + self.__ip)
+        #self._logger.info("Using system proxy variables (no proxy applied): " + str(proxies))
+        return {}
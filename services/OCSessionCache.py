@@ -0,0 +1,191 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import hashlib, threading, time
+
+# Collections
+from collections import OrderedDict
+
+# Logging
+import logging
+
+ ######  ######## ########  ##     ## ####  ######  ########
+##    ## ##       ##     ## ##     ##  ##  ##    ## ##
+##       ##       ##     ## ##     ##  ##  ##       ##
+ ######  ######   ########  ##     ##  ##  ##       ######
+      ## ##       ##   ##    ##   ##   ##  ##       ##
+##    ## ##       ##    ##    ## ##    ##  ##    ## ##
+ ######  ######## ##     ##    ###    ####  ######  ########
+
+class OCSessionCache(object):
+    """In-process cache of HTTP sessions logged in to OpenClinica
+
+    Maps (username, credential digest, OC base URL) to requests session carrying
+    the Spring security session cookie. Entries expire after TTL seconds without use
+    (sooner than the OC web session) and the least recently used entries are evicted
+    when the cache is full. Sessions which OC expired anyway are invalidated by caller.
+    """
+
+    def __init__(self, ttl=1200, maxSize=256):
+        """Default constructor
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.ttl = ttl
+        self.maxSize = maxSize
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Key -> lock serialising login of the key
+        self._loginLocks = {}
+
+        # Monitoring counters
+        self.hits = 0
+        self.misses = 0
+        self.logins = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def get(self, username, password, ocBaseUrl):
+        """Get logged in session or None when not cached
+        """
+        key = self._key(username, password, ocBaseUrl)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            session, expires = entry
+            if expires < time.time():
+                self.expirations += 1
+                self.misses += 1
+                self._close(session)
+                return None
+
+            # Most recently used entries are at the end, use extends the lifetime
+            self._entries[key] = (session, time.time() + self.ttl)
+            self.hits += 1
+
+            return session
+
+    def login(self, username, password, ocBaseUrl, loginFunction):
+        """Get logged in session, login with loginFunction() when it is not cached
+
+        Concurrent callers of one key wait for single login
+        loginFunction returns logged in session or None when the login failed
+        """
+        session = self.get(username, password, ocBaseUrl)
+        if session is not None:
+            return session
+
+        key = self._key(username, password, ocBaseUrl)
+        with self._lock:
+            loginLock = self._loginLocks.setdefault(key, threading.Lock())
+
+        with loginLock:
+            # Other thread logged in meanwhile
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] >= time.time():
+                    return entry[0]
+
+            session = loginFunction()
+
+            with self._lock:
+                self.logins += 1
+                if session is not None:
+                    self._put(key, session)
+                self._loginLocks.pop(key, None)
+
+        return session
+
+    def invalidate(self, username, password, ocBaseUrl, session):
+        """Remove session which OC does not accept anymore
+
+        Session which was already replaced by other thread is kept
+        """
+        key = self._key(username, password, ocBaseUrl)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is session:
+                del self._entries[key]
+                self.invalidations += 1
+                self._close(session)
+
+    def statistics(self):
+        """Cache counters for monitoring
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxSize": self.maxSize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "logins": self.logins,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _put(self, key, session):
+        """Store logged in session (lock is held by caller)
+        """
+        # Credentials of user changed, older sessions are not valid anymore
+        for k in [k for k in self._entries if k[0] == key[0] and k[2] == key[2] and k != key]:
+            self._close(self._entries.pop(k)[0])
+            self.invalidations += 1
+
+        previous = self._entries.pop(key, None)
+        if previous is not None and previous[0] is not session:
+            self._close(previous[0])
+
+        self._entries[key] = (session, time.time() + self.ttl)
+
+        while len(self._entries) > self.maxSize:
+            k, entry = self._entries.popitem(last=False)
+            self._close(entry[0])
+            self.evictions += 1
+
+    def _close(self, session):
+        """Release connections of session which is not cached anymore
+
+        Requests in progress with the session are not disturbed (closed pools are not reused)
+        """
+        try:
+            session.close()
+        except Exception:
+            pass
+
+    def _key(self, username, password, ocBaseUrl):
+        """Cache key, the credential itself is kept only as a digest
+        """
+        return (username, hashlib.sha256(username + "\0" + password).hexdigest(), ocBaseUrl)
@@ -8,7 +8,6 @@
 
 # Logging
 import logging
-import logging.config
 
 # SOAP
 import pysimplesoap.client
@@ -45,7 +44,6 @@ class OCStudyEventDefinitionWsService():
         """Default Constructor
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         proxies = None
 
@@ -8,7 +8,6 @@
 
 # Logging
 import logging
-import logging.config
 
 # Datetime
 from datetime import datetime
@@ -56,7 +55,6 @@ class OCStudySubjectWsService():
         """Default Constructor
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         proxies = None
 
@@ -200,17 +198,7 @@ class OCStudySubjectWsService():
             studySubjects.append(obtainedStudySubject)
 
         # Enhance with information from metadata
-        metadataEvents = self.loadEventsFromMetadata(metadata)
-
-        for ss in studySubjects:
-            for e in ss.events:
-                for me in metadataEvents:
-                    if e.eventDefinitionOID == me.oid():
-                        e.name = me.name()
-                        e.description = me.description
-                        e.isRepeating = me.repeating()
-                        e.eventType = me.type()
-                        e.category = me.category
+        self.addMetadataEvents(studySubjects, metadata)
 
         result = str(response.result)
         return studySubjects
@@ -382,6 +370,23 @@ class OCStudySubjectWsService():
         result = str(response.result)
         return result
 
+    def addMetadataEvents(self, studySubjects, metadata):
+        """Enhance events of study subjects with event definitions from ODM metadata XML
+        """
+        metadataEvents = self.loadEventsFromMetadata(metadata)
+
+        for ss in studySubjects:
+            for e in ss.events:
+                for me in metadataEvents:
+                    if e.eventDefinitionOID == me.oid():
+                        e.name = me.name()
+                        e.description = me.description
+                        e.isRepeating = me.repeating()
+                        e.eventType = me.type()
+                        e.category = me.category
+
+        return studySubjects
+
     def loadEventsFromMetadata(self, metadata):
         """Extract a list of Study Event domain objects according to ODM from metadata XML
         """
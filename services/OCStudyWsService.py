@@ -8,7 +8,6 @@
 
 # Logging
 import logging
-import logging.config
 
 # Domain
 from domain.Study import Study
@@ -56,7 +55,6 @@ class OCStudyWsService():
         """Default Constructor
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         proxies = None
 
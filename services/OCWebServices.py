@@ -8,7 +8,6 @@
 
 # Logging
 import logging
-import logging.config
 
 # PyQt - threading
 from PyQt4 import QtCore
@@ -71,7 +70,6 @@ class OCWebServices():
         Param ocConnectInfo holds the basic OpenClinica connection information
         """
         self._logger = logging.getLogger(__name__)
-        logging.config.fileConfig("logging.ini", disable_existing_loggers=False)
 
         self.ocConnectInfo = ocConnectInfo
 
@@ -183,6 +181,13 @@ class OCWebServices():
             return result
 
 
+    def addStudySubjectsMetadata(self, studySubjects, metadata):
+        """Enhance events of study subjects (listed without metadata) with ODM metadata
+
+        Returns the same collection of studySubject domain objects
+        """
+        return self.studySubjectBinding.addMetadataEvents(studySubjects, metadata)
+
     def listAllStudySubjectsByStudySite(self, data=None, thread=None):
         """Query all study subject by study site
 
@@ -260,3 +265,23 @@ class OCWebServices():
 
         return successful
 
+
+    #----------------------------------------------------------------------
+    #------------------------------ Connections ---------------------------
+
+    def bindings(self):
+        """SOAP bindings of all OC web services
+        """
+        return [self.studyBinding, self.dataBinding, self.studySubjectBinding, self.studyEventDefinitionBinding, self.eventBinding]
+
+    def close(self):
+        """Close kept-alive HTTP connections of all bindings (httplib2 transport keeps them per binding)
+        """
+        for binding in self.bindings():
+            connections = getattr(binding.client.http, "connections", {})
+            for connection in connections.values():
+                try:
+                    connection.close()
+                except Exception, err:
+                    self._logger.debug("SOAP connection close failed: " + str(err))
+            connections.clear()
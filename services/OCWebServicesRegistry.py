@@ -0,0 +1,180 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import hashlib, threading, time
+
+# Collections
+from collections import OrderedDict
+
+# Logging
+import logging
+
+# Services
+from services.OCWebServices import OCWebServices
+
+ ######  ######## ########  ##     ## ####  ######  ########
+##    ## ##       ##     ## ##     ##  ##  ##    ## ##
+##       ##       ##     ## ##     ##  ##  ##       ##
+ ######  ######   ########  ##     ##  ##  ##       ######
+      ## ##       ##   ##    ##   ##   ##  ##       ##
+##    ## ##       ##    ##    ## ##    ##  ##    ## ##
+ ######  ######## ##     ##    ###    ####  ######  ########
+
+class OCWebServicesRegistry(object):
+    """In-process registry of idle OC SOAP clients (OCWebServices with WSSE bound bindings)
+
+    Clients are keyed by (SOAP base URL, username, password hash digest). Caller acquires
+    a client for exclusive use and releases it afterwards, so one client (its bindings and
+    kept-alive HTTP connections) is never used by two requests at once and never by other user.
+    Idle clients expire after TTL seconds and the least recently released are evicted
+    when more than maxSize clients are idle.
+    """
+
+    def __init__(self, ttl=600, maxSize=32):
+        """Default constructor
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.ttl = ttl
+        self.maxSize = maxSize
+
+        # (key, sequence) -> (client, expires), most recently released at the end
+        self._idle = OrderedDict()
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self.created = 0
+        self.reused = 0
+        self.inUse = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.discarded = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def acquire(self, ocConnectInfo):
+        """Get idle client of the connection info or new one, client is exclusive to caller until released
+        """
+        key = self._key(ocConnectInfo)
+        expired = []
+
+        with self._lock:
+            client = None
+
+            # Most recently released client of the key has the warmest connections
+            for entryKey in reversed(self._idle.keys()):
+                if entryKey[0] != key:
+                    continue
+
+                entry, expires = self._idle.pop(entryKey)
+                if expires < time.time():
+                    self.expirations += 1
+                    expired.append(entry)
+                    continue
+
+                client = entry
+                break
+
+            self.inUse += 1
+            if client is not None:
+                self.reused += 1
+            else:
+                self.created += 1
+
+        for entry in expired:
+            entry.close()
+
+        if client is None:
+            try:
+                client = OCWebServices(ocConnectInfo)
+            except Exception:
+                with self._lock:
+                    self.inUse -= 1
+                raise
+
+        return client
+
+    def release(self, ocConnectInfo, client, reusable=True):
+        """Return client for reuse by later requests of the same user
+
+        Client whose last call failed can be released as not reusable, it is closed
+        """
+        key = self._key(ocConnectInfo)
+        closing = []
+
+        with self._lock:
+            self.inUse -= 1
+
+            if not reusable or self.maxSize <= 0:
+                self.discarded += 1
+                closing.append(client)
+            else:
+                self._sequence += 1
+                self._idle[(key, self._sequence)] = (client, time.time() + self.ttl)
+
+                # Expired clients of users which did not come back
+                now = time.time()
+                for entryKey in [k for k, (c, expires) in self._idle.items() if expires < now]:
+                    closing.append(self._idle.pop(entryKey)[0])
+                    self.expirations += 1
+
+                while len(self._idle) > self.maxSize:
+                    entryKey, entry = self._idle.popitem(last=False)
+                    closing.append(entry[0])
+                    self.evictions += 1
+
+        # Connections are closed outside of lock
+        for c in closing:
+            c.close()
+
+    def close(self):
+        """Close all idle clients
+        """
+        with self._lock:
+            clients = [entry[0] for entry in self._idle.values()]
+            self._idle.clear()
+
+        for c in clients:
+            c.close()
+
+    def statistics(self):
+        """Registry counters for monitoring
+        """
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "inUse": self.inUse,
+                "maxSize": self.maxSize,
+                "ttl": self.ttl,
+                "created": self.created,
+                "reused": self.reused,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "discarded": self.discarded
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _key(self, ocConnectInfo):
+        """Registry key, the password hash itself is kept only as a digest
+        """
+        return (ocConnectInfo.baseUrl, ocConnectInfo.userName, hashlib.sha256(ocConnectInfo.userName + "\0" + str(ocConnectInfo.passwordHash)).hexdigest())
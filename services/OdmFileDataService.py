@@ -18,6 +18,9 @@ from domain.Item import Item
 from domain.Study import Study
 from domain.StudyEventDefinition import StudyEventDefinition
 
+# Services
+from services.OdmMetadataIndex import OdmMetadataIndex
+
 
 # Domain
 # Preffer C accelerated version of ElementTree for XML parsing
@@ -193,6 +196,8 @@ class OdmFileDataService():
 
     def loadCrfItem(self, formOid, itemOid, metadata):
         """Load CRF item details from ODM metadata
+
+        Param metadata is XML ODM metadata or its OdmMetadataIndex (reused for repeated calls)
         """
         item = None
 
@@ -201,29 +206,19 @@ class OdmFileDataService():
 
         # Check if file path is setup
         if (metadata):
-            documentTree = ET.ElementTree((ET.fromstring(str(metadata))))
-
-            # Locate ItemDefs data in XML file via XPath
-            for itemElement in documentTree.iterfind('.//odm:ItemDef[@OID="' + itemOid + '"]', namespaces=nsmaps):
-                # Check FormOID, normally I would do it in XPath but python does not support contaions wildcard
-                if itemElement.attrib["{http://www.openclinica.org/ns/odm_ext_v130/v3.1}FormOIDs"].find(formOid) != -1:
-                    item = Item()
-                    item.oid = itemElement.attrib['OID']
-                    item.name = itemElement.attrib['Name']
-                    item.description = itemElement.attrib['Comment']
-                    item.dataType = itemElement.attrib['DataType']
-
-                    for itemDetails in itemElement:
-                        if (str(itemDetails.tag)).strip() == "{http://www.openclinica.org/ns/odm_ext_v130/v3.1}ItemDetails":
-                            for detailsElement in itemDetails:
-                                if (str(detailsElement.tag)).strip() == "{http://www.openclinica.org/ns/odm_ext_v130/v3.1}ItemPresentInForm":
-                                    for presentForm in detailsElement:
-                                        if (str(presentForm.tag)).strip() == "{http://www.openclinica.org/ns/odm_ext_v130/v3.1}LeftItemText":
-                                            item.label = presentForm.text
+            item = self.indexMetadata(metadata).item(formOid, itemOid)
 
         # Return resulting CRT item
         return item
 
+    def indexMetadata(self, metadata):
+        """Index ODM metadata once for repeated lookups (already built index is returned as it is)
+        """
+        if isinstance(metadata, OdmMetadataIndex):
+            return metadata
+
+        return OdmMetadataIndex(metadata)
+
     def loadExportMapping(self, eventCrf):
         """
         """
@@ -387,6 +382,9 @@ class OdmFileDataService():
             item.value = ivalue
             items.append(item)
 
+        # Metadata is indexed once for all lookups
+        metadata = self.indexMetadata(metadata)
+
         patientIdItemOid = self.getItemOidFromMetadata(metadata, studyEventCrf.defaultCrfVersion().oid(), self.ocPatientIdItemName)
         studyUidItemOid = self.getItemOidFromMetadata(metadata, studyEventCrf.defaultCrfVersion().oid(), self.ocStudyUidItemName)
 
@@ -416,51 +414,20 @@ class OdmFileDataService():
     def getItemOidFromMetadata(self, metadata, formOid, itemName):
         """Get item OID from metadata when form and itemName are known
 
-        Param metadata study metadata
+        Param metadata study metadata (or its OdmMetadataIndex)
         Param formOid specify which form to search in metadata
         Param itemName specify which item to search
         Return string OID value of specified itemName from metadata or None
         """
-        documentTree = ET.ElementTree((ET.fromstring(str(metadata))))
-
-        itemOids = []
-
-        # Locate ItemDefs data in XML file via XPath
-        for item in documentTree.iterfind('.//odm:ItemDef[@OpenClinica:FormOIDs="' + formOid + '"]' + '[@Name="' + itemName + '"]', namespaces=nsmaps):
-            itemOids.append(item.attrib['OID'])
-
-        if len(itemOids) == 1:
-            return itemOids[0]
-        else:
-            return None
+        return self.indexMetadata(metadata).itemOid(formOid, itemName)
 
     def getItemGroupOidFromMetadata(self, metadata, itemOid):
         """
-        Param metadata study metadata
+        Param metadata study metadata (or its OdmMetadataIndex)
         Param itemOid specifies the oid of item which group we are searching
         Retrun string OID value of found ItemGroupDef or None
         """
-        documentTree = ET.ElementTree((ET.fromstring(str(metadata))))
-
-        itemGroupOids = []
-
-        groupFound = False
-        # Locate ItemGroupDefs data in XML file via XPath
-        for group in documentTree.iterfind('.//odm:ItemGroupDef', namespaces=nsmaps):
-            for element in group:
-                if (str(element.tag)).strip() == "{http://www.cdisc.org/ns/odm/v1.3}ItemRef":
-                    if element.attrib['ItemOID'] == itemOid:
-                        itemGroupOids.append(group.attrib['OID'])
-                        groupFound = True
-                        break;
-
-            if groupFound:
-                break
-
-        if len(itemGroupOids) == 1:
-            return itemGroupOids[0]
-        else:
-            return None
+        return self.indexMetadata(metadata).itemGroupOid(itemOid)
 
     def getRadPlanBioDicomItemNamesFromMetadata():
         pass
\ No newline at end of file
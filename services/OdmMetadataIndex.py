@@ -0,0 +1,175 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Domain
+from domain.Item import Item
+
+# Preffer C accelerated version of ElementTree for XML parsing
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Qualified tag and attribute names of ODM and OpenClinica extension
+ODM = "{http://www.cdisc.org/ns/odm/v1.3}"
+OPENCLINICA = "{http://www.openclinica.org/ns/odm_ext_v130/v3.1}"
+
+ ######  ##          ###     ######   ######  ########  ######
+##    ## ##         ## ##   ##    ## ##    ## ##       ##    ##
+##       ##        ##   ##  ##       ##       ##       ##
+##       ##       ##     ##  ######   ######  ######    ######
+##       ##       #########       ##       ## ##             ##
+##    ## ##       ##     ## ##    ## ##    ## ##       ##    ##
+ ######  ######## ##     ##  ######   ######  ########  ######
+
+class OdmMetadataIndex(object):
+    """Study ODM metadata parsed once into dictionaries for repeated lookups
+
+    Maps item OID to ItemDef (with its FormOIDs), form to item groups, item group to items
+    and study event definition to forms. Index is read only after construction so it can be
+    shared by concurrent requests (StudyMetadataCache).
+    """
+
+    def __init__(self, metadata):
+        """Constructor
+
+        Param metadata is XML ODM metadata of study (string)
+        """
+        # Item OID -> Item, item OID -> FormOIDs attribute of its ItemDef
+        self.items = {}
+        self.itemFormOids = {}
+
+        # (FormOIDs attribute, item name) -> item OIDs
+        self._itemOidsByName = {}
+
+        # Item OID -> OID of first ItemGroupDef referencing the item
+        self._itemGroupOids = {}
+
+        # Form OID -> item group OIDs, item group OID -> item OIDs, event OID -> form OIDs
+        self.formItemGroups = {}
+        self.itemGroupItems = {}
+        self.eventForms = {}
+
+        self._build(ET.fromstring(str(metadata)))
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def item(self, formOid, itemOid):
+        """Copy of ItemDef when the item is present in form, None otherwise
+        """
+        itemDef = self.items.get(itemOid)
+        if itemDef is None or self.itemFormOids[itemOid].find(formOid) == -1:
+            return None
+
+        # Index is shared, caller gets own item
+        item = Item()
+        item.oid = itemDef.oid
+        item.name = itemDef.name
+        item.description = itemDef.description
+        item.dataType = itemDef.dataType
+        item.label = itemDef.label
+
+        return item
+
+    def itemOid(self, formOid, itemName):
+        """OID of item with name which is defined only for the form or None (also when name is ambiguous)
+        """
+        itemOids = self._itemOidsByName.get((formOid, itemName), [])
+        if len(itemOids) == 1:
+            return itemOids[0]
+
+        return None
+
+    def itemGroupOid(self, itemOid):
+        """OID of first item group referencing the item or None
+        """
+        return self._itemGroupOids.get(itemOid)
+
+    def formItems(self, formOid):
+        """OIDs of items in form ordered by its item groups
+        """
+        itemOids = []
+        for groupOid in self.formItemGroups.get(formOid, []):
+            itemOids.extend(self.itemGroupItems.get(groupOid, []))
+
+        return itemOids
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _build(self, root):
+        """Single pass over definitions of metadata (direct children of MetaDataVersion)
+        """
+        for study in root:
+            for version in study:
+                if version.tag != ODM + "MetaDataVersion":
+                    continue
+
+                for element in version:
+                    if element.tag == ODM + "ItemDef":
+                        self._addItem(element)
+                    elif element.tag == ODM + "ItemGroupDef":
+                        self._addItemGroup(element)
+                    elif element.tag == ODM + "FormDef":
+                        self.formItemGroups[element.attrib["OID"]] = [ref.attrib["ItemGroupOID"] for ref in element if ref.tag == ODM + "ItemGroupRef"]
+                    elif element.tag == ODM + "StudyEventDef":
+                        self.eventForms[element.attrib["OID"]] = [ref.attrib["FormOID"] for ref in element if ref.tag == ODM + "FormRef"]
+
+    def _addItemGroup(self, element):
+        """Items of ItemGroupDef
+        """
+        groupOid = element.attrib["OID"]
+        itemOids = [ref.attrib["ItemOID"] for ref in element if ref.tag == ODM + "ItemRef"]
+        self.itemGroupItems[groupOid] = itemOids
+
+        # Group which comes first in document wins
+        for itemOid in itemOids:
+            self._itemGroupOids.setdefault(itemOid, groupOid)
+
+    def _addItem(self, element):
+        """ItemDef with its label
+        """
+        item = Item()
+        item.oid = element.attrib["OID"]
+        item.name = element.attrib.get("Name", "")
+        item.description = element.attrib.get("Comment", "")
+        item.dataType = element.attrib.get("DataType", "")
+
+        # Label is the left item text of (last) form the item is present in
+        for itemDetails in element:
+            if itemDetails.tag == OPENCLINICA + "ItemDetails":
+                for presentInForm in itemDetails:
+                    if presentInForm.tag == OPENCLINICA + "ItemPresentInForm":
+                        for text in presentInForm:
+                            if text.tag == OPENCLINICA + "LeftItemText":
+                                item.label = text.text
+
+        formOids = element.attrib.get(OPENCLINICA + "FormOIDs", "")
+
+        self.items[item.oid] = item
+        self.itemFormOids[item.oid] = formOids
+        self._itemOidsByName.setdefault((formOids, item.name), []).append(item.oid)
@@ -0,0 +1,359 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import hashlib, os, tempfile, threading, time
+
+# Collections
+from collections import OrderedDict
+
+# Logging
+import logging
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Parsed index is estimated as this multiple of raw ODM size (for memory bound)
+INDEXSIZEFACTOR = 4
+
+ ######  ##          ###     ######   ######  ########  ######
+##    ## ##         ## ##   ##    ## ##    ## ##       ##    ##
+##       ##        ##   ##  ##       ##       ##       ##
+##       ##       ##     ##  ######   ######  ######    ######
+##       ##       #########       ##       ## ##             ##
+##    ## ##       ##     ## ##    ## ##    ## ##       ##    ##
+ ######  ######## ##     ##  ######   ######  ########  ######
+
+class StudyMetadata(object):
+    """ODM metadata document of study with its parsed index (built once per version)
+    """
+
+    def __init__(self, key, odm, version, fetched, indexFunction):
+        """Constructor
+        """
+        self.key = key
+        self.odm = odm
+        self.version = version
+        self.fetched = fetched
+        self.digest = hashlib.sha1(odm).hexdigest()
+
+        self._indexFunction = indexFunction
+        self._index = None
+        self._indexLock = threading.Lock()
+
+    def index(self):
+        """Parsed index of ODM, built on first use
+        """
+        if self._index is None and self._indexFunction is not None:
+            with self._indexLock:
+                if self._index is None:
+                    self._index = self._indexFunction(self.odm)
+
+        return self._index
+
+    def size(self):
+        """Estimated memory of raw ODM and its parsed index in bytes
+        """
+        size = len(self.odm)
+        if self._index is not None:
+            size += len(self.odm) * INDEXSIZEFACTOR
+
+        return size
+
+class StudyMetadataCache(object):
+    """In-process cache of study ODM metadata with stale-while-revalidate refresh
+
+    Entries are keyed by (SOAP base URL, study identifier). Entry younger than TTL is
+    returned as it is, older entry (up to maxStale) is returned immediately while it is
+    refreshed in background. Version of entry increases only when refreshed ODM differs,
+    so unchanged metadata keeps its parsed index. Least recently used entries are evicted
+    above maxBytes. Optional directory keeps raw ODM across restarts.
+    """
+
+    def __init__(self, ttl=300, maxStale=3600, maxBytes=64 * 1024 * 1024, directory=None, executor=None, indexFunction=None):
+        """Constructor
+
+        Param executor is BoundedExecutor for background refresh (new thread per refresh without it)
+        Param indexFunction builds parsed index from raw ODM
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.ttl = ttl
+        self.maxStale = maxStale
+        self.maxBytes = maxBytes
+        self.directory = directory
+        self.executor = executor
+        self.indexFunction = indexFunction
+
+        if self.directory is not None and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Key -> lock serialising loading of the key, keys refreshed in background
+        self._loadLocks = {}
+        self._refreshing = set()
+
+        # Monitoring counters
+        self.hits = 0
+        self.staleHits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.loads = 0
+        self.refreshes = 0
+        self.changes = 0
+        self.failures = 0
+        self.evictions = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def get(self, key, loader, refreshLoader=None):
+        """Get metadata of study or None when it cannot be loaded
+
+        Param loader returns raw ODM or None on failure, it is called by caller on miss
+        Param refreshLoader is used for background refresh (default loader), it must not
+        share resources of caller request which end with the request
+        """
+        entry = self._lookup(key)
+
+        if entry is None:
+            return self._load(key, loader)
+
+        if time.time() - entry.fetched > self.ttl:
+            self._refresh(key, refreshLoader or loader)
+
+        return entry
+
+    def invalidate(self, key):
+        """Forget metadata of study (e.g. after study design change)
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self.directory is not None:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def statistics(self):
+        """Cache counters for monitoring
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e.size() for e in self._entries.values()),
+                "maxBytes": self.maxBytes,
+                "ttl": self.ttl,
+                "maxStale": self.maxStale,
+                "hits": self.hits,
+                "staleHits": self.staleHits,
+                "diskHits": self.diskHits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "refreshes": self.refreshes,
+                "changes": self.changes,
+                "failures": self.failures,
+                "evictions": self.evictions
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _lookup(self, key):
+        """Entry from memory or disk which is not older than maxStale, None otherwise
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                age = time.time() - entry.fetched
+                if age <= self.maxStale:
+                    # Most recently used entries are at the end
+                    self._entries[key] = entry
+                    if age <= self.ttl:
+                        self.hits += 1
+                    else:
+                        self.staleHits += 1
+                    return entry
+
+        entry = self._readDisk(key)
+        if entry is not None:
+            with self._lock:
+                self.diskHits += 1
+                self._put(entry)
+
+        return entry
+
+    def _load(self, key, loader):
+        """Load missing entry, concurrent callers of one key wait for single load
+        """
+        with self._lock:
+            loadLock = self._loadLocks.setdefault(key, threading.Lock())
+
+        with loadLock:
+            # Other thread loaded meanwhile
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.time() - entry.fetched <= self.ttl:
+                    self.hits += 1
+                    return entry
+
+                self.misses += 1
+
+            try:
+                entry = self._fetch(key, loader)
+            finally:
+                with self._lock:
+                    self._loadLocks.pop(key, None)
+
+        return entry
+
+    def _refresh(self, key, loader):
+        """Refresh stale entry in background, one refresh of key at a time
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(key, loader)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        if self.executor is not None:
+            self.executor.submit(refresh, self._refreshed)
+        else:
+            t = threading.Thread(target=refresh, name="MetadataRefresh")
+            t.daemon = True
+            t.start()
+
+    def _refreshed(self, result, error):
+        """Background refresh finished
+        """
+        if error is not None:
+            self._logger.error("Study metadata refresh failed: " + str(error[1]))
+
+    def _fetch(self, key, loader):
+        """Call loader and store new version of entry, failed load keeps previous entry
+        """
+        try:
+            odm = loader()
+        except Exception, err:
+            odm = None
+            self._logger.error("Study metadata of " + str(key[1]) + " could not be loaded: " + str(err))
+
+        with self._lock:
+            self.loads += 1
+            previous = self._entries.get(key)
+
+            if not odm:
+                self.failures += 1
+                return None
+
+            if previous is not None and previous.digest == hashlib.sha1(odm).hexdigest():
+                # Unchanged metadata keeps its version and parsed index
+                previous.fetched = time.time()
+                self.refreshes += 1
+                entry = previous
+                changed = False
+            else:
+                version = 1
+                if previous is not None:
+                    version = previous.version + 1
+                    self.changes += 1
+                entry = StudyMetadata(key, odm, version, time.time(), self.indexFunction)
+                self._put(entry)
+                changed = True
+
+        if changed:
+            self._writeDisk(entry)
+        else:
+            self._touchDisk(entry)
+
+        return entry
+
+    def _put(self, entry):
+        """Store entry and evict least recently used entries above memory bound (lock is held by caller)
+        """
+        self._entries.pop(entry.key, None)
+        self._entries[entry.key] = entry
+
+        size = sum(e.size() for e in self._entries.values())
+        while size > self.maxBytes and len(self._entries) > 1:
+            key, evicted = self._entries.popitem(last=False)
+            size -= evicted.size()
+            self.evictions += 1
+
+    def _path(self, key):
+        """File of entry in disk tier
+        """
+        return os.path.join(self.directory, hashlib.sha1((key[0] + "\0" + key[1]).encode("utf-8")).hexdigest() + ".xml")
+
+    def _readDisk(self, key):
+        """Entry from disk tier (fetch time is modification time of its file) or None
+        """
+        if self.directory is None:
+            return None
+
+        path = self._path(key)
+        try:
+            fetched = os.path.getmtime(path)
+            if time.time() - fetched > self.maxStale:
+                return None
+
+            with open(path, "rb") as f:
+                odm = f.read()
+        except (IOError, OSError):
+            return None
+
+        return StudyMetadata(key, odm, 1, fetched, self.indexFunction)
+
+    def _writeDisk(self, entry):
+        """Store raw ODM in disk tier atomically
+        """
+        if self.directory is None:
+            return
+
+        try:
+            fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(entry.odm)
+            os.rename(temp, self._path(entry.key))
+        except (IOError, OSError), err:
+            self._logger.error("Study metadata could not be stored on disk: " + str(err))
+
+    def _touchDisk(self, entry):
+        """Mark unchanged ODM in disk tier as fetched now
+        """
+        if self.directory is None:
+            return
+
+        try:
+            os.utime(self._path(entry.key), None)
+        except OSError:
+            self._writeDisk(entry)
@@ -0,0 +1,314 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import sys, threading
+
+# Queue
+import Queue
+
+# Logging
+import logging
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Seconds between checks whether the caller cancelled the batch
+CANCELCHECKINTERVAL = 0.25
+
+ ######  ##          ###     ######   ######  ########  ######
+##    ## ##         ## ##   ##    ## ##    ## ##       ##    ##
+##       ##        ##   ##  ##       ##       ##       ##
+##       ##       ##     ##  ######   ######  ######    ######
+##       ##       #########       ##       ## ##             ##
+##    ## ##       ##     ## ##    ## ##    ## ##       ##    ##
+ ######  ######## ##     ##  ######   ######  ########  ######
+
+class Cancelled(Exception):
+    """Batch was cancelled before all its tasks were executed
+    """
+    pass
+
+class _Batch(object):
+    """Tasks of one map call, results are kept in item order
+    """
+
+    def __init__(self, function, items, concurrency):
+        """Constructor
+        """
+        self.function = function
+        self.items = items
+        self.concurrency = concurrency
+
+        self.results = [None] * len(items)
+        self.error = None
+        self.cancelled = False
+
+        # Index of next item to submit, number of submitted and of finished tasks
+        self.next = 0
+        self.running = 0
+        self.finished = 0
+
+        self.condition = threading.Condition()
+
+    def isDone(self):
+        """All submitted tasks finished and nothing more will be submitted (lock is held by caller)
+        """
+        if self.cancelled or self.error is not None:
+            return self.running == 0
+
+        return self.finished == len(self.items)
+
+class BoundedExecutor(object):
+    """Shared pool of threads executing independent tasks of requests concurrently
+
+    Every map call runs its tasks with at most concurrency tasks in flight, so one
+    request cannot occupy the whole pool. Results are returned in item order
+    regardless of completion order. Cancelled batch does not start its pending tasks.
+    """
+
+    def __init__(self, workers=16, name="Fanout"):
+        """Constructor
+
+        Param workers is number of pool threads, with 0 tasks are executed by caller one by one
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.workers = workers
+        self.name = name
+
+        self._tasks = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self._batches = 0
+        self._cancelledBatches = 0
+        self._executed = 0
+        self._skipped = 0
+        self._failed = 0
+        self._busy = 0
+        self._peakBusy = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def start(self):
+        """Start pool threads
+        """
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=self.name + "-" + str(i))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+        self._logger.info(self.name + " executor started with " + str(self.workers) + " threads")
+
+    def stop(self):
+        """Let pool threads finish queued tasks and stop them
+        """
+        for t in self._threads:
+            self._tasks.put(None)
+        for t in self._threads:
+            t.join()
+
+        self._threads = []
+
+    def map(self, function, items, concurrency=4, cancelled=None):
+        """Execute function(item) for every item and return results in item order
+
+        Param concurrency is maximum of tasks of this call executed at once
+        Param cancelled is callable polled while waiting, when it returns True pending tasks
+        are not started and Cancelled is raised (after tasks in progress finished)
+        Exception of task stops the batch and is raised to caller
+        """
+        items = list(items)
+        batch = _Batch(function, items, max(1, concurrency))
+
+        with self._lock:
+            self._batches += 1
+
+        if len(self._threads) == 0:
+            return self._runInline(batch, cancelled)
+
+        with batch.condition:
+            self._submit(batch)
+
+            while not batch.isDone():
+                if not batch.cancelled and cancelled is not None and cancelled():
+                    batch.cancelled = True
+                    continue
+
+                batch.condition.wait(CANCELCHECKINTERVAL)
+
+        return self._result(batch)
+
+    def submit(self, function, callback):
+        """Execute function() by pool thread, callback(result, error) is called by the thread when it finished
+
+        Error is exception info of failed function (None on success)
+        Without pool threads the function and callback are executed by caller
+        """
+        if len(self._threads) == 0:
+            self._runSubmitted(function, callback)
+        else:
+            self._tasks.put((self._runSubmitted, (function, callback)))
+
+    def statistics(self):
+        """Executor counters for monitoring
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "peakBusy": self._peakBusy,
+                "queued": self._tasks.qsize(),
+                "batches": self._batches,
+                "cancelledBatches": self._cancelledBatches,
+                "executed": self._executed,
+                "skipped": self._skipped,
+                "failed": self._failed
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _submit(self, batch):
+        """Queue next items of batch up to its concurrency (batch lock is held by caller)
+        """
+        while not batch.cancelled and batch.error is None and batch.running < batch.concurrency and batch.next < len(batch.items):
+            self._tasks.put((self._runBatchTask, (batch, batch.next)))
+            batch.next += 1
+            batch.running += 1
+
+    def _work(self):
+        """Pool thread body
+        """
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+
+            function, args = task
+            function(*args)
+
+    def _runBatchTask(self, batch, index):
+        """Execute item of batch and queue next item of the batch
+        """
+        # Batch was stopped while the task was waiting in queue
+        if batch.cancelled or batch.error is not None:
+            with self._lock:
+                self._skipped += 1
+            with batch.condition:
+                batch.running -= 1
+                batch.condition.notify()
+            return
+
+        result, error = self._call(batch.function, batch.items[index])
+
+        with batch.condition:
+            batch.running -= 1
+            batch.results[index] = result
+            if error is not None:
+                if batch.error is None:
+                    batch.error = error
+            else:
+                batch.finished += 1
+
+            self._submit(batch)
+            batch.condition.notify()
+
+    def _runSubmitted(self, function, callback):
+        """Execute submitted function and report its outcome
+        """
+        result, error = self._call(function)
+        try:
+            callback(result, error)
+        except Exception, err:
+            self._logger.error(self.name + " callback failed: " + str(err))
+
+    def _call(self, function, *args):
+        """Execute function with counting, returns result and exception info (None on success)
+        """
+        self._enter()
+        error = None
+        try:
+            result = function(*args)
+        except Exception:
+            result = None
+            error = sys.exc_info()
+        self._leave(error is not None)
+
+        return result, error
+
+    def _runInline(self, batch, cancelled):
+        """Execute batch in caller thread item by item
+        """
+        for index, item in enumerate(batch.items):
+            if cancelled is not None and cancelled():
+                batch.cancelled = True
+                break
+
+            batch.next = index + 1
+
+            self._enter()
+            try:
+                batch.results[index] = batch.function(item)
+            except Exception:
+                self._leave(True)
+                raise
+            self._leave(False)
+
+            batch.finished += 1
+
+        return self._result(batch)
+
+    def _result(self, batch):
+        """Results of finished batch, raise its error or cancellation
+        """
+        if batch.error is not None:
+            raise batch.error[0], batch.error[1], batch.error[2]
+
+        if batch.cancelled:
+            with self._lock:
+                self._cancelledBatches += 1
+                self._skipped += len(batch.items) - batch.next
+            raise Cancelled(str(len(batch.items) - batch.finished) + " of " + str(len(batch.items)) + " tasks not executed")
+
+        return batch.results
+
+    def _enter(self):
+        """Task started
+        """
+        with self._lock:
+            self._busy += 1
+            self._peakBusy = max(self._peakBusy, self._busy)
+
+    def _leave(self, failed):
+        """Task finished
+        """
+        with self._lock:
+            self._busy -= 1
+            self._executed += 1
+            if failed:
+                self._failed += 1
@@ -0,0 +1,42 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import threading
+
+ ######  ##          ###     ######   ######
+##    ## ##         ## ##   ##    ## ##    ##
+##       ##        ##   ##  ##       ##
+##       ##       ##     ##  ######   ######
+##       ##       #########       ##       ##
+##    ## ##       ##     ## ##    ## ##    ##
+ ######  ######## ##     ##  ######   ######
+
+class Counters(object):
+    """Named monitoring counters shared by request handler threads
+    """
+
+    def __init__(self, names=()):
+        """Constructor
+
+        Param names are counters reported even when they were not incremented yet
+        """
+        self._lock = threading.Lock()
+        self._counters = dict((name, 0) for name in names)
+
+    def increment(self, name, value=1):
+        """Increment counter
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def statistics(self):
+        """Snapshot of counters for monitoring
+        """
+        with self._lock:
+            return dict(self._counters)
@@ -0,0 +1,513 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import os, socket, struct, time
+
+# Logging
+import logging
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# PDU types (PS3.8 9.3)
+ASSOCIATERQ = 0x01
+ASSOCIATEAC = 0x02
+ASSOCIATERJ = 0x03
+PDATATF = 0x04
+RELEASERQ = 0x05
+RELEASERP = 0x06
+ABORT = 0x07
+
+# Item types
+APPLICATIONCONTEXTITEM = 0x10
+PRESENTATIONCONTEXTRQITEM = 0x20
+PRESENTATIONCONTEXTACITEM = 0x21
+ABSTRACTSYNTAXITEM = 0x30
+TRANSFERSYNTAXITEM = 0x40
+USERINFORMATIONITEM = 0x50
+MAXIMUMLENGTHITEM = 0x51
+IMPLEMENTATIONCLASSITEM = 0x52
+IMPLEMENTATIONVERSIONITEM = 0x55
+
+# PDV message control header
+COMMANDFRAGMENT = 0x01
+LASTFRAGMENT = 0x02
+
+# DICOM application context
+APPLICATIONCONTEXT = "1.2.840.10008.3.1.1.1"
+
+# Command sets are always implicit VR little endian
+IMPLICITVRLITTLEENDIAN = "1.2.840.10008.1.2"
+
+# Implementation identification
+IMPLEMENTATIONCLASSUID = "2.25.176394327745382214632716528391126580611"
+IMPLEMENTATIONVERSION = "RPB_SERVER"
+
+# DIMSE
+CSTORERQ = 0x0001
+CSTORERSP = 0x8001
+NODATASET = 0x0101
+PRIORITYMEDIUM = 0x0000
+
+# Command elements (group 0000)
+COMMANDGROUPLENGTH = 0x0000
+AFFECTEDSOPCLASSUID = 0x0002
+COMMANDFIELD = 0x0100
+MESSAGEID = 0x0110
+MESSAGEIDBEINGRESPONDEDTO = 0x0120
+PRIORITY = 0x0700
+COMMANDDATASETTYPE = 0x0800
+STATUS = 0x0900
+AFFECTEDSOPINSTANCEUID = 0x1000
+
+# Maximum P-DATA-TF length we receive (0 would be unlimited)
+MAXPDULENGTH = 65536
+
+# Presentation context IDs are odd numbers 1 - 255
+MAXPRESENTATIONCONTEXTS = 128
+
+# Size of dataset chunk read from file when peer does not limit PDU length
+CHUNKSIZE = 65536
+
+ ######## ##     ##  ######  ######## ########  ######## ####  #######  ##    ##  ######
+ ##        ##   ##  ##    ## ##       ##     ##    ##     ##  ##     ## ###   ## ##    ##
+ ##         ## ##   ##       ##       ##     ##    ##     ##  ##     ## ####  ## ##
+ ######      ###    ##       ######   ########     ##     ##  ##     ## ## ## ##  ######
+ ##         ## ##   ##       ##       ##           ##     ##  ##     ## ##  ####       ##
+ ##        ##   ##  ##    ## ##       ##           ##     ##  ##     ## ##   ### ##    ##
+ ######## ##     ##  ######  ######## ##           ##    ####  #######  ##    ##  ######
+
+class DicomNetworkError(Exception):
+    """Association could not be established or was aborted
+    """
+    pass
+
+######## ##    ##  ######   #######  ########  #### ##    ##  ######
+##       ###   ## ##    ## ##     ## ##     ##  ##  ###   ## ##    ##
+##       ####  ## ##       ##     ## ##     ##  ##  ####  ## ##
+######   ## ## ## ##       ##     ## ##     ##  ##  ## ## ## ##   ####
+##       ##  #### ##       ##     ## ##     ##  ##  ##  #### ##    ##
+##       ##   ### ##    ## ##     ## ##     ##  ##  ##   ### ##    ##
+######## ##    ##  ######   #######  ########  #### ##    ##  ######
+
+def isSuccess(status):
+    """C-STORE status means the instance was stored (success or warning)
+    """
+    return status is not None and (status == 0x0000 or status == 0x0001 or (status & 0xF000) == 0xB000)
+
+def encodePdu(pduType, value):
+    """PDU with type and 4 byte length header
+    """
+    return struct.pack(">BBI", pduType, 0, len(value)) + value
+
+def encodeItem(itemType, value):
+    """Variable item with type and 2 byte length header
+    """
+    return struct.pack(">BBH", itemType, 0, len(value)) + value
+
+def encodeAeTitle(aeTitle):
+    """AE title field (16 bytes, space padded)
+    """
+    return str(aeTitle)[:16].ljust(16)
+
+def encodeUserInformation(maxPduLength):
+    """User information item with maximum length and implementation identification
+    """
+    return encodeItem(USERINFORMATIONITEM,
+        encodeItem(MAXIMUMLENGTHITEM, struct.pack(">I", maxPduLength)) +
+        encodeItem(IMPLEMENTATIONCLASSITEM, IMPLEMENTATIONCLASSUID) +
+        encodeItem(IMPLEMENTATIONVERSIONITEM, IMPLEMENTATIONVERSION))
+
+def encodeAssociateRq(callingAeTitle, calledAeTitle, contexts, maxPduLength=MAXPDULENGTH):
+    """A-ASSOCIATE-RQ PDU
+
+    Param contexts is list of (presentation context id, abstract syntax, [transfer syntaxes])
+    """
+    items = encodeItem(APPLICATIONCONTEXTITEM, APPLICATIONCONTEXT)
+    for contextId, abstractSyntax, transferSyntaxes in contexts:
+        value = struct.pack(">BBBB", contextId, 0, 0, 0)
+        value += encodeItem(ABSTRACTSYNTAXITEM, abstractSyntax)
+        for transferSyntax in transferSyntaxes:
+            value += encodeItem(TRANSFERSYNTAXITEM, transferSyntax)
+        items += encodeItem(PRESENTATIONCONTEXTRQITEM, value)
+    items += encodeUserInformation(maxPduLength)
+
+    return encodePdu(ASSOCIATERQ, struct.pack(">HH", 1, 0) + encodeAeTitle(calledAeTitle) + encodeAeTitle(callingAeTitle) + "\0" * 32 + items)
+
+def encodeAssociateAc(callingAeTitle, calledAeTitle, results, maxPduLength=MAXPDULENGTH):
+    """A-ASSOCIATE-AC PDU (used by SCP side)
+
+    Param results is list of (presentation context id, result, transfer syntax)
+    """
+    items = encodeItem(APPLICATIONCONTEXTITEM, APPLICATIONCONTEXT)
+    for contextId, result, transferSyntax in results:
+        items += encodeItem(PRESENTATIONCONTEXTACITEM, struct.pack(">BBBB", contextId, 0, result, 0) + encodeItem(TRANSFERSYNTAXITEM, transferSyntax))
+    items += encodeUserInformation(maxPduLength)
+
+    return encodePdu(ASSOCIATEAC, struct.pack(">HH", 1, 0) + encodeAeTitle(calledAeTitle) + encodeAeTitle(callingAeTitle) + "\0" * 32 + items)
+
+def encodeReleaseRq():
+    """A-RELEASE-RQ PDU
+    """
+    return encodePdu(RELEASERQ, "\0" * 4)
+
+def encodeReleaseRp():
+    """A-RELEASE-RP PDU
+    """
+    return encodePdu(RELEASERP, "\0" * 4)
+
+def encodeAbort():
+    """A-ABORT PDU (service user initiated)
+    """
+    return encodePdu(ABORT, "\0" * 4)
+
+def encodePdataHeader(contextId, control, length):
+    """Header of P-DATA-TF PDU with one PDV of length bytes
+    """
+    return struct.pack(">BBIIBB", PDATATF, 0, length + 6, length + 2, contextId, control)
+
+def encodeElement(element, value):
+    """Command element (group 0000, implicit VR little endian, even length)
+    """
+    if len(value) % 2:
+        value += "\0"
+
+    return struct.pack("<HHI", 0x0000, element, len(value)) + value
+
+def encodeCommand(elements):
+    """Command set from list of (element, value) with leading group length
+
+    Integer values are encoded as US
+    """
+    data = ""
+    for element, value in elements:
+        if isinstance(value, (int, long)):
+            value = struct.pack("<H", value)
+        data += encodeElement(element, value)
+
+    return encodeElement(COMMANDGROUPLENGTH, struct.pack("<I", len(data))) + data
+
+def encodeCStoreRq(messageId, sopClassUid, sopInstanceUid):
+    """C-STORE-RQ command set
+    """
+    return encodeCommand([
+        (AFFECTEDSOPCLASSUID, sopClassUid),
+        (COMMANDFIELD, CSTORERQ),
+        (MESSAGEID, messageId),
+        (PRIORITY, PRIORITYMEDIUM),
+        (COMMANDDATASETTYPE, 0x0000),
+        (AFFECTEDSOPINSTANCEUID, sopInstanceUid)
+    ])
+
+def encodeCStoreRsp(messageId, sopClassUid, sopInstanceUid, status):
+    """C-STORE-RSP command set (used by SCP side)
+    """
+    return encodeCommand([
+        (AFFECTEDSOPCLASSUID, sopClassUid),
+        (COMMANDFIELD, CSTORERSP),
+        (MESSAGEIDBEINGRESPONDEDTO, messageId),
+        (COMMANDDATASETTYPE, NODATASET),
+        (STATUS, status),
+        (AFFECTEDSOPINSTANCEUID, sopInstanceUid)
+    ])
+
+########  ########  ######   #######  ########  #### ##    ##  ######
+##     ## ##       ##    ## ##     ## ##     ##  ##  ###   ## ##    ##
+##     ## ##       ##       ##     ## ##     ##  ##  ####  ## ##
+##     ## ######   ##       ##     ## ##     ##  ##  ## ## ## ##   ####
+##     ## ##       ##       ##     ## ##     ##  ##  ##  #### ##    ##
+##     ## ##       ##    ## ##     ## ##     ##  ##  ##   ### ##    ##
+########  ########  ######   #######  ########  #### ##    ##  ######
+
+def receiveExactly(sock, length):
+    """Read exactly length bytes from socket
+    """
+    chunks = []
+    while length > 0:
+        chunk = sock.recv(min(length, CHUNKSIZE))
+        if not chunk:
+            raise DicomNetworkError("Connection closed by peer")
+        chunks.append(chunk)
+        length -= len(chunk)
+
+    return "".join(chunks)
+
+def receivePdu(sock):
+    """Read one PDU, returns tuple (type, value)
+    """
+    pduType, reserved, length = struct.unpack(">BBI", receiveExactly(sock, 6))
+
+    return pduType, receiveExactly(sock, length)
+
+def decodeItems(data):
+    """Split variable items, returns list of (type, value)
+    """
+    items = []
+    index = 0
+    while index + 4 <= len(data):
+        itemType, reserved, length = struct.unpack(">BBH", data[index:index + 4])
+        items.append((itemType, data[index + 4:index + 4 + length]))
+        index += 4 + length
+
+    return items
+
+def decodeAssociate(value):
+    """Decode A-ASSOCIATE-RQ/AC PDU value
+
+    Returns dictionary with calledAeTitle, callingAeTitle, contexts (list of
+    (context id, result, abstract syntax, [transfer syntaxes])) and maxPduLength
+    """
+    associate = {
+        "calledAeTitle": value[4:20].strip(),
+        "callingAeTitle": value[20:36].strip(),
+        "contexts": [],
+        "maxPduLength": 0
+    }
+
+    for itemType, itemValue in decodeItems(value[68:]):
+        if itemType in [PRESENTATIONCONTEXTRQITEM, PRESENTATIONCONTEXTACITEM]:
+            contextId = ord(itemValue[0])
+            result = ord(itemValue[2])
+            abstractSyntax = None
+            transferSyntaxes = []
+            for subType, subValue in decodeItems(itemValue[4:]):
+                if subType == ABSTRACTSYNTAXITEM:
+                    abstractSyntax = subValue.rstrip("\0")
+                elif subType == TRANSFERSYNTAXITEM:
+                    transferSyntaxes.append(subValue.rstrip("\0"))
+            associate["contexts"].append((contextId, result, abstractSyntax, transferSyntaxes))
+        elif itemType == USERINFORMATIONITEM:
+            for subType, subValue in decodeItems(itemValue):
+                if subType == MAXIMUMLENGTHITEM:
+                    associate["maxPduLength"] = struct.unpack(">I", subValue)[0]
+
+    return associate
+
+def decodePdvs(value):
+    """Split P-DATA-TF PDU value, returns list of (context id, control, data)
+    """
+    pdvs = []
+    index = 0
+    while index + 6 <= len(value):
+        length, contextId, control = struct.unpack(">IBB", value[index:index + 6])
+        pdvs.append((contextId, control, value[index + 6:index + 4 + length]))
+        index += 4 + length
+
+    return pdvs
+
+def decodeCommand(data):
+    """Decode command set into dictionary element -> raw value
+    """
+    elements = {}
+    index = 0
+    while index + 8 <= len(data):
+        group, element, length = struct.unpack("<HHI", data[index:index + 8])
+        elements[element] = data[index + 8:index + 8 + length]
+        index += 8 + length
+
+    return elements
+
+def commandUid(elements, element):
+    """UID value of decoded command element
+    """
+    return elements.get(element, "").rstrip("\0 ")
+
+def commandUs(elements, element):
+    """US value of decoded command element, None when missing
+    """
+    if element not in elements:
+        return None
+
+    return struct.unpack("<H", elements[element][:2])[0]
+
+   ###     ######   ######   #######   ######  ####    ###    ######## ####  #######  ##    ##
+  ## ##   ##    ## ##    ## ##     ## ##    ##  ##    ## ##      ##     ##  ##     ## ###   ##
+ ##   ##  ##       ##       ##     ## ##        ##   ##   ##     ##     ##  ##     ## ####  ##
+##     ##  ######   ######  ##     ## ##        ##  ##     ##    ##     ##  ##     ## ## ## ##
+#########       ##       ## ##     ## ##        ##  #########    ##     ##  ##     ## ##  ####
+##     ## ##    ## ##    ## ##     ## ##    ##  ##  ##     ##    ##     ##  ##     ## ##   ###
+##     ##  ######   ######   #######   ######  #### ##     ##    ##    ####  #######  ##    ##
+
+class Association(object):
+    """Association of C-STORE Service Class User (SCU)
+
+    Presentation contexts are negotiated once, afterwards any number of instances
+    of negotiated (SOP class, transfer syntax) pairs is sent one after another
+    """
+
+    def __init__(self, callingAeTitle, calledAeTitle, host, port, syntaxes, timeout=60):
+        """Constructor
+
+        Param syntaxes is list of (SOP class UID, transfer syntax UID) pairs to propose
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.callingAeTitle = callingAeTitle
+        self.calledAeTitle = calledAeTitle
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self.syntaxes = syntaxes[:MAXPRESENTATIONCONTEXTS]
+        self.accepted = {}
+        self.maxPduLength = 0
+        self.lastUsed = time.time()
+        self.stored = 0
+
+        self._socket = None
+        self._messageId = 0
+
+    def open(self):
+        """Connect and negotiate presentation contexts
+        """
+        contexts = []
+        for index, (sopClassUid, transferSyntaxUid) in enumerate(self.syntaxes):
+            contexts.append((2 * index + 1, sopClassUid, [transferSyntaxUid]))
+
+        try:
+            self._socket = socket.create_connection((self.host, self.port), self.timeout)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
+            self._socket.sendall(encodeAssociateRq(self.callingAeTitle, self.calledAeTitle, contexts))
+            pduType, value = receivePdu(self._socket)
+        except (socket.error, DicomNetworkError), err:
+            self.close()
+            raise DicomNetworkError("Association request failed: " + str(err))
+
+        if pduType == ASSOCIATERJ:
+            self.close()
+            result, source, reason = struct.unpack(">BBB", value[1:4])
+            raise DicomNetworkError("Association rejected (result %d, source %d, reason %d)" % (result, source, reason))
+        elif pduType != ASSOCIATEAC:
+            self.close()
+            raise DicomNetworkError("Unexpected PDU in association negotiation: " + str(pduType))
+
+        associate = decodeAssociate(value)
+        self.maxPduLength = associate["maxPduLength"]
+
+        proposed = dict((contextId, (sopClassUid, transferSyntaxes[0])) for contextId, sopClassUid, transferSyntaxes in contexts)
+        for contextId, result, abstractSyntax, transferSyntaxes in associate["contexts"]:
+            if result == 0 and contextId in proposed:
+                self.accepted[proposed[contextId]] = contextId
+
+        self._logger.debug("Association with " + self.calledAeTitle + " accepted " + str(len(self.accepted)) + " of " + str(len(contexts)) + " presentation contexts")
+
+    def supports(self, sopClassUid, transferSyntaxUid):
+        """Presentation context of (SOP class, transfer syntax) was accepted
+        """
+        return (sopClassUid, transferSyntaxUid) in self.accepted
+
+    def proposed(self, sopClassUid, transferSyntaxUid):
+        """Presentation context of (SOP class, transfer syntax) was proposed
+        """
+        return (sopClassUid, transferSyntaxUid) in self.syntaxes
+
+    def store(self, filename, sopClassUid, sopInstanceUid, transferSyntaxUid, offset):
+        """Send dataset part of file (starting at offset) with C-STORE
+
+        Returns C-STORE response status
+        """
+        contextId = self.accepted[(sopClassUid, transferSyntaxUid)]
+
+        self._messageId = (self._messageId % 0xFFFF) + 1
+        messageId = self._messageId
+
+        # Fragment size limited by peer (PDV header takes 6 bytes)
+        fragmentSize = CHUNKSIZE
+        if self.maxPduLength > 6:
+            fragmentSize = min(fragmentSize, self.maxPduLength - 6)
+
+        try:
+            command = encodeCStoreRq(messageId, sopClassUid, sopInstanceUid)
+            self._socket.sendall(encodePdataHeader(contextId, COMMANDFRAGMENT | LASTFRAGMENT, len(command)) + command)
+
+            remaining = os.path.getsize(filename) - offset
+            with open(filename, "rb") as f:
+                f.seek(offset)
+                while True:
+                    data = f.read(min(fragmentSize, remaining))
+                    remaining -= len(data)
+                    last = remaining <= 0 or not data
+                    self._socket.sendall(encodePdataHeader(contextId, LASTFRAGMENT if last else 0, len(data)) + data)
+                    if last:
+                        break
+
+            status = self._receiveStatus(messageId)
+        except socket.error, err:
+            raise DicomNetworkError("C-STORE failed: " + str(err))
+
+        self.lastUsed = time.time()
+        self.stored += 1
+
+        return status
+
+    def release(self):
+        """Release association gracefully
+        """
+        try:
+            self._socket.sendall(encodeReleaseRq())
+            while True:
+                pduType, value = receivePdu(self._socket)
+                if pduType in [RELEASERP, ABORT]:
+                    break
+        except (socket.error, DicomNetworkError), err:
+            self._logger.debug("Association release failed: " + str(err))
+        finally:
+            self.close()
+
+    def abort(self):
+        """Abort association (e.g. after failure)
+        """
+        try:
+            self._socket.sendall(encodeAbort())
+        except (socket.error, AttributeError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Close connection
+        """
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except socket.error:
+                pass
+            self._socket = None
+
+    def _receiveStatus(self, messageId):
+        """Read C-STORE-RSP of message
+        """
+        command = ""
+        while True:
+            pduType, value = receivePdu(self._socket)
+
+            if pduType == ABORT:
+                self.close()
+                raise DicomNetworkError("Association aborted by peer")
+            elif pduType == RELEASERQ:
+                self._socket.sendall(encodeReleaseRp())
+                self.close()
+                raise DicomNetworkError("Association released by peer")
+            elif pduType != PDATATF:
+                raise DicomNetworkError("Unexpected PDU: " + str(pduType))
+
+            for contextId, control, data in decodePdvs(value):
+                if control & COMMANDFRAGMENT:
+                    command += data
+                    if control & LASTFRAGMENT:
+                        elements = decodeCommand(command)
+                        command = ""
+                        if commandUs(elements, MESSAGEIDBEINGRESPONDEDTO) == messageId:
+                            return commandUs(elements, STATUS)
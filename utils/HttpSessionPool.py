@@ -0,0 +1,154 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import threading, urlparse
+
+# HTTP
+import requests
+from requests.adapters import HTTPAdapter
+
+# Logging
+import logging
+
+ ######  ##          ###     ######   ######  ########  ######
+##    ## ##         ## ##   ##    ## ##    ## ##       ##    ##
+##       ##        ##   ##  ##       ##       ##       ##
+##       ##       ##     ##  ######   ######  ######    ######
+##       ##       #########       ##       ## ##             ##
+##    ## ##       ##     ## ##    ## ##    ## ##       ##    ##
+ ######  ######## ##     ##  ######   ######  ########  ######
+
+class HttpSessionPool(object):
+    """Shared keep-alive HTTP sessions, one per base URL (scheme, host and port)
+
+    Every session keeps up to poolSize open connections, which are reused by all
+    threads. Idempotent requests failing on connection errors are retried.
+    """
+
+    def __init__(self, poolSize=10, connectTimeout=5, readTimeout=60, retries=2, headers=None):
+        """Constructor
+
+        Param poolSize is number of kept connections per base URL
+        Param connectTimeout and readTimeout are in seconds
+        Param retries is number of retries of failed connection attempts
+        Param headers are sent with every request
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.poolSize = poolSize
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.retries = retries
+        self.headers = headers or {}
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._adapters = {}
+
+        # Monitoring counters
+        self._requests = 0
+        self._failed = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def get(self, url, stream=False, **kwargs):
+        """HTTP GET through pooled session of the URL
+
+        Streamed response has to be read or closed to return its connection to the pool
+        """
+        kwargs.setdefault("timeout", (self.connectTimeout, self.readTimeout))
+        kwargs.setdefault("verify", False)
+
+        with self._lock:
+            self._requests += 1
+
+        try:
+            return self.session(url).get(url, stream=stream, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+
+    def session(self, url):
+        """Session of base URL, created on first use
+        """
+        key = self._baseUrl(url)
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                # Number of retries is wrapped by adapter as Retry(retries, read=False) in all requests versions
+                # (2.4.3 cannot take Retry object), so read errors are not retried, the PACS may have processed the request
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.poolSize, max_retries=self.retries)
+
+                session = requests.Session()
+                session.headers.update(self.headers)
+                session.mount(key, adapter)
+
+                self._sessions[key] = session
+                self._adapters[key] = adapter
+
+                self._logger.info("HTTP session pool for " + key + " with " + str(self.poolSize) + " connections")
+
+        return session
+
+    def close(self):
+        """Close all sessions and their connections
+        """
+        with self._lock:
+            sessions = self._sessions.values()
+            self._sessions = {}
+            self._adapters = {}
+
+        for session in sessions:
+            session.close()
+
+    def statistics(self):
+        """Request and connection counters for monitoring
+
+        Reused is number of requests which did not need new connection
+        """
+        with self._lock:
+            connections = 0
+            reused = 0
+            for adapter in self._adapters.values():
+                for key in adapter.poolmanager.pools.keys():
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is not None:
+                        connections += pool.num_connections
+                        reused += max(0, pool.num_requests - pool.num_connections)
+
+            return {
+                "sessions": len(self._sessions),
+                "requests": self._requests,
+                "failed": self._failed,
+                "connections": connections,
+                "reused": reused
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _baseUrl(self, url):
+        """Scheme, host and port of URL
+        """
+        parts = urlparse.urlsplit(url)
+
+        return parts.scheme + "://" + parts.netloc + "/"
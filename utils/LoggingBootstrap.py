@@ -0,0 +1,228 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import atexit, signal, threading
+
+# Queue
+import Queue
+
+# Logging
+import logging
+import logging.config
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Maximum number of log records waiting for the listener thread
+QUEUESIZE = 10000
+
+##     ##    ###    ##    ## ########  ##       ######## ########   ######
+##     ##   ## ##   ###   ## ##     ## ##       ##       ##     ## ##    ##
+##     ##  ##   ##  ####  ## ##     ## ##       ##       ##     ## ##
+######### ##     ## ## ## ## ##     ## ##       ######   ########   ######
+##     ## ######### ##  #### ##     ## ##       ##       ##   ##         ##
+##     ## ##     ## ##   ### ##     ## ##       ##       ##    ##  ##    ##
+##     ## ##     ## ##    ## ########  ######## ######## ##     ##  ######
+
+class QueueHandler(logging.Handler):
+    """Logging handler which only puts records to the queue
+
+    Request threads never wait for file or console I/O, when the queue is full
+    the record is dropped and counted instead of blocking the caller
+    """
+
+    def __init__(self, queue):
+        """Default constructor
+        """
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Merge message arguments and exception info so the record can be handled later
+        """
+        message = self.format(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+
+        return record
+
+    def emit(self, record):
+        """Put the record to the queue
+        """
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+class QueueListener(object):
+    """Thread dispatching queued log records to the configured handlers
+    """
+
+    _sentinel = None
+
+    def __init__(self, queue, handlers):
+        """Default constructor
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        """Start dispatching thread
+        """
+        self._thread = threading.Thread(target=self._monitor, name="LoggingQueueListener")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Dispatch records already in the queue and stop the thread
+        """
+        if self._thread is not None:
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+    def handle(self, record):
+        """Pass the record to handlers according to their level
+        """
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _monitor(self):
+        """Thread body
+        """
+        while True:
+            record = self.queue.get()
+            if record is self._sentinel:
+                break
+
+            self.handle(record)
+
+ ######  ######## ######## ##     ## ########
+##    ## ##          ##    ##     ## ##     ##
+##       ##          ##    ##     ## ##     ##
+ ######  ######      ##    ##     ## ########
+      ## ##          ##    ##     ## ##
+##    ## ##          ##    ##     ## ##
+ ######  ########    ##     #######  ##
+
+_lock = threading.RLock()
+_fileName = None
+_queue = Queue.Queue(QUEUESIZE)
+_queueHandler = QueueHandler(_queue)
+_listener = None
+
+def configure(fileName="logging.ini"):
+    """Configure logging once per process
+
+    Handlers from the config file are moved behind a queue, root logger only
+    enqueues records and one listener thread performs the actual I/O
+    """
+    global _fileName, _listener
+
+    with _lock:
+        if _listener is not None:
+            return
+
+        _fileName = fileName
+
+        logging.config.fileConfig(_fileName, disable_existing_loggers=False)
+
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        for handler in handlers:
+            root.removeHandler(handler)
+        root.addHandler(_queueHandler)
+
+        _listener = QueueListener(_queue, handlers)
+        _listener.start()
+
+def reload():
+    """Re-read logging config file and replace handlers
+    """
+    global _listener
+
+    with _lock:
+        if _listener is None:
+            return
+
+        # Pending records are written by the old handlers
+        _listener.stop()
+        _listener = None
+
+        configure(_fileName)
+
+    logging.getLogger(__name__).info("Logging configuration reloaded from: " + _fileName)
+
+def stop():
+    """Flush queued records and stop the listener thread
+    """
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            if _queueHandler.dropped:
+                logging.getLogger(__name__).warning("Dropped log records: " + str(_queueHandler.dropped))
+
+            _listener.stop()
+            _listener = None
+
+def beforeFork():
+    """Stop the listener thread before fork so no handler lock is held in the child
+    """
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def afterForkParent():
+    """Resume logging in parent process, records queued in the meantime are written
+    """
+    if _fileName is not None:
+        configure(_fileName)
+
+def afterForkChild():
+    """Restart logging in forked child process with its own queue and listener thread
+    """
+    global _lock, _queue, _listener
+
+    _lock = threading.RLock()
+    _queue = Queue.Queue(QUEUESIZE)
+
+    _queueHandler.createLock()
+    _queueHandler.queue = _queue
+    _queueHandler.dropped = 0
+
+    _listener = None
+
+    if _fileName is not None:
+        configure(_fileName)
+
+def installReloadSignal():
+    """Reload logging config file on SIGHUP (not available on Windows)
+    """
+    if hasattr(signal, "SIGHUP"):
+        # Signal handler runs in main thread, reload in background so the server loop is not blocked
+        signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=reload).start())
+
+atexit.register(stop)
@@ -0,0 +1,188 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import errno, os, signal, time
+
+# Logging
+import logging
+
+# Utils
+from utils import LoggingBootstrap
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Worker process which exits sooner is considered crashing, its respawn is delayed
+MINIMUMLIFETIME = 5 # seconds
+RESPAWNDELAY = 1 # seconds
+
+ ######  ##     ## ########  ######## ########  ##     ## ####  ######   #######  ########
+##    ## ##     ## ##     ## ##       ##     ## ##     ##  ##  ##    ## ##     ## ##     ##
+##       ##     ## ##     ## ##       ##     ## ##     ##  ##  ##       ##     ## ##     ##
+ ######  ##     ## ########  ######   ########  ##     ##  ##   ######  ##     ## ########
+      ## ##     ## ##        ##       ##   ##    ##   ##   ##        ## ##     ## ##   ##
+##    ## ##     ## ##        ##       ##    ##    ## ##    ##  ##    ## ##     ## ##    ##
+ ######   #######  ##        ######## ##     ##    ###    ####  ######   #######  ##     ##
+
+class PreforkSupervisor(object):
+    """Supervisor of pre-forked worker processes (POSIX only)
+
+    Keeps the configured number of worker processes running, crashed workers
+    are respawned. SIGHUP restarts workers gracefully (new workers are started
+    before old ones are asked to finish), SIGTERM and SIGINT are forwarded
+    to workers and the supervisor exits when all of them finished.
+    """
+
+    def __init__(self, processes, target):
+        """Constructor
+
+        Param target is callable executed in every worker process
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.processes = processes
+        self.target = target
+
+        # Worker pid -> (generation, start time)
+        self._children = {}
+        self._generation = 0
+        self._stopping = False
+        self._restarting = False
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def run(self):
+        """Start workers and supervise them until stopped
+        """
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self._restart)
+
+        for i in range(self.processes):
+            self._spawn()
+
+        while self._children:
+            if self._restarting:
+                self._restarting = False
+                self._rollingRestart()
+
+            try:
+                pid, status = os.wait()
+            except OSError, err:
+                # Interrupted by signal
+                if err.errno == errno.EINTR:
+                    continue
+                if err.errno == errno.ECHILD:
+                    break
+                raise
+
+            if pid not in self._children:
+                continue
+
+            generation, started = self._children.pop(pid)
+
+            # Worker of current generation exited on its own
+            if not self._stopping and generation == self._generation:
+                self._logger.warning("Worker process " + str(pid) + " exited with status " + str(status) + ", respawning.")
+
+                if time.time() - started < MINIMUMLIFETIME:
+                    time.sleep(RESPAWNDELAY)
+
+                if not self._stopping:
+                    self._spawn()
+
+        self._logger.info("All worker processes finished.")
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _spawn(self):
+        """Fork new worker process
+        """
+        LoggingBootstrap.beforeFork()
+        pid = os.fork()
+
+        if pid == 0:
+            # Worker process, the supervisor forwards termination and restart
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+
+            # Logging listener thread of supervisor does not exist in forked process
+            LoggingBootstrap.afterForkChild()
+
+            exitCode = 0
+            try:
+                self.target()
+            except Exception:
+                self._logger.exception("Worker process failed.")
+                exitCode = 1
+            finally:
+                LoggingBootstrap.stop()
+
+            # Do not return into the supervisor code
+            os._exit(exitCode)
+
+        LoggingBootstrap.afterForkParent()
+
+        self._children[pid] = (self._generation, time.time())
+        self._logger.info("Worker process " + str(pid) + " started.")
+
+    def _rollingRestart(self):
+        """Start new generation of workers and let the old ones finish their requests
+        """
+        self._logger.info("Restarting worker processes.")
+
+        LoggingBootstrap.reload()
+
+        old = self._children.keys()
+        self._generation += 1
+
+        for i in range(self.processes):
+            self._spawn()
+
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+
+    def _signal(self, pid, signum):
+        """Send signal to worker which may already be finished
+        """
+        try:
+            os.kill(pid, signum)
+        except OSError, err:
+            if err.errno != errno.ESRCH:
+                raise
+
+    def _stop(self, signum, frame):
+        """Signal handler, forward termination to workers
+        """
+        self._stopping = True
+        for pid in self._children.keys():
+            self._signal(pid, signal.SIGTERM)
+
+    def _restart(self, signum, frame):
+        """Signal handler, restart is performed in supervisor loop
+        """
+        self._restarting = True
@@ -0,0 +1,399 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import errno, os, signal, threading
+
+# Queue
+import Queue
+
+# Process communication
+from multiprocessing import Pipe
+from multiprocessing.reduction import send_handle, recv_handle
+from _multiprocessing import Connection
+
+# Logging
+import logging
+
+# Utils
+from utils import LoggingBootstrap
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Seconds between checks whether the parent process still exists
+PARENTCHECKINTERVAL = 1
+
+ ######  ##          ###     ######   ######  ########  ######
+##    ## ##         ## ##   ##    ## ##    ## ##       ##    ##
+##       ##        ##   ##  ##       ##       ##       ##
+##       ##       ##     ##  ######   ######  ######    ######
+##       ##       #########       ##       ## ##             ##
+##    ## ##       ##     ## ##    ## ##    ## ##       ##    ##
+ ######  ######## ##     ##  ######   ######  ########  ######
+
+class Degraded(Exception):
+    """Pool cannot execute jobs, its spawner process failed and workers cannot be replaced
+    """
+    pass
+
+class _Worker(object):
+    """Worker process and parent end of its pipe
+    """
+
+    def __init__(self, pid, connection):
+        """Constructor
+        """
+        self.pid = pid
+        self.connection = connection
+        self.jobs = 0
+
+class ProcessPool(object):
+    """Pool of long-lived worker processes executing one callable (POSIX only)
+
+    Workers are forked once and stay warm (interpreter and imports are reused between jobs).
+    Job which does not finish within timeout kills its worker (with its child processes)
+    and the worker is replaced, workers are also replaced after maxJobs jobs.
+
+    Workers are forked by single threaded spawner process (zygote) which is forked once in start,
+    so replacement workers are never forked from multithreaded server (lock held by other
+    thread, e.g. of logging, would deadlock the child) and logging of server is not reconfigured.
+
+    Spawner process is not restarted (it would be forked from multithreaded server), when it fails
+    the pool is degraded: run raises Degraded and callers fall back to their own way of execution.
+    """
+
+    def __init__(self, target, workers=2, timeout=300, maxJobs=500, name="ProcessPool"):
+        """Constructor
+
+        Param target is callable executed in worker processes, its arguments and result are pickled
+        """
+        self._logger = logging.getLogger(__name__)
+
+        self.target = target
+        self.workers = workers
+        self.timeout = timeout
+        self.maxJobs = maxJobs
+        self.name = name
+
+        self._idle = Queue.Queue()
+        self._forkLock = threading.Lock()
+
+        # Worker slots lost because spawner process failed
+        self.degraded = False
+        self._lost = 0
+
+        # Spawner process and server end of its pipe
+        self._zygotePid = None
+        self._zygoteConnection = None
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._timedOut = 0
+        self._recycled = 0
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def start(self):
+        """Fork spawner process and worker processes (call before other threads of server are started)
+        """
+        self._startZygote()
+
+        for i in range(self.workers):
+            self._idle.put(self._spawn())
+
+        self._logger.info(self.name + " started with " + str(self.workers) + " worker processes")
+
+    def stop(self):
+        """Stop worker processes, running jobs are waited for
+        """
+        remaining = self.workers - self._lost
+        while remaining > 0:
+            worker = self._idle.get()
+            if worker is None:
+                continue
+
+            self._kill(worker)
+            remaining -= 1
+
+        # Spawner exits when its pipe is closed
+        self._zygoteConnection.close()
+        try:
+            os.waitpid(self._zygotePid, 0)
+        except OSError, err:
+            if err.errno != errno.ECHILD:
+                raise
+
+    def run(self, *args):
+        """Execute target in free worker process (waits for one)
+
+        Returns result of target or None when the job failed or timed out,
+        raises Degraded when the pool cannot execute jobs anymore
+        """
+        if self.degraded:
+            raise Degraded(self.name + " spawner process failed")
+
+        worker = self._idle.get()
+        if worker is None:
+            # Marker of degraded pool wakes all waiting callers
+            self._idle.put(None)
+            raise Degraded(self.name + " spawner process failed")
+
+        with self._lock:
+            self._busy += 1
+
+        result = None
+        try:
+            worker.connection.send(args)
+
+            if worker.connection.poll(self.timeout):
+                succeeded, result = worker.connection.recv()
+                worker.jobs += 1
+
+                with self._lock:
+                    if succeeded:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+                        self._logger.error(self.name + " job failed: " + str(result))
+                        result = None
+
+                if worker.jobs >= self.maxJobs:
+                    with self._lock:
+                        self._recycled += 1
+                    worker = self._replace(worker)
+            else:
+                self._logger.error(self.name + " job did not finish within " + str(self.timeout) + " seconds: " + str(args))
+                with self._lock:
+                    self._timedOut += 1
+                worker = self._replace(worker)
+        except (EOFError, IOError, OSError), err:
+            self._logger.error(self.name + " worker process " + str(worker.pid) + " failed: " + str(err))
+            with self._lock:
+                self._failed += 1
+            worker = self._replace(worker)
+        finally:
+            with self._lock:
+                self._busy -= 1
+
+            # Dead worker which could not be replaced is not returned to the pool
+            if worker is not None:
+                self._idle.put(worker)
+
+        return result
+
+    def statistics(self):
+        """Pool counters for monitoring
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timedOut": self._timedOut,
+                "recycled": self._recycled,
+                "degraded": self.degraded,
+                "lost": self._lost
+            }
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _startZygote(self):
+        """Fork spawner process of workers
+        """
+        parentConnection, childConnection = Pipe()
+        parentPid = os.getpid()
+
+        LoggingBootstrap.beforeFork()
+        pid = os.fork()
+
+        if pid == 0:
+            self._ignoreSignals()
+            LoggingBootstrap.afterForkChild()
+
+            parentConnection.close()
+
+            exitCode = 0
+            try:
+                self._zygote(childConnection, parentPid)
+            except Exception:
+                self._logger.exception(self.name + " spawner process failed.")
+                exitCode = 1
+            finally:
+                LoggingBootstrap.stop()
+
+            # Do not return into the server code
+            os._exit(exitCode)
+
+        LoggingBootstrap.afterForkParent()
+
+        childConnection.close()
+
+        self._zygotePid = pid
+        self._zygoteConnection = parentConnection
+
+    def _spawn(self):
+        """Let spawner process fork new worker process, worker gets child end of new pipe
+        """
+        with self._forkLock:
+            parentConnection, childConnection = Pipe()
+            try:
+                send_handle(self._zygoteConnection, childConnection.fileno(), self._zygotePid)
+                pid = self._zygoteConnection.recv()
+            finally:
+                childConnection.close()
+
+        return _Worker(pid, parentConnection)
+
+    def _zygote(self, connection, parentPid):
+        """Spawner process body, forks worker for every received pipe end and replies its pid
+        """
+        zygotePid = os.getpid()
+
+        while True:
+            self._reap()
+
+            if not connection.poll(PARENTCHECKINTERVAL):
+                if os.getppid() != parentPid:
+                    break
+                continue
+
+            try:
+                workerConnection = Connection(recv_handle(connection))
+            except (EOFError, IOError, OSError, RuntimeError):
+                # Server closed the pipe (stop) or exited
+                break
+
+            LoggingBootstrap.beforeFork()
+            pid = os.fork()
+
+            if pid == 0:
+                # Own process group, timed out job is killed together with tools it started
+                os.setpgrp()
+
+                LoggingBootstrap.afterForkChild()
+
+                connection.close()
+
+                exitCode = 0
+                try:
+                    self._serve(workerConnection, zygotePid)
+                except Exception:
+                    self._logger.exception(self.name + " worker process failed.")
+                    exitCode = 1
+                finally:
+                    LoggingBootstrap.stop()
+
+                os._exit(exitCode)
+
+            # Also set from spawner, killpg must not miss worker which did not run yet
+            try:
+                os.setpgid(pid, pid)
+            except OSError:
+                pass
+
+            LoggingBootstrap.afterForkParent()
+
+            # Later workers do not inherit pipes of other workers
+            workerConnection.close()
+
+            connection.send(pid)
+
+    def _reap(self):
+        """Reap workers killed by server (they are children of spawner process)
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                return
+
+            if pid == 0:
+                return
+
+    def _ignoreSignals(self):
+        """Server signals are handled by server process only
+        """
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    def _serve(self, connection, parentPid):
+        """Worker process body
+        """
+        while True:
+            # Worker exits with spawner process (which exits with server)
+            if not connection.poll(PARENTCHECKINTERVAL):
+                if os.getppid() != parentPid:
+                    break
+                continue
+
+            try:
+                args = connection.recv()
+            except EOFError:
+                break
+
+            try:
+                response = (True, self.target(*args))
+            except Exception, err:
+                self._logger.exception(self.name + " job failed.")
+                response = (False, str(err))
+
+            connection.send(response)
+
+    def _replace(self, worker):
+        """Kill worker process and start new one instead
+
+        Returns new worker or None when spawner process failed (pool is degraded)
+        """
+        self._kill(worker)
+
+        try:
+            return self._spawn()
+        except (EOFError, IOError, OSError), err:
+            self._logger.error(self.name + " cannot replace worker process, spawner process failed: " + str(err))
+
+            with self._lock:
+                self.degraded = True
+                self._lost += 1
+
+            self._idle.put(None)
+            return None
+
+    def _kill(self, worker):
+        """Kill worker process group (it is reaped by spawner process)
+        """
+        worker.connection.close()
+
+        try:
+            os.killpg(worker.pid, signal.SIGKILL)
+        except OSError, err:
+            if err.errno != errno.ESRCH:
+                raise
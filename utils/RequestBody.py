@@ -0,0 +1,59 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Size of chunks for skipping unread body
+CHUNKSIZE = 64 * 1024
+
+ ######  ##          ###     ######   ######
+##    ## ##         ## ##   ##    ## ##    ##
+##       ##        ##   ##  ##       ##
+##       ##       ##     ##  ######   ######
+##       ##       #########       ##       ##
+##    ## ##       ##     ## ##    ## ##    ##
+ ######  ######## ##     ##  ######   ######
+
+class RequestBody(object):
+    """File-like reader of request body limited to its Content-Length
+
+    Consumers (e.g. tarfile stream) never read into the next request of persistent connection
+    """
+
+    def __init__(self, stream, length):
+        """Constructor
+        """
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        """Read at most size bytes of the body
+        """
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+
+        if size == 0:
+            return ""
+
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+
+        return data
+
+    def drain(self):
+        """Skip the rest of the body
+        """
+        while self.remaining > 0:
+            if not self.read(CHUNKSIZE):
+                break
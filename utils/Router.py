@@ -0,0 +1,169 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+ ######  ##       ########    ###     ######   ######
+##    ## ##       ##         ## ##   ##    ## ##    ##
+##       ##       ##        ##   ##  ##       ##
+##       ##       ######   ##     ##  ######   ######
+##       ##       ##       #########       ##       ##
+##    ## ##       ##       ##     ## ##    ## ##    ##
+ ######  ######## ######## ##     ##  ######   ######
+
+class _RouteNode(object):
+    """One path segment of the route trie
+    """
+
+    __slots__ = ("children", "param", "paramName", "paramType", "handler")
+
+    def __init__(self):
+        """Default constructor
+        """
+        self.children = {}
+        self.param = None
+        self.paramName = None
+        self.paramType = None
+        self.handler = None
+
+class Router(object):
+    """Declarative router mapping HTTP method and path template to handler
+
+    Templates are split into segments, literal segments are matched exactly and
+    {name} or {name:type} segments capture typed path parameters, e.g.
+    /api/v1/changeUserActiveStudy/{ocUsername}/{studyId:int}
+
+    Routes of each method are kept in a prefix trie of segments, so the dispatch
+    cost depends on the length of the path and not on the number of routes.
+    """
+
+    # Supported path parameter types
+    converters = { "str": str, "int": int }
+
+    def __init__(self):
+        """Default constructor
+        """
+        self._trees = {}
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def add(self, method, template, handler):
+        """Register handler for HTTP method and path template
+        """
+        node = self._trees.setdefault(method, _RouteNode())
+
+        for segment in self.splitPath(template):
+            if segment.startswith("{") and segment.endswith("}"):
+                name, _, typeName = segment[1:-1].partition(":")
+                paramType = self.converters[typeName or "str"]
+
+                if node.param is None:
+                    node.param = _RouteNode()
+                    node.paramName = name
+                    node.paramType = paramType
+                elif node.paramName != name or node.paramType != paramType:
+                    raise ValueError("Conflicting path parameter in route: " + template)
+
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _RouteNode())
+
+        if node.handler is not None:
+            raise ValueError("Duplicate route: " + method + " " + template)
+
+        node.handler = handler
+
+    def match(self, method, path):
+        """Find handler and typed path parameters for HTTP method and path
+
+        Returns tuple (handler, params) or (None, None) when no route matches
+        """
+        tree = self._trees.get(method)
+        if tree is None:
+            return None, None
+
+        params = {}
+        handler = self._match(tree, self.splitPath(path), 0, params)
+
+        if handler is None:
+            return None, None
+
+        return handler, params
+
+    def routes(self):
+        """List registered routes as (method, template, handler) tuples
+        """
+        results = []
+        for method, tree in self._trees.iteritems():
+            self._collect(method, tree, [], results)
+
+        return results
+
+    @staticmethod
+    def splitPath(path):
+        """Split URL path into non empty segments, ignoring query and fragment
+        """
+        for separator in ("?", "#"):
+            index = path.find(separator)
+            if index != -1:
+                path = path[:index]
+
+        return [segment for segment in path.split("/") if segment]
+
+########  ########  #### ##     ##    ###    ######## ########
+##     ## ##     ##  ##  ##     ##   ## ##      ##    ##
+##     ## ##     ##  ##  ##     ##  ##   ##     ##    ##
+########  ########   ##  ##     ## ##     ##    ##    ######
+##        ##   ##    ##   ##   ##  #########    ##    ##
+##        ##    ##   ##    ## ##   ##     ##    ##    ##
+##        ##     ## ####    ###    ##     ##    ##    ########
+
+    def _match(self, node, segments, index, params):
+        """Walk the trie, literal segments take precedence over parameters
+        """
+        if index == len(segments):
+            return node.handler
+
+        segment = segments[index]
+
+        child = node.children.get(segment)
+        if child is not None:
+            handler = self._match(child, segments, index + 1, params)
+            if handler is not None:
+                return handler
+
+        if node.param is not None:
+            try:
+                value = node.paramType(segment)
+            except ValueError:
+                return None
+
+            handler = self._match(node.param, segments, index + 1, params)
+            if handler is not None:
+                params[node.paramName] = value
+                return handler
+
+        return None
+
+    def _collect(self, method, node, segments, results):
+        """Depth first listing of registered routes
+        """
+        if node.handler is not None:
+            results.append((method, "/" + "/".join(segments), node.handler))
+
+        for segment, child in node.children.iteritems():
+            self._collect(method, child, segments + [segment], results)
+
+        if node.param is not None:
+            typeName = [k for k, v in self.converters.iteritems() if v is node.paramType][0]
+            segment = "{" + node.paramName + ":" + typeName + "}"
+            self._collect(method, node.param, segments + [segment], results)
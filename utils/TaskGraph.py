@@ -0,0 +1,146 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import threading, time
+
+# Collections
+from collections import OrderedDict
+
+# Utils
+from utils.BoundedExecutor import Cancelled, CANCELCHECKINTERVAL
+
+ ######  ##          ###     ######   ######  ########  ######
+##    ## ##         ## ##   ##    ## ##    ## ##       ##    ##
+##       ##        ##   ##  ##       ##       ##       ##
+##       ##       ##     ##  ######   ######  ######    ######
+##       ##       #########       ##       ## ##             ##
+##    ## ##       ##     ## ##    ## ##    ## ##       ##    ##
+ ######  ######## ##     ##  ######   ######  ########  ######
+
+class _Task(object):
+    """Named function with names of tasks whose results are its arguments
+    """
+
+    def __init__(self, name, function, dependencies):
+        """Constructor
+        """
+        self.name = name
+        self.function = function
+        self.dependencies = dependencies
+
+class TaskGraph(object):
+    """Named tasks with dependencies executed concurrently on BoundedExecutor
+
+    Task is started as soon as all its dependencies finished, so independent remote
+    calls overlap and the graph takes as long as its slowest dependency chain.
+    Task function is called with results of its dependencies in declared order.
+    """
+
+    def __init__(self, executor):
+        """Constructor
+
+        Param executor is BoundedExecutor running the tasks
+        """
+        self.executor = executor
+
+        self._tasks = OrderedDict()
+
+        # Seconds each task took (for logging of critical path)
+        self.durations = {}
+
+##     ## ######## ######## ##     ##  #######  ########   ######
+###   ### ##          ##    ##     ## ##     ## ##     ## ##    ##
+#### #### ##          ##    ##     ## ##     ## ##     ## ##
+## ### ## ######      ##    ######### ##     ## ##     ##  ######
+##     ## ##          ##    ##     ## ##     ## ##     ##       ##
+##     ## ##          ##    ##     ## ##     ## ##     ## ##    ##
+##     ## ########    ##    ##     ##  #######  ########   ######
+
+    def add(self, name, function, dependencies=None):
+        """Add task, dependencies have to be added before
+        """
+        if name in self._tasks:
+            raise ValueError("Task " + name + " is already defined")
+
+        dependencies = list(dependencies or [])
+        for dependency in dependencies:
+            if dependency not in self._tasks:
+                raise ValueError("Task " + name + " depends on unknown task " + dependency)
+
+        self._tasks[name] = _Task(name, function, dependencies)
+
+        return self
+
+    def run(self, cancelled=None):
+        """Execute all tasks and return dict of their results by name
+
+        Param cancelled is callable polled while waiting, when it returns True tasks which
+        did not start yet are not started and Cancelled is raised
+        Exception of task stops the graph and is raised to caller (after running tasks finished)
+        """
+        results = {}
+        started = set()
+        state = { "running": 0, "error": None, "cancelled": False }
+        condition = threading.Condition()
+
+        def finished(task, begin):
+            def callback(result, error):
+                with condition:
+                    self.durations[task.name] = time.time() - begin
+                    state["running"] -= 1
+                    if error is not None:
+                        if state["error"] is None:
+                            state["error"] = error
+                    else:
+                        results[task.name] = result
+                        startReady()
+                    condition.notify()
+            return callback
+
+        def startReady():
+            # Lock is held by caller
+            if state["error"] is not None or state["cancelled"]:
+                return
+
+            for task in self._tasks.values():
+                if task.name not in started and all(d in results for d in task.dependencies):
+                    started.add(task.name)
+                    state["running"] += 1
+
+                    args = [results[d] for d in task.dependencies]
+                    self.executor.submit(lambda task=task, args=args: task.function(*args), finished(task, time.time()))
+
+        with condition:
+            startReady()
+
+            while state["running"] > 0:
+                if not state["cancelled"] and state["error"] is None and cancelled is not None and cancelled():
+                    state["cancelled"] = True
+                    continue
+
+                condition.wait(CANCELCHECKINTERVAL)
+
+        if state["error"] is not None:
+            error = state["error"]
+            raise error[0], error[1], error[2]
+
+        if state["cancelled"]:
+            raise Cancelled(str(len(self._tasks) - len(results)) + " of " + str(len(self._tasks)) + " tasks not finished")
+
+        return results
+
+    def criticalPath(self):
+        """Names of the slowest dependency chain of last run and its duration in seconds
+        """
+        paths = {}
+        for task in self._tasks.values():
+            previous = max([paths[d] for d in task.dependencies] or [([], 0.0)], key=lambda p: p[1])
+            paths[task.name] = (previous[0] + [task.name], previous[1] + self.durations.get(task.name, 0.0))
+
+        return max(paths.values() or [([], 0.0)], key=lambda p: p[1])
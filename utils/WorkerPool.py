@@ -0,0 +1,256 @@
+#### ##     ## ########   #######  ########  ########  ######
+ ##  ###   ### ##     ## ##     ## ##     ##    ##    ##    ##
+ ##  #### #### ##     ## ##     ## ##     ##    ##    ##
+ ##  ## ### ## ########  ##     ## ########     ##     ######
+ ##  ##     ## ##        ##     ## ##   ##      ##          ##
+ ##  ##     ## ##        ##     ## ##    ##     ##    ##    ##
+#### ##     ## ##         #######  ##     ##    ##     ######
+
+# Standard
+import select, threading, time
+
+# SSL
+from OpenSSL import SSL
+
+# Queue
+import Queue
+
+# Logging
+import logging
+
+ ######   #######  ##    ##  ######  ########  ######
+##    ## ##     ## ###   ## ##    ##    ##    ##    ##
+##       ##     ## ####  ## ##          ##    ##
+##       ##     ## ## ## ##  ######     ##     ######
+##       ##     ## ##  ####       ##    ##          ##
+##    ## ##     ## ##   ### ##    ##    ##    ##    ##
+ ######   #######  ##    ##  ######     ##     ######
+
+# Rejected connections waiting for 503 response, above that they are closed without response
+REJECTQUEUESIZE = 32
+
+# Seconds to wait for handshake and request of rejected connection and for its 503 response to be sent
+REJECTREADTIMEOUT = 1
+
+# Response for connections which do not fit into admission queue
+SERVICEUNAVAILABLE = "HTTP/1.1 503 Service Unavailable\r\n" \
+    "Retry-After: %d\r\n" \
+    "Content-Type: application/json\r\n" \
+    "Content-Length: 0\r\n" \
+    "Connection: close\r\n\r\n"
+
+##     ## #### ##     ## #### ##    ##
+###   ###  ##   ##   ##   ##  ###   ##
+#### ####  ##    ## ##    ##  ####  ##
+## ### ##  ##     ###     ##  ## ## ##
+##     ##  ##    ## ##    ##  ##  ####
+##     ##  ##   ##   ##   ##  ##   ###
+##     ## #### ##     ## #### ##    ##
+
+class WorkerPoolMixIn:
+    """Mix-in class to handle requests with fixed pool of worker threads
+
+    Accepted connections wait in bounded admission queue, when the queue is full
+    the connection is answered with 503 and Retry-After instead of being handled
+    """
+
+    def startWorkers(self, workers=16, queueSize=64, retryAfter=5):
+        """Start worker threads
+        """
+        self._poolLogger = logging.getLogger(__name__)
+
+        self.workers = workers
+        self.queueSize = queueSize
+        self.retryAfter = retryAfter
+
+        self._requests = Queue.Queue(queueSize)
+        self._rejected = Queue.Queue(REJECTQUEUESIZE)
+        self._poolLock = threading.Lock()
+
+        # Monitoring counters
+        self._accepted = 0
+        self._rejectedCount = 0
+        self._completed = 0
+        self._busy = 0
+        self._peakBusy = 0
+        self._peakQueued = 0
+        self._waitTotal = 0.0
+        self._waitMax = 0.0
+        self._saturatedSince = None
+        self._saturatedTotal = 0.0
+        self._started = time.time()
+
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name="Worker-" + str(i))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+        t = threading.Thread(target=self._reject, name="Rejector")
+        t.daemon = True
+        t.start()
+
+        self._poolLogger.info("Worker pool started with " + str(workers) + " workers and admission queue size " + str(queueSize))
+
+    def stopWorkers(self):
+        """Let workers finish queued requests and stop them
+        """
+        for t in self._threads:
+            self._requests.put(None)
+        for t in self._threads:
+            t.join()
+
+        self._threads = []
+
+    def process_request(self, request, client_address):
+        """Queue the request for worker threads or reject it when the queue is full
+        """
+        try:
+            self._requests.put_nowait((request, client_address, time.time()))
+        except Queue.Full:
+            with self._poolLock:
+                self._rejectedCount += 1
+
+            try:
+                self._rejected.put_nowait(request)
+            except Queue.Full:
+                self._close(request)
+
+            return
+
+        with self._poolLock:
+            self._accepted += 1
+            self._peakQueued = max(self._peakQueued, self._requests.qsize())
+
+    def isSaturated(self):
+        """All workers are busy and requests are waiting in the queue
+        """
+        return not self._requests.empty()
+
+    def poolStatistics(self):
+        """Worker pool counters for monitoring
+        """
+        with self._poolLock:
+            saturated = self._saturatedTotal
+            if self._saturatedSince is not None:
+                saturated += time.time() - self._saturatedSince
+
+            waitMean = 0.0
+            if self._completed > 0:
+                waitMean = self._waitTotal / self._completed
+
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "peakBusy": self._peakBusy,
+                "queueSize": self.queueSize,
+                "queued": self._requests.qsize(),
+                "peakQueued": self._peakQueued,
+                "accepted": self._accepted,
+                "rejected": self._rejectedCount,
+                "completed": self._completed,
+                "queueWaitMeanMs": waitMean * 1000,
+                "queueWaitMaxMs": self._waitMax * 1000,
+                "saturatedSeconds": saturated,
+                "saturatedRatio": saturated / max(time.time() - self._started, 1e-9)
+            }
+
+    def server_close(self):
+        """Stop workers and close listening socket
+        """
+        self.stopWorkers()
+        self.socket.close()
+
+    def _work(self):
+        """Worker thread body
+        """
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+
+            request, client_address, queued = item
+            wait = time.time() - queued
+
+            self._enter(wait)
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self._close(request)
+                self._leave()
+
+    def _reject(self):
+        """Answer rejected connections with 503
+        """
+        while True:
+            request = self._rejected.get()
+            try:
+                # Slow client must not block the only rejector thread (handshake and read would block without limit)
+                request.setblocking(0)
+                deadline = time.time() + REJECTREADTIMEOUT
+
+                # Read request head first, closing connection with unread data would reset it before the client reads 503
+                try:
+                    self._nonBlocking(request, deadline, request.recv, 65536)
+                except SSL.ZeroReturnError:
+                    pass
+
+                response = SERVICEUNAVAILABLE % self.retryAfter
+                while response:
+                    response = response[self._nonBlocking(request, deadline, request.send, response):]
+            except Exception, err:
+                self._poolLogger.debug("Rejected connection: " + str(err))
+            finally:
+                self._close(request)
+
+    def _nonBlocking(self, request, deadline, function, *args):
+        """Call SSL function of non-blocking connection until it completes or deadline passes
+        """
+        while True:
+            try:
+                return function(*args)
+            except SSL.WantReadError:
+                wait = ([request], [])
+            except SSL.WantWriteError:
+                wait = ([], [request])
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise IOError("Timeout of rejected connection")
+
+            select.select(wait[0], wait[1], [], remaining)
+
+    def _close(self, request):
+        """Close connection, worker threads have to survive failing shutdown (e.g. broken SSL)
+        """
+        try:
+            self.shutdown_request(request)
+        except Exception, err:
+            self._poolLogger.debug("Connection shutdown failed: " + str(err))
+
+    def _enter(self, wait):
+        """Worker picked up request
+        """
+        with self._poolLock:
+            self._waitTotal += wait
+            self._waitMax = max(self._waitMax, wait)
+
+            self._busy += 1
+            self._peakBusy = max(self._peakBusy, self._busy)
+            if self._busy == self.workers and self._saturatedSince is None:
+                self._saturatedSince = time.time()
+
+    def _leave(self):
+        """Worker finished request
+        """
+        with self._poolLock:
+            self._completed += 1
+
+            if self._saturatedSince is not None:
+                self._saturatedTotal += time.time() - self._saturatedSince
+                self._saturatedSince = None
+
+            self._busy -= 1